@@ -1,11 +1,15 @@
 # ChovusSmartBot_v9.py
 import logging
+import logging.handlers
+import queue
+import atexit
+import email.utils
 import ccxt.async_support as ccxt
 import time
 import math
 import os
 import json
-from datetime import datetime, timedelta
+from datetime import datetime
 import pandas as pd
 import numpy as np
 import threading
@@ -15,8 +19,22 @@ from pandas import DataFrame
 from typing import Optional, Union, Any
 from dotenv import load_dotenv
 import asyncio
-import sqlite3
 from pathlib import Path
+from candle_cache import CandleCache
+from storage import Storage
+from price_feed import PriceFeed, ReplayPriceFeed
+from orderbook_service import OrderBookService, ReplayOrderBookService, futures_price_precision
+from execution import ExecutionEngine
+from sim_exchange import SimulatedExchange
+from markets_cache import MarketsCache, default_path as markets_cache_path
+from events import bus
+from retention import Retention
+import metrics
+import indicators
+import scoring
+from strategy import (ROUND_LEVELS, VOLUME_SPIKE_THRESHOLD, SCORE_WEIGHTS, CANDIDATE_SCORE_THRESHOLD, SMMA_LENGTH,
+                      WMA_LENGTH, FIB_WINDOW, CANDLE_LIMIT, TradeState, allocation_for_score,
+                      performance_weight, trailing_callback_rate)
 
 load_dotenv()
 
@@ -27,105 +45,270 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Ažuriraj log_action da ispisuje i na konzolu
-def log_action(message):
-    logger.info(message)  # Ispis na konzolu
-    with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
-        cursor = conn.cursor()
-        now = time.strftime("%Y-%m-%d %H:%M:%S")
-        cursor.execute("INSERT INTO bot_logs (timestamp, message) VALUES (?, ?)", (now, message))
-        conn.commit()
-
 # DB setup
 DB_PATH = Path(os.getenv("DB_PATH", Path(__file__).resolve().parent / "user_data" / "chovusbot.db"))
 DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+db = Storage(DB_PATH)  # Jedna dugoživeća konekcija po niti, WAL, batch upisi logova i kandidata
+retention = Retention(db)  # bot_logs/candidates/score_log ne rastu neograničeno; rollup + vacuum u pozadini
+
+# log_action samo stavlja zapis u ograničen red; konzolu i bot_logs tabelu puni pozadinska nit (QueueListener)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()  # DEBUG uključuje i logove po simbolu
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+_log_stats = {"enqueued": 0, "dropped": 0, "written": 0}
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            _log_stats["enqueued"] += 1
+        except queue.Full:
+            _log_stats["dropped"] += 1
+
+class _BotLogsHandler(logging.Handler):
+    def emit(self, record):
+        try:
+            now = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.created))
+            message = record.getMessage()
+            db.enqueue("INSERT INTO bot_logs (timestamp, message) VALUES (?, ?)", (now, message))
+            _log_stats["written"] += 1
+            bus.publish("log", {"time": now, "message": message})
+        except Exception:
+            self.handleError(record)
+
+_log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+_console_handler = logging.StreamHandler()
+_console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+action_logger = logging.getLogger("chovusbot.actions")
+action_logger.setLevel(LOG_LEVEL)
+action_logger.propagate = False
+action_logger.addHandler(_DroppingQueueHandler(_log_queue))
+_log_listener = logging.handlers.QueueListener(_log_queue, _console_handler, _BotLogsHandler())
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+def log_action(message, level=logging.INFO):
+    action_logger.log(level, message)
+
+def log_stats():
+    return {**_log_stats, "queued": _log_queue.qsize(), "capacity": LOG_QUEUE_SIZE, "level": logging.getLevelName(action_logger.level)}
 
 def init_db():
-    with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
-        cursor = conn.cursor()
-        cursor.execute('''CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT)''')
-        cursor.execute('''CREATE TABLE IF NOT EXISTS trades (id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT, price REAL, timestamp TEXT, outcome TEXT)''')
-        cursor.execute('''CREATE TABLE IF NOT EXISTS score_log (timestamp TEXT, score INTEGER)''')
-        cursor.execute('''CREATE TABLE IF NOT EXISTS bot_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, message TEXT)''')
-        cursor.execute('''CREATE TABLE IF NOT EXISTS candidates (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, symbol TEXT, price REAL, score REAL)''')
-        conn.commit()
+    db.executescript('''
+        CREATE TABLE IF NOT EXISTS config (key TEXT PRIMARY KEY, value TEXT);
+        CREATE TABLE IF NOT EXISTS trades (id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT, price REAL, timestamp TEXT, outcome TEXT);
+        CREATE TABLE IF NOT EXISTS score_log (timestamp TEXT, score INTEGER);
+        CREATE TABLE IF NOT EXISTS bot_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, message TEXT);
+        CREATE TABLE IF NOT EXISTS candidates (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, symbol TEXT, price REAL, score REAL);
+        CREATE TABLE IF NOT EXISTS symbol_stats (symbol TEXT PRIMARY KEY, trades INTEGER, wins INTEGER, losses INTEGER, timeouts INTEGER, pnl REAL, pnl_pct REAL, win_pnl_pct REAL, loss_pnl_pct REAL, hold_seconds REAL, last_outcome TEXT, updated_at TEXT);
+        CREATE TABLE IF NOT EXISTS executions (id INTEGER PRIMARY KEY AUTOINCREMENT, client_order_id TEXT, symbol TEXT, side TEXT, quantity REAL, fill_price REAL, status TEXT, signal_at REAL, submitted_at REAL, ack_at REAL, filled_at REAL, signal_to_ack_ms REAL, signal_to_fill_ms REAL, error TEXT);
+        CREATE TABLE IF NOT EXISTS positions (symbol TEXT PRIMARY KEY, quantity REAL, entry_price REAL, highest_price REAL, tp REAL, sl REAL, opened_at REAL, deadline REAL, score REAL, mode TEXT, sl_order_id TEXT, sl_client_id TEXT, tp_order_id TEXT, tp_client_id TEXT, updated_at REAL);
+        CREATE TABLE IF NOT EXISTS candles (symbol TEXT, timeframe TEXT, timestamp INTEGER, open REAL, high REAL, low REAL, close REAL, volume REAL, PRIMARY KEY (symbol, timeframe, timestamp));
+    ''')
+    # Starije baze (i ona u repou) nemaju kolone dodate kasnije
+    _ensure_columns("trades", {"outcome": "TEXT", "entry_price": "REAL", "pnl": "REAL", "pnl_pct": "REAL", "hold_seconds": "REAL"})
+    _ensure_columns("candidates", {"crossover": "INTEGER", "fib_zone": "INTEGER", "smma": "REAL", "wma": "REAL",
+                                   "fib_382": "REAL", "fib_618": "REAL", "volume": "REAL", "avg_volume": "REAL"})
+    db.executescript('''
+        CREATE INDEX IF NOT EXISTS idx_candidates_signal ON candidates(id) WHERE crossover = 1 AND fib_zone = 1;
+        CREATE INDEX IF NOT EXISTS idx_trades_outcome ON trades(outcome, id);
+        CREATE INDEX IF NOT EXISTS idx_executions_client ON executions(client_order_id);
+    ''')
+    retention.init_schema()
+
+def _ensure_columns(table, columns):
+    existing = {row[1] for row in db.query(f"PRAGMA table_info({table})")}
+    for name, sql_type in columns.items():
+        if name not in existing:
+            db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {sql_type}")
 
 init_db()  # Inicijalizuj bazu pri pokretanju
+# retention.start() zovu start_bot i backend startup - import (benchmark, skripte) ne pokreće brisanje i vacuum
 
 def get_config(key: str, default=None):
-    with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT value FROM config WHERE key=?", (key,))
-        result = cursor.fetchone()
-        return result[0] if result else default
+    result = db.query_one("SELECT value FROM config WHERE key=?", (key,))
+    return result[0] if result else default
 
 def set_config(key: str, value: str):
-    with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
-        cursor = conn.cursor()
-        cursor.execute("REPLACE INTO config (key, value) VALUES (?, ?)", (key, value))
-        conn.commit()
+    db.execute("REPLACE INTO config (key, value) VALUES (?, ?)", (key, value))
+    if key in ("balance", "score"):
+        bus.publish("balance", {"wallet_balance": get_config("balance", "0"), "score": get_config("score", "0")})
+    bus.publish("config", {"key": key})
 
 def get_all_config():
-    with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT key, value FROM config")
-        return {k: v for k, v in cursor.fetchall()}
-
-def log_trade(symbol, price, outcome):
-    with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
-        cursor = conn.cursor()
-        now = time.strftime("%Y-%m-%d %H:%M:%S")
-        cursor.execute("INSERT INTO trades (symbol, price, timestamp, outcome) VALUES (?, ?, ?, ?)", (symbol, price, now, outcome))
-        conn.commit()
+    return {k: v for k, v in db.query("SELECT key, value FROM config")}
+
+# symbol_stats je agregat po simbolu koji se ažurira uz svaki trejd (ista transakcija), pa analitika i
+# smart_allocation nikad ne skeniraju celu trades tabelu. Dobitak = TP ili TIMEOUT_PROFIT; pnl je promena
+# balansa kako je bot knjiži, pnl_pct pomeraj cene od ulaza u % (bez leverage-a).
+WIN_OUTCOMES = ("TP", "TIMEOUT_PROFIT")
+_SYMBOL_STATS_UPSERT = '''
+    INSERT INTO symbol_stats (symbol, trades, wins, losses, timeouts, pnl, pnl_pct, win_pnl_pct, loss_pnl_pct, hold_seconds, last_outcome, updated_at)
+    VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(symbol) DO UPDATE SET
+        trades = trades + 1, wins = wins + excluded.wins, losses = losses + excluded.losses,
+        timeouts = timeouts + excluded.timeouts, pnl = pnl + excluded.pnl, pnl_pct = pnl_pct + excluded.pnl_pct,
+        win_pnl_pct = win_pnl_pct + excluded.win_pnl_pct, loss_pnl_pct = loss_pnl_pct + excluded.loss_pnl_pct,
+        hold_seconds = hold_seconds + excluded.hold_seconds, last_outcome = excluded.last_outcome,
+        updated_at = excluded.updated_at
+'''
+
+def _symbol_stats_row(symbol, outcome, pnl, pnl_pct, hold_seconds, now):
+    win = outcome in WIN_OUTCOMES
+    return (symbol, int(win), int(not win), int(outcome.startswith("TIMEOUT")), pnl or 0.0, pnl_pct or 0.0,
+            (pnl_pct or 0.0) if win else 0.0, 0.0 if win else (pnl_pct or 0.0), hold_seconds or 0.0, outcome, now)
+
+def _record_trade(conn, symbol, price, outcome, entry_price, pnl, hold_seconds, now):
+    pnl_pct = (price / entry_price - 1) * 100 if entry_price else None
+    conn.execute("INSERT INTO trades (symbol, price, timestamp, outcome, entry_price, pnl, pnl_pct, hold_seconds) "
+                 "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (symbol, price, now, outcome, entry_price, pnl, pnl_pct, hold_seconds))
+    conn.execute(_SYMBOL_STATS_UPSERT, _symbol_stats_row(symbol, outcome, pnl, pnl_pct, hold_seconds, now))
+
+def log_trade(symbol, price, outcome, entry_price=None, pnl=None, hold_seconds=None):
+    now = time.strftime("%Y-%m-%d %H:%M:%S")
+    with db.transaction() as conn:
+        _record_trade(conn, symbol, price, outcome, entry_price, pnl, hold_seconds, now)
+    bus.publish("trade", {"symbol": symbol, "price": price, "time": now, "outcome": outcome, "pnl": pnl})
+
+# Žurnal otvorenih pozicija: red po simbolu sa svim što _monitor_trade/_monitor_bracket drži u memoriji, pa
+# restart procesa nastavlja praćenje (resume_positions). Svaka promena stanja je jedna naredba, a zatvaranje
+# (trade + symbol_stats + balance/score + brisanje reda) jedna transakcija - nema poluzavršenog trejda.
+POSITION_COLUMNS = ("symbol", "quantity", "entry_price", "highest_price", "tp", "sl", "opened_at", "deadline", "score",
+                    "mode", "sl_order_id", "sl_client_id", "tp_order_id", "tp_client_id", "updated_at")
+# balance/score se uvećavaju u SQL-u umesto get_config + set_config (read-modify-write između dva upita)
+_CONFIG_ADD = ("INSERT INTO config (key, value) VALUES (?, ?) "
+               "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS REAL) + CAST(excluded.value AS REAL)")
+
+def journal_position(symbol, **fields):
+    fields["updated_at"] = time.time()
+    columns = ", ".join(fields)
+    db.execute(f"INSERT INTO positions (symbol, {columns}) VALUES (?{', ?' * len(fields)}) "
+               f"ON CONFLICT(symbol) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in fields)}",
+               (symbol, *fields.values()))
+
+def load_positions():
+    return [dict(zip(POSITION_COLUMNS, row)) for row in db.query(f"SELECT {', '.join(POSITION_COLUMNS)} FROM positions")]
+
+def delete_position(symbol):
+    db.execute("DELETE FROM positions WHERE symbol = ?", (symbol,))
+
+def close_position(symbol, price, outcome, entry_price, pnl, hold_seconds, score_delta):
+    now = time.strftime("%Y-%m-%d %H:%M:%S")
+    with db.transaction() as conn:
+        _record_trade(conn, symbol, price, outcome, entry_price, pnl, hold_seconds, now)
+        conn.executemany(_CONFIG_ADD, (("balance", pnl), ("score", score_delta)))
+        conn.execute("DELETE FROM positions WHERE symbol = ?", (symbol,))
+    bus.publish("trade", {"symbol": symbol, "price": price, "time": now, "outcome": outcome, "pnl": pnl})
+    bus.publish("balance", {"wallet_balance": get_config("balance", "0"), "score": get_config("score", "0")})
+
+def rebuild_symbol_stats():
+    """Puno preračunavanje iz trades (start na staroj bazi ili ručna popravka) - nije za petlju."""
+    rows = db.query("SELECT symbol, outcome, pnl, pnl_pct, hold_seconds, timestamp FROM trades WHERE outcome IS NOT NULL ORDER BY id")
+    with db.transaction() as conn:
+        conn.execute("DELETE FROM symbol_stats")
+        conn.executemany(_SYMBOL_STATS_UPSERT, [_symbol_stats_row(*row) for row in rows])
+    return len(rows)
+
+def _symbol_stats_dict(row):
+    symbol, trades, wins, losses, timeouts, pnl, pnl_pct, win_pnl_pct, loss_pnl_pct, hold_seconds, last_outcome, updated_at = row
+    return {
+        "symbol": symbol, "trades": trades, "wins": wins, "losses": losses, "timeouts": timeouts,
+        "win_rate": wins / trades, "pnl": pnl, "expectancy_pct": pnl_pct / trades,
+        "avg_win_pct": win_pnl_pct / wins if wins else 0.0, "avg_loss_pct": loss_pnl_pct / losses if losses else 0.0,
+        "avg_hold_seconds": hold_seconds / trades, "last_outcome": last_outcome, "updated_at": updated_at,
+    }
+
+def get_symbol_stats(symbol=None):
+    """Jedan simbol (dict ili None) ili svi, sortirani po ukupnom PnL-u."""
+    columns = "symbol, trades, wins, losses, timeouts, pnl, pnl_pct, win_pnl_pct, loss_pnl_pct, hold_seconds, last_outcome, updated_at"
+    if symbol is not None:
+        row = db.query_one(f"SELECT {columns} FROM symbol_stats WHERE symbol = ?", (symbol,))
+        return _symbol_stats_dict(row) if row else None
+    return [_symbol_stats_dict(row) for row in db.query(f"SELECT {columns} FROM symbol_stats ORDER BY pnl DESC")]
+
+if db.query_one("SELECT COUNT(*) FROM symbol_stats")[0] == 0:
+    rebuild_symbol_stats()  # jednom, za baze sa trejdovima od pre symbol_stats tabele
 
 def log_score(score):
-    with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
-        cursor = conn.cursor()
-        now = time.strftime("%Y-%m-%d %H:%M:%S")
-        cursor.execute("INSERT INTO score_log (timestamp, score) VALUES (?, ?)", (now, score))
-        conn.commit()
-
-# U ChovusSmartBot_v9.py, popravljena metoda export_candidates_to_json i log_candidate
-def log_candidate(symbol, price, score):
-    with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
-        cursor = conn.cursor()
-        now = time.strftime("%Y-%m-%d %H:%M:%S")
-        cursor.execute("INSERT INTO candidates (timestamp, symbol, price, score) VALUES (?, ?, ?, ?)", (now, symbol, price, score))
-        conn.commit()
-    export_candidates_to_json()  # Poziv bez argumenata
+    now = time.strftime("%Y-%m-%d %H:%M:%S")
+    db.execute("INSERT INTO score_log (timestamp, score) VALUES (?, ?)", (now, score))
+
+# Kandidati idu u batch red; JSON export se radi jednom po skeniranju (_scan_pairs), ne po redu.
+# Uz score se čuvaju i zastavice/indikatori iz skeniranja, pa /api/signals ne mora da skida sveće.
+def log_candidate(symbol, price, score, crossover=None, fib_zone=None, smma=None, wma=None, fib_382=None,
+                  fib_618=None, volume=None, avg_volume=None):
+    now = time.strftime("%Y-%m-%d %H:%M:%S")
+    db.enqueue(
+        "INSERT INTO candidates (timestamp, symbol, price, score, crossover, fib_zone, smma, wma, fib_382, fib_618, volume, avg_volume) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (now, symbol, price, score, None if crossover is None else int(crossover),
+         None if fib_zone is None else int(fib_zone), smma, wma, fib_382, fib_618, volume, avg_volume))
 
 # U ChovusSmartBot_v9.py, uklonjena suvišna definicija i zadržana ispravna verzija
-def export_candidates_to_json():
+def export_candidates_to_json(candidates=None):
+    """candidates.json; skeniranje predaje svoj vrh liste iz memorije, bez liste se čita baza (blokira, flush + upit)."""
     try:
-        log_action("Exporting candidates to JSON...")
-        with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT timestamp, symbol, price, score FROM candidates ORDER BY id DESC LIMIT 10")
-            candidates = [{"time": t, "symbol": s, "price": p, "score": sc} for t, s, p, sc in cursor.fetchall()]
-            json_path = DB_PATH.parent / "candidates.json"
-            log_action(f"Writing candidates to {json_path}")
-            with open(json_path, "w") as f:
-                json.dump(candidates, f, indent=2)
-            log_action("Candidates exported to JSON successfully.")
+        log_action("Exporting candidates to JSON...", logging.DEBUG)
+        if candidates is None:
+            db.flush()
+            rows = db.query("SELECT timestamp, symbol, price, score FROM candidates ORDER BY id DESC LIMIT 10")
+            candidates = [{"time": t, "symbol": s, "price": p, "score": sc} for t, s, p, sc in rows]
+        json_path = DB_PATH.parent / "candidates.json"
+        log_action(f"Writing candidates to {json_path}", logging.DEBUG)
+        with open(json_path, "w") as f:
+            json.dump(candidates, f, indent=2)
+        log_action("Candidates exported to JSON successfully.", logging.DEBUG)
     except Exception as e:
         log_action(f"Error exporting candidates to JSON: {e}")
 
-
-def log_action(message):
-    with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
-        cursor = conn.cursor()
-        now = time.strftime("%Y-%m-%d %H:%M:%S")
-        cursor.execute("INSERT INTO bot_logs (timestamp, message) VALUES (?, ?)", (now, message))
-        conn.commit()
-
 # Constants
 SYMBOLS = []
-ROUND_LEVELS = [0.01, 0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000]
-VOLUME_SPIKE_THRESHOLD = 1.5
-TRADE_DURATION_LIMIT = 60 * 10
-STOP_LOSS_PERCENT = 0.01
-TRAILING_TP_STEP = 0.005
-TRAILING_TP_OFFSET = 0.02
+# Parametri strategije (ROUND_LEVELS, SCORE_WEIGHTS, STOP_LOSS_PERCENT, ...) su u strategy.py - deli ih backtest
+SCAN_CONCURRENCY = int(os.getenv("SCAN_CONCURRENCY", "10"))  # max paralelnih fetch_ohlcv zahteva
+BINANCE_WEIGHT_LIMIT = 2400  # USD-M futures limit tezine po minutu
+RATE_LIMIT_BACKOFF = 2  # pocetni backoff u sekundama na 429/418, udvostrucava se
+RATE_LIMIT_MAX_RETRIES = 5
+PRICE_STALE_SECONDS = 3  # posle koliko sekundi bez tick-a _monitor_trade pita REST
+TICK_PUBLISH_INTERVAL = 0.5  # najčešće slanje cene otvorene pozicije dashboard-u (po simbolu)
+
+# Metrike za /metrics (metrics.py); labele namerno bez simbola da broj serija ostane mali
+SCAN_STAGE_SECONDS = metrics.histogram("chovusbot_scan_stage_seconds", "Duration of each _scan_pairs stage", ("stage",))
+SCAN_SYMBOLS = metrics.gauge("chovusbot_scan_symbols", "Symbols at each stage of the last scan", ("stage",))
+CANDLE_FETCH_SECONDS = metrics.histogram("chovusbot_candle_fetch_seconds", "Per-symbol get_candles latency during scans")
+CANDLE_FETCH_ERRORS = metrics.counter("chovusbot_candle_fetch_errors_total", "Failed candle fetches", ("reason",))
+RATE_LIMIT_WAIT_SECONDS = metrics.counter("chovusbot_rate_limit_wait_seconds_total", "Time spent waiting on exchange rate limits")
+ORDER_SECONDS = metrics.histogram("chovusbot_order_seconds", "Market order round-trip latency", ("side",))
+ORDERS = metrics.counter("chovusbot_orders_total", "Market orders sent", ("side", "status"))
+OPEN_LONG_SECONDS = metrics.histogram("chovusbot_open_long_seconds", "Time from decision to filled entry in _open_long")
+TRADE_SECONDS = metrics.histogram("chovusbot_trade_seconds", "Position lifetime in _monitor_trade",
+                                  buckets=(10, 30, 60, 120, 300, 600, 1200, 3600))
+TRADES = metrics.counter("chovusbot_trades_total", "Finished trades by outcome", ("outcome",))
+# Pre-filter iz fetch_tickers pre skidanja sveća (scoring.prefilter); PREFILTER_TOP_N=0 isključuje top-N rez
+PREFILTER_TOP_N = int(os.getenv("PREFILTER_TOP_N", "100"))
+PREFILTER_MIN_QUOTE_VOLUME = float(os.getenv("PREFILTER_MIN_QUOTE_VOLUME", "0"))  # USDT za 24h
+PREFILTER_MAX_SPREAD = float(os.getenv("PREFILTER_MAX_SPREAD", "0.005"))  # (ask - bid) / mid
+PREFILTER_MIN_CHANGE_PCT = float(os.getenv("PREFILTER_MIN_CHANGE_PCT", "0"))  # |24h promena| u %
+# Order book signali (orderbook_service.py) za najboljih ORDERBOOK_SYMBOLS kandidata; 0 (podrazumevano) isključuje
+ORDERBOOK_SYMBOLS = int(os.getenv("ORDERBOOK_SYMBOLS", "0"))
+ORDERBOOK_SCORE_WEIGHT = float(os.getenv("ORDERBOOK_SCORE_WEIGHT", "0.1"))  # LONG dodaje, SHORT oduzima od score-a
+ORDERBOOK_MAX_AGE = float(os.getenv("ORDERBOOK_MAX_AGE", "5"))  # stariji signal se ne računa
+ORDERBOOK_WALL_NOTIONAL = float(os.getenv("ORDERBOOK_WALL_NOTIONAL", "50000"))  # USDT vrednost nivoa za "zid"
+# BRACKET_ORDERS=1: SL i trailing TP kao reduce-only nalozi na berzi; fill stiže kroz user-data događaje
+BRACKET_ORDERS = os.getenv("BRACKET_ORDERS", "0") == "1"
+BRACKET_RECONCILE_INTERVAL = float(os.getenv("BRACKET_RECONCILE_INTERVAL", "60"))  # REST provera za propuštene događaje
+
+def create_exchange():
+    """EXCHANGE_MODE=sim (ili config exchange_mode) -> lokalna simulirana berza umesto Binance-a."""
+    mode = os.getenv("EXCHANGE_MODE") or get_config("exchange_mode", "live")
+    if mode == "sim":
+        log_action("Using simulated exchange (paper trading).")
+        return SimulatedExchange.from_env()
+    return ccxt.binance({
+        'apiKey': os.getenv('API_KEY'),
+        'secret': os.getenv('API_SECRET'),
+        'enableRateLimit': True,
+        'options': {'defaultType': 'future'}
+    })
+
 
 class ChovusSmartBot:
     def __init__(self):
@@ -133,14 +316,43 @@ class ChovusSmartBot:
         self.current_strategy = "Default"
         self.leverage = int(get_config("leverage", "10"))
         self.manual_amount = float(get_config("manual_amount", "0"))
+        self.max_open_positions = int(get_config("max_open_positions", "3"))
+        self.max_symbol_exposure = float(get_config("max_symbol_exposure", "0.3"))  # max udeo balansa po simbolu
+        self.positions = {}  # symbol -> {"entry_price", "score", "opened_at", "task"}
+        self._learned_trades = None  # broj trejdova u poslednjem logovanom sažetku (learn_from_history)
         self._bot_task = None
+        self._stopping = asyncio.Event()  # budi _monitor_bracket odmah na stop_bot, bez čekanja na sledeći reconcile
         self._telegram_report_thread = None
-        self.exchange = ccxt.binance({
-            'apiKey': os.getenv('API_KEY'),
-            'secret': os.getenv('API_SECRET'),
-            'enableRateLimit': True,
-            'options': {'defaultType': 'future'}
-        })
+        self._rate_limited_until = 0.0
+        self._weight_headers_seen = None  # zaglavlja odgovora već obrađena u _respect_weight_limit
+        self._weight_waited_window = -1  # poslednji minut (epoch // 60) koji je odčekan zbog težine
+        self.last_scan_stats = {}
+        self.candle_cache = CandleCache(db)
+        self.exchange = create_exchange()
+        # exchangeInfo sa diska, osvežava se u pozadini posle MARKETS_CACHE_TTL (simulirana berza samo u memoriji)
+        self.markets_cache = MarketsCache(None if isinstance(self.exchange, SimulatedExchange) else markets_cache_path(self.exchange.id))
+        # PRICE_FEED_REPLAY=putanja.jsonl pušta snimljene tick-ove umesto Binance streama (testovi)
+        replay = os.getenv("PRICE_FEED_REPLAY")
+        if replay:
+            self.price_feed = ReplayPriceFeed(replay)
+        elif isinstance(self.exchange, SimulatedExchange):
+            self.price_feed = self.exchange.create_price_feed()
+        else:
+            self.price_feed = PriceFeed()
+        # ORDERBOOK_REPLAY=putanja.jsonl pušta snimljene depth poruke (orderbook_service.py --record)
+        # Preciznost cene po simbolu iz učitanih tržišta (markets_cache), pa book zna svoje decimale
+        orderbook_replay = os.getenv("ORDERBOOK_REPLAY")
+        orderbook_options = {"price_precision": lambda symbol: futures_price_precision(self.exchange.markets or {}, symbol),
+                             "wall_notional": ORDERBOOK_WALL_NOTIONAL}
+        if orderbook_replay:
+            self.orderbook = ReplayOrderBookService(orderbook_replay, **orderbook_options)
+        elif ORDERBOOK_SYMBOLS and not isinstance(self.exchange, SimulatedExchange):
+            self.orderbook = OrderBookService(**orderbook_options)
+        else:
+            self.orderbook = None
+        # Balans/leverage u memoriji (user-data stream ili pozadinsko osvežavanje) - nalog je jedan REST poziv
+        self.execution = ExecutionEngine(self.exchange, self.price_feed, db, log=log_action)
+        metrics.register_collector(self._collect_metrics)
         if get_config("balance") is None:
             set_config("balance", "1000.0")
         if get_config("score") is None:
@@ -154,7 +366,11 @@ class ChovusSmartBot:
             return
         log_action("Bot starting...")
         self.running = True
+        set_config("bot_running", "1")  # backend posle restarta procesa ponovo pokreće bota (i preuzima pozicije)
+        self._stopping.clear()
+        self._publish_status()
         self._bot_task = asyncio.create_task(self._main_bot_loop())
+        retention.start()
         if self._telegram_report_thread is None or not self._telegram_report_thread.is_alive():
             self._telegram_report_thread = threading.Thread(target=self._send_report_loop, daemon=True)
             self._telegram_report_thread.start()
@@ -166,80 +382,107 @@ class ChovusSmartBot:
             return
         log_action("Bot stopping...")
         self.running = False
+        self._stopping.set()
+        set_config("bot_running", "0")
+        self._publish_status()
 
     def get_bot_status(self):
         return "Running" if self.running else "Stopped"
 
+    def _publish_status(self):
+        bus.publish("status", {"status": self.get_bot_status(), "strategy": self.current_strategy})
+
     def set_bot_strategy(self, strategy_name: str):
         self.current_strategy = strategy_name
         log_action(f"Strategy set to: {strategy_name}")
+        self._publish_status()
         return strategy_name
 
     def set_leverage(self, leverage: int):
         self.leverage = leverage
         log_action(f"Leverage set to: {leverage}x")
-        try:
-            self.exchange.set_leverage(leverage, symbol=None)
-        except Exception as e:
-            log_action(f"Error setting leverage: {e}")
+        # Binance leverage je po simbolu; nova vrednost se postavlja u prewarm-u pre sledećeg naloga
+        self.execution.invalidate_leverage()
 
     def set_manual_amount(self, amount: float):
         self.manual_amount = amount
         log_action(f"Manual amount set to: {amount} USDT")
 
-    def smart_allocation(self, score):
+    def set_position_limits(self, max_open_positions: int, max_symbol_exposure: float):
+        self.max_open_positions = max_open_positions
+        self.max_symbol_exposure = max_symbol_exposure
+        log_action(f"Position limits set to: {max_open_positions} open, {max_symbol_exposure:.0%} per symbol")
+
+    def smart_allocation(self, score, symbol=None):
         if self.manual_amount > 0:
-            return self.manual_amount / float(get_config("balance", "1000"))
-        if score > 0.9:
-            return 0.5
-        elif score > 0.8:
-            return 0.3
-        elif score > 0.7:
-            return 0.2
-        else:
-            return 0.1
+            return min(self.manual_amount / float(get_config("balance", "1000")), self.max_symbol_exposure)
+        alloc = allocation_for_score(score, self.max_symbol_exposure)
+        stats = get_symbol_stats(symbol) if symbol else None
+        if stats:
+            alloc *= performance_weight(stats["trades"], stats["wins"])
+        return min(alloc, self.max_symbol_exposure)
+
+    def _collect_metrics(self):
+        # Postojeći stats rečnici se čitaju tek pri scrape-u, bez dodatnog posla na vrućoj putanji
+        yield "chovusbot_open_positions", "gauge", "Open positions", [({}, len(self.positions))]
+        yield "chovusbot_candle_cache_requests_total", "counter", "Candle cache lookups by result", [
+            ({"result": k}, v) for k, v in self.candle_cache.stats.items()]
+        yield "chovusbot_price_feed_events_total", "counter", "Price feed ticks and reconnects", [
+            ({"event": k}, v) for k, v in self.price_feed.stats.items()]
+        yield "chovusbot_log_records_total", "counter", "Log records by fate", [
+            ({"state": k}, v) for k, v in _log_stats.items()]
+        yield "chovusbot_log_queue_size", "gauge", "Log records waiting for the writer", [({}, _log_queue.qsize())]
+        yield "chovusbot_markets_cache_total", "counter", "Markets cache loads and refreshes", [
+            ({"event": k}, v) for k, v in self.markets_cache.stats.items()]
+        yield "chovusbot_execution_events_total", "counter", "Execution engine orders, refreshes and stream events", [
+            ({"event": k}, v) for k, v in self.execution.stats.items()]
+        if self.execution.balance is not None:
+            yield "chovusbot_execution_balance_age_seconds", "gauge", "Age of the cached balance used for sizing", [
+                ({}, time.monotonic() - self.execution.balance_updated)]
+        if self.orderbook:
+            yield "chovusbot_orderbook_events_total", "counter", "Order book service messages, snapshots and reconnects", [
+                ({"event": k}, v) for k, v in self.orderbook.stats.items()]
+            yield "chovusbot_orderbook_symbols", "gauge", "Symbols on the depth stream", [({}, len(self.orderbook.books))]
+
+    def get_open_positions(self):
+        return [{"symbol": s, "entry_price": p["entry_price"], "score": p["score"], "opened_at": p["opened_at"]}
+                for s, p in self.positions.items()]
 
     async def learn_from_history(self):
+        # Čita samo symbol_stats (red po simbolu); sažetak se loguje tek kad se pojavi nov trejd
         try:
-            with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT symbol, price, outcome FROM trades")
-                data = cursor.fetchall()
-                df = pd.DataFrame(data, columns=['symbol', 'price', 'outcome'])
-                if df.empty:
-                    log_action("No trade data to learn from.")
-                    return
-                summary = df.groupby("symbol")["outcome"].value_counts().unstack().fillna(0)
-                log_action(f"Performance summary: {summary.to_dict()}")
+            stats = get_symbol_stats()
+            total = sum(s["trades"] for s in stats)
+            if total == self._learned_trades:
+                return
+            self._learned_trades = total
+            summary = {s["symbol"]: {"W": s["wins"], "L": s["losses"], "T": s["timeouts"],
+                                     "exp%": round(s["expectancy_pct"], 2)} for s in stats}
+            log_action(f"Performance summary ({total} trades): {summary}")
         except Exception as e:
             log_action(f"Error analyzing history: {e}")
 
     async def get_candles(self, symbol, timeframe='15m', limit=100):  #ovaj korak kao i ai score-preskacem-proveriti PRE
-        ohlcv = await self.exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
-        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        return df
+        # Keš vraća sačuvane sveće i sa berze traži samo one posle poslednjeg timestamp-a
+        return await self.candle_cache.get(self.exchange, symbol, timeframe=timeframe, limit=limit)
 
     def calc_smma(self, series, length):
-        smma = [series.iloc[0]]
-        for i in range(1, len(series)):
-            smma.append((smma[-1] * (length - 1) + series.iloc[i]) / length)
-        return pd.Series(smma, index=series.index)
+        return pd.Series(indicators.smma(series.to_numpy(dtype=float), length), index=series.index)
 
     def calc_wma(self, series, length):
-        weights = range(1, length + 1)
-        return series.rolling(length).apply(
-            lambda prices: sum(weights[i] * prices[i] for i in range(length)) / sum(weights), raw=True)
+        return pd.Series(indicators.wma(series.to_numpy(dtype=float), length), index=series.index)
 
     def confirm_smma_wma_crossover(self, df):
-        if len(df) < 144: return False
-        smma = self.calc_smma(df['close'], 5)
-        wma = self.calc_wma(df['close'], 144)
-        return smma.iloc[-2] < wma.iloc[-2] and smma.iloc[-1] > wma.iloc[-1]
+        if len(df) < WMA_LENGTH: return False
+        close = df['close'].to_numpy(dtype=float)
+        smma = indicators.smma(close, SMMA_LENGTH)
+        wma = indicators.wma(close, WMA_LENGTH)
+        return bool(smma[-2] < wma[-2] and smma[-1] > wma[-1])
 
     def fib_zone_check(self, df):
-        if len(df) < 50: return False
-        high = df['high'].rolling(50).max()
-        low = df['low'].rolling(50).min()
+        if len(df) < FIB_WINDOW: return False
+        high = df['high'].rolling(FIB_WINDOW).max()
+        low = df['low'].rolling(FIB_WINDOW).min()
         fib_range = high - low
         fib_382 = high - fib_range * 0.382
         fib_618 = high - fib_range * 0.618
@@ -254,19 +497,109 @@ class ChovusSmartBot:
 
     def ai_score(self, price, volume, avg_volume, crossover, in_fib_zone): #zapazanja i preporuke, kao
         score = 0
-        if self.is_near_round(price): score += 1
-        if volume > avg_volume * VOLUME_SPIKE_THRESHOLD: score += 1
-        if crossover: score += 1.2  # Smanjeno sa 1.5
-        if in_fib_zone: score += 0.8  # Povećano sa 0.5
+        if self.is_near_round(price): score += SCORE_WEIGHTS["round"]
+        if volume > avg_volume * VOLUME_SPIKE_THRESHOLD: score += SCORE_WEIGHTS["volume"]
+        if crossover: score += SCORE_WEIGHTS["crossover"]
+        if in_fib_zone: score += SCORE_WEIGHTS["fib"]
         return min(score / 4.0, 1.0)
 
+    def score_candidates(self, frames, ticker_data):
+        """Slaže sveće svih simbola u matrice (simboli x sveće) i ocenjuje ih u jednom prolazu."""
+        symbols = list(frames)
+        if not symbols:
+            return pd.DataFrame(columns=scoring.COLUMNS)
+        stacked = {col: np.stack([frames[s][col].to_numpy(dtype=float) for s in symbols])
+                   for col in ('close', 'high', 'low', 'volume')}
+        return scoring.score_batch(
+            symbols,
+            [ticker_data[s][0] for s in symbols],
+            [ticker_data[s][1] for s in symbols],
+            stacked['close'], stacked['high'], stacked['low'], stacked['volume'],
+            round_levels=ROUND_LEVELS, volume_spike_threshold=VOLUME_SPIKE_THRESHOLD, weights=SCORE_WEIGHTS,
+            smma_length=SMMA_LENGTH, wma_length=WMA_LENGTH, window=FIB_WINDOW)
+
+
+    def _retry_after(self, default):
+        headers = getattr(self.exchange, 'last_response_headers', None) or {}
+        value = headers.get('Retry-After') or headers.get('retry-after')
+        try:
+            return max(float(value), default) if value else default
+        except (TypeError, ValueError):
+            return default
+
+    @staticmethod
+    def _weight_window(headers):
+        # X-MBX-USED-WEIGHT-1M važi za minut u kom je odgovor poslat (Date), inače za trenutak čitanja
+        date = headers.get('Date') or headers.get('date')
+        try:
+            return int(email.utils.parsedate_to_datetime(date).timestamp() // 60) if date else int(time.time() // 60)
+        except (TypeError, ValueError):
+            return int(time.time() // 60)
+
+    async def _respect_weight_limit(self):
+        # Svi workeri cekaju dok traje backoff posle 429/418
+        wait = self._rate_limited_until - time.monotonic()
+        if wait > 0:
+            RATE_LIMIT_WAIT_SECONDS.inc(wait)
+            await asyncio.sleep(wait)
+        headers = getattr(self.exchange, 'last_response_headers', None) or {}
+        if not headers or headers is self._weight_headers_seen:
+            return  # nema novog odgovora od poslednje provere
+        self._weight_headers_seen = headers
+        used = headers.get('X-MBX-USED-WEIGHT-1M') or headers.get('x-mbx-used-weight-1m')
+        if used and int(used) >= BINANCE_WEIGHT_LIMIT * 0.9:
+            # Blizu limita tezine - sacekaj pocetak minuta posle onog na koji se zaglavlje odnosi
+            window = self._weight_window(headers)
+            pause = (window + 1) * 60 - time.time()
+            if window <= self._weight_waited_window or pause <= 0:
+                return  # taj minut je već odčekan ili je prošao
+            self._weight_waited_window = window
+            log_action(f"Used weight {used}/{BINANCE_WEIGHT_LIMIT}, pausing fetches for {pause:.0f}s")
+            self._rate_limited_until = max(self._rate_limited_until, time.monotonic() + pause)
+            RATE_LIMIT_WAIT_SECONDS.inc(pause)
+            await asyncio.sleep(pause)
+
+    async def _fetch_candles_limited(self, symbol, semaphore, timeframe='1h', limit=CANDLE_LIMIT):
+        """Vraca (symbol, df ili None, trajanje zahteva u sekundama); nikad ne baca izuzetak."""
+        started = time.perf_counter()
+        delay = RATE_LIMIT_BACKOFF
+        for attempt in range(1, RATE_LIMIT_MAX_RETRIES + 1):
+            async with semaphore:
+                await self._respect_weight_limit()
+                started = time.perf_counter()
+                try:
+                    df = await self.get_candles(symbol, timeframe=timeframe, limit=limit)
+                    elapsed = time.perf_counter() - started
+                    CANDLE_FETCH_SECONDS.observe(elapsed)
+                    return symbol, df, elapsed
+                except ccxt.DDoSProtection as e:  # RateLimitExceeded (429) i IP ban (418)
+                    CANDLE_FETCH_ERRORS.labels(reason="rate_limit").inc()
+                    wait = self._retry_after(delay)
+                    self._rate_limited_until = max(self._rate_limited_until, time.monotonic() + wait)
+                    log_action(f"Rate limited fetching {symbol} (attempt {attempt}/{RATE_LIMIT_MAX_RETRIES}): {type(e).__name__}, backing off {wait:.1f}s")
+                    delay *= 2
+                except Exception as e:
+                    CANDLE_FETCH_ERRORS.labels(reason="error").inc()
+                    log_action(f"Error fetching candles for {symbol}: {str(e)}")
+                    return symbol, None, time.perf_counter() - started
+        log_action(f"Giving up on {symbol} after {RATE_LIMIT_MAX_RETRIES} rate-limited attempts.")
+        return symbol, None, time.perf_counter() - started
 
-    # U ChovusSmartBot_v9.py, ažuriraj _scan_pairs sa dodatnim logovanjem
+    @staticmethod
+    def _ticker_spread(ticker):
+        # Binance futures 24h ticker često nema bid/ask - tada NaN i spread filter ne važi
+        bid, ask = ticker.get('bid'), ticker.get('ask')
+        if not bid or not ask:
+            return float('nan')
+        return (ask - bid) / ((ask + bid) / 2)
+
+    # U ChovusSmartBot_v9.py, _scan_pairs skida svece paralelno (ograniceno semaforom) i ocenjuje ih kako stizu
     async def _scan_pairs(self, limit=5):
         log_action("Starting pair scanning...")
+        scan_started = time.perf_counter()
+        tasks = []
         try:
-            log_action("Loading markets...")
-            markets = await self.exchange.load_markets()
+            markets = await self.markets_cache.ensure(self.exchange)
             all_futures = [s for s in markets if s.endswith("/USDT") and markets[s].get('future', False)]
             log_action(f"Found {len(all_futures)} futures pairs to scan: {all_futures[:5]}...")
 
@@ -282,187 +615,402 @@ class ChovusSmartBot:
                 log_action(f"Error fetching tickers: {str(e)}")
                 return []
 
-            pairs = []
-            for symbol in all_futures:
-                ticker = tickers.get(symbol)
-                if not ticker:
-                    log_action(f"No ticker data for {symbol}, skipping.")
+            prefilter_started = time.perf_counter()
+            listed = [s for s in all_futures if tickers.get(s)]
+            kept, eliminated = scoring.prefilter(
+                listed,
+                [tickers[s].get('last') or 0 for s in listed],
+                [tickers[s].get('quoteVolume') or 0 for s in listed],
+                [tickers[s].get('percentage') or 0 for s in listed],
+                [self._ticker_spread(tickers[s]) for s in listed],
+                round_levels=ROUND_LEVELS, top_n=PREFILTER_TOP_N, min_quote_volume=PREFILTER_MIN_QUOTE_VOLUME,
+                max_spread=PREFILTER_MAX_SPREAD, min_abs_change=PREFILTER_MIN_CHANGE_PCT)
+            eliminated = {"no_ticker": len(all_futures) - len(listed), **eliminated}
+            prefilter_elapsed = time.perf_counter() - prefilter_started
+            log_action(f"Pre-filter kept {len(kept)}/{len(all_futures)} pairs, eliminated {eliminated}")
+
+            semaphore = asyncio.Semaphore(SCAN_CONCURRENCY)
+            ticker_data = {}
+            for symbol in kept:
+                ticker_data[symbol] = (tickers[symbol]['last'], tickers[symbol]['quoteVolume'])
+                tasks.append(asyncio.create_task(self._fetch_candles_limited(symbol, semaphore, timeframe='1h', limit=CANDLE_LIMIT)))
+
+            fetch_started = time.perf_counter()
+            fetch_times = []
+            frames = {}
+            for next_done in asyncio.as_completed(tasks):
+                symbol, df, elapsed = await next_done
+                fetch_times.append(elapsed)
+                if df is None:
                     continue
-                try:
-                    volume = ticker.get('quoteVolume', 0)
-                    price = ticker.get('last', 0)
-                    if volume and price and price > 0:
-                        log_action(f"Fetching candles for {symbol}...")
-                        df = await self.get_candles(symbol, timeframe='1h', limit=150)
-                        if len(df) < 150:
-                            log_action(f"Not enough data for {symbol} (candles: {len(df)}), skipping.")
-                            continue
-                        log_action(f"Calculating indicators for {symbol}...")
-                        crossover = self.confirm_smma_wma_crossover(df)
-                        in_fib_zone = self.fib_zone_check(df)
-                        avg_volume = df['volume'].iloc[-50:].mean() if len(df) >= 50 else volume
-                        score = self.ai_score(price, volume, avg_volume, crossover, in_fib_zone)
-                        log_action(
-                            f"Scanned {symbol} | Price: {price:.4f} | Volume: {volume:.2f} | Score: {score:.2f} | Crossover: {crossover} | Fib Zone: {in_fib_zone}")
-                        log_candidate(symbol, price, score)
-                        if score > 0.4:  # Smanjen sa 0.5 na 0.4 ##########################################
-                            pairs.append((symbol, price, volume, score))
-                            log_action(f"Candidate selected: {symbol} | Price: {price:.4f} | Score: {score:.2f}")
-                    else:
-                        log_action(f"Invalid ticker data for {symbol} | Price: {price} | Volume: {volume}")
-                except Exception as e:
-                    log_action(f"Error scanning {symbol}: {str(e)}")
-            pairs.sort(key=lambda x: x[3], reverse=True)
+                if len(df) < CANDLE_LIMIT:
+                    log_action(f"Not enough data for {symbol} (candles: {len(df)}), skipping.", logging.DEBUG)
+                    continue
+                frames[symbol] = df.iloc[-CANDLE_LIMIT:]
+            fetch_elapsed = time.perf_counter() - fetch_started
+
+            score_started = time.perf_counter()
+            pairs = []
+            table = self.score_candidates(frames, ticker_data)
+            signal_at = time.time()  # početak merenja signal->ack/fill u executions
+            if self.orderbook:
+                table = scoring.apply_orderbook_bias(
+                    table, {s: self.orderbook.bias(s, ORDERBOOK_MAX_AGE) for s in table.symbol}, ORDERBOOK_SCORE_WEIGHT)
+            score_elapsed = time.perf_counter() - score_started
+            debug = action_logger.isEnabledFor(logging.DEBUG)
+            for row in table.itertuples(index=False):
+                if debug:
+                    log_action(
+                        f"Scanned {row.symbol} | Price: {row.price:.4f} | Volume: {row.volume:.2f} | Score: {row.score:.2f} | Crossover: {row.crossover} | Fib Zone: {row.fib_zone}",
+                        logging.DEBUG)
+                log_candidate(row.symbol, row.price, row.score, row.crossover, row.fib_zone, row.smma, row.wma,
+                              row.fib_382, row.fib_618, row.volume, row.avg_volume)
+                if row.score > CANDIDATE_SCORE_THRESHOLD:
+                    pairs.append((row.symbol, row.price, row.volume, row.score, signal_at))
+                    log_action(f"Candidate selected: {row.symbol} | Price: {row.price:.4f} | Score: {row.score:.2f}")
+            total = time.perf_counter() - scan_started
+            for stage, seconds in (("prefilter", prefilter_elapsed), ("fetch", fetch_elapsed), ("score", score_elapsed), ("total", total)):
+                SCAN_STAGE_SECONDS.labels(stage=stage).observe(seconds)
+            for stage, count in (("universe", len(all_futures)), ("fetched", len(tasks)), ("scored", len(table)), ("selected", len(pairs))):
+                SCAN_SYMBOLS.labels(stage=stage).set(count)
+            avg_fetch = sum(fetch_times) / len(fetch_times) if fetch_times else 0
+            skipped = len(all_futures) - len(tasks)
+            self.last_scan_stats = {
+                "universe": len(all_futures),
+                "prefilter_eliminated": eliminated,
+                "prefilter_seconds": round(prefilter_elapsed, 4),
+                # procena: preskočeni fetch-evi bi išli SCAN_CONCURRENCY paralelno, svaki ~avg_fetch
+                "estimated_seconds_saved": round(skipped * avg_fetch / SCAN_CONCURRENCY, 2),
+                "symbols": len(tasks),
+                "scored": len(table),
+                "fetch_seconds": round(fetch_elapsed, 3),
+                "avg_fetch_seconds": round(avg_fetch, 3),
+                "score_seconds": round(score_elapsed, 4),
+                "total_seconds": round(total, 3),
+                "concurrency": SCAN_CONCURRENCY,
+            }
+            # Vrh ovog skeniranja iz memorije: redovi kandidata su još u redu za upis, flush bi blokirao petlju
+            scanned_at = time.strftime("%Y-%m-%d %H:%M:%S")
+            top = [{"symbol": row.symbol, "price": row.price, "score": row.score, "time": scanned_at}
+                   for row in table.head(10).itertuples(index=False)]
+            export_candidates_to_json(top)
+            bus.publish("candidates", top)
+            bus.publish("scan_stats", self.last_scan_stats)
+            if self.orderbook:
+                # Depth stream za vrh liste: signal je spreman za sledeće skeniranje i za otvaranje pozicije
+                await self.orderbook.set_symbols(list(table.symbol[:ORDERBOOK_SYMBOLS]) + list(self.positions))
             log_action(f"Scanning complete. Selected {len(pairs)} candidates.")
+            log_action(
+                f"Scan timing: {len(tasks)}/{len(all_futures)} symbols fetched in {fetch_elapsed:.2f}s "
+                f"(avg {self.last_scan_stats['avg_fetch_seconds']:.2f}s/request, concurrency {SCAN_CONCURRENCY}), "
+                f"scored {len(table)} in {score_elapsed * 1000:.1f}ms, total {total:.2f}s, "
+                f"pre-filter saved ~{self.last_scan_stats['estimated_seconds_saved']:.2f}s")
             return pairs[:limit]
         except Exception as e:
             log_action(f"Error in pair scanning: {str(e)}")
             return []
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _next_price(self, symbol, deadline):
+        # Svaki tick sa WebSocket-a; REST samo kad tok kasni duže od PRICE_STALE_SECONDS
+        timeout = min(PRICE_STALE_SECONDS, deadline - time.time())
+        if timeout <= 0:
+            return None
+        price = await self.price_feed.next_price(symbol, timeout)
+        if price is None and time.time() < deadline:
+            log_action(f"Price stream stale for {symbol}, falling back to REST.", logging.DEBUG)
+            ticker = await self.exchange.fetch_ticker(symbol)
+            price = ticker['bid'] or ticker['last']  # isto polje kao bookTicker sa WebSocket-a
+        return price
+
+    # Bodovi po ishodu; TIMEOUT_* daje pola boda, pa se score čuva kao float
+    OUTCOME_SCORE = {"TP": 1, "SL": -1, "TIMEOUT_PROFIT": 0.5, "TIMEOUT_LOSS": -0.5}
+
+    def _settle_trade(self, symbol, state, price, outcome):
+        pnl = (price - state.entry_price) * self.leverage
+        close_position(symbol, price, outcome, state.entry_price, pnl, time.time() - state.opened_at,
+                       self.OUTCOME_SCORE[outcome])
+
+    def _keep_unclosed(self, symbol, reason):
+        # Prodaja nije prošla: red ostaje u žurnalu (bez bracket naloga, oni su otkazani) i simbol ostaje zauzet;
+        # resume_positions ga u sledećem krugu glavne petlje ponovo preuzima i pokušava zatvaranje
+        journal_position(symbol, mode="client", sl_order_id=None, sl_client_id=None, tp_order_id=None, tp_client_id=None)
+        log_action(f"Could not close {symbol} ({reason}), keeping it in the journal for retry.", logging.WARNING)
 
-    # U ChovusSmartBot_v9.py, uklonjena suvišna definicija i zadržana ispravna verzija
-    def export_candidates_to_json():
+    async def _close_timeout(self, symbol, state, quantity):
+        log_action(f"Trade for {symbol} timed out.")
         try:
-            log_action("Exporting candidates to JSON...")
-            with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT timestamp, symbol, price, score FROM candidates ORDER BY id DESC LIMIT 10")
-                candidates = [{"time": t, "symbol": s, "price": p, "score": sc} for t, s, p, sc in cursor.fetchall()]
-                json_path = DB_PATH.parent / "candidates.json"
-                log_action(f"Writing candidates to {json_path}")
-                with open(json_path, "w") as f:
-                    json.dump(candidates, f, indent=2)
-                log_action("Candidates exported to JSON successfully.")
+            order = await self._execute_sell_order(symbol, quantity)
+            if order is None:
+                self._keep_unclosed(symbol, "timeout")
+                return "ERROR_TIMEOUT"
+            price = order.get('average') or order.get('price') or (await self.exchange.fetch_ticker(symbol))['last']
+            self._settle_trade(symbol, state, price, state.timeout_outcome(price))
+            return "TIMEOUT"
         except Exception as e:
-            log_action(f"Error exporting candidates to JSON: {e}")
+            log_action(f"Error closing timed out trade for {symbol}: {e}")
+            return "ERROR_TIMEOUT"
 
-
-    async def _monitor_trade(self, symbol, entry_price):
+    async def _monitor_trade(self, symbol, entry_price, quantity='ALL', state=None):
         log_action(f"Monitoring trade for {symbol} at entry {entry_price:.4f}")
-        tp = entry_price * (1 + TRAILING_TP_OFFSET)
-        sl = entry_price * (1 - STOP_LOSS_PERCENT)
-        highest_price = entry_price
-        end_time = datetime.now() + timedelta(seconds=TRADE_DURATION_LIMIT)
-        while self.running and datetime.now() < end_time:
-            try:
-                ticker = await self.exchange.fetch_ticker(symbol)
-                price = ticker['last']
-                if price > highest_price:
-                    highest_price = price
-                    tp = highest_price * (1 - TRAILING_TP_STEP)
-                if price >= tp:
-                    log_action(f"TP hit for {symbol} at {price:.4f}")
-                    current_balance = float(get_config("balance", "0"))
-                    current_score = int(get_config("score", "0"))
-                    profit = (price - entry_price) * self.leverage
-                    set_config("balance", str(current_balance + profit))
-                    set_config("score", str(current_score + 1))
-                    log_trade(symbol, price, "TP")
-                    await self._execute_sell_order(symbol, 'ALL')
-                    return "TP"
-                if price <= sl:
-                    log_action(f"SL hit for {symbol} at {price:.4f}")
-                    current_balance = float(get_config("balance", "0"))
-                    current_score = int(get_config("score", "0"))
-                    loss = (entry_price - price) * self.leverage
-                    set_config("balance", str(current_balance - loss))
-                    set_config("score", str(current_score - 1))
-                    log_trade(symbol, price, "SL")
-                    await self._execute_sell_order(symbol, 'ALL')
-                    return "SL"
-                await asyncio.sleep(2)
-            except Exception as e:
-                log_action(f"Error monitoring trade for {symbol}: {e}")
-                await asyncio.sleep(5)
-                if self.running:
-                    log_action(f"Trade for {symbol} timed out.")
-                    current_balance = float(get_config("balance", "0"))
-                    current_score = int(get_config("score", "0"))
+        state = state or TradeState(entry_price, time.time())
+        await self.price_feed.subscribe(symbol)
+        last_published = 0.0
+        try:
+            while self.running and time.time() < state.deadline:
                 try:
-                    ticker = await self.exchange.fetch_ticker(symbol)
-                    current_price = ticker['last']
-                    if current_price > entry_price:
-                        profit = (current_price - entry_price) * self.leverage
-                        set_config("balance", str(current_balance + profit))
-                        set_config("score", str(current_score + 0.5))
-                        log_trade(symbol, current_price, "TIMEOUT_PROFIT")
-                    else:
-                        loss = (entry_price - current_price) * self.leverage
-                        set_config("balance", str(current_balance - loss))
-                        set_config("score", str(current_score - 0.5))
-                        log_trade(symbol, current_price, "TIMEOUT_LOSS")
-                    await self._execute_sell_order(symbol, 'ALL')
-                    return "TIMEOUT"
+                    price = await self._next_price(symbol, state.deadline)
+                    if price is None:
+                        continue
+                    highest = state.highest_price
+                    exit_reason = state.update(price)
+                    if state.highest_price != highest:
+                        journal_position(symbol, highest_price=state.highest_price, tp=state.tp)
+                    if time.monotonic() - last_published >= TICK_PUBLISH_INTERVAL:
+                        last_published = time.monotonic()
+                        bus.publish("tick", {"symbol": symbol, "price": price, "entry_price": entry_price,
+                                             "tp": state.tp, "sl": state.sl,
+                                             "pnl_pct": (price / entry_price - 1) * 100 * self.leverage})
+                    if exit_reason in ("TP", "SL"):
+                        signal_at = time.time()
+                        log_action(f"{exit_reason} hit for {symbol} at {price:.4f}")
+                        order = await self._execute_sell_order(symbol, quantity, signal_at)
+                        if order is None:
+                            self._keep_unclosed(symbol, exit_reason)
+                            return "ERROR_CLOSE"
+                        self._settle_trade(symbol, state, order.get('average') or order.get('price') or price, exit_reason)
+                        return exit_reason
                 except Exception as e:
-                    log_action(f"Error closing timed out trade for {symbol}: {e}")
-                    return "ERROR_TIMEOUT"
+                    log_action(f"Error monitoring trade for {symbol}: {e}")
+                    await asyncio.sleep(5)
+        finally:
+            await self.price_feed.unsubscribe(symbol)
+        if not self.running:
+            return "STOPPED"
+        return await self._close_timeout(symbol, state, quantity)
+
+    async def _monitor_bracket(self, symbol, entry_price, quantity, state=None, legs=None):
+        """SL/TP na berzi; čeka se samo na događaj fill-a ili na rok pozicije, bez tick-ova i polling-a.
+
+        legs su nalozi preuzeti iz žurnala posle restarta (execution.adopt_bracket); inače se postavljaju novi.
+        """
+        state = state or TradeState(entry_price, time.time())
+        if legs is None:
+            callback_rate = trailing_callback_rate(state.trailing_tp_step)
+            try:
+                legs = await self.execution.place_bracket(symbol, quantity, state.sl, state.tp, callback_rate)
+            except Exception as e:
+                log_action(f"Could not place bracket orders for {symbol} ({e}), monitoring client-side.", logging.WARNING)
+                journal_position(symbol, mode="client")
+                return await self._monitor_trade(symbol, entry_price, quantity, state)
+            journal_position(symbol, mode="bracket",
+                             sl_order_id=legs["SL"]["order"]["id"], sl_client_id=legs["SL"]["client_id"],
+                             tp_order_id=legs["TP"]["order"]["id"], tp_client_id=legs["TP"]["client_id"])
+            log_action(f"Bracket placed for {symbol}: SL {state.sl:.4f}, trailing TP from {state.tp:.4f} "
+                       f"({callback_rate:g}% callback)")
+        waiting = {legs[name]["done"]: name for name in legs}
+        stopping = asyncio.create_task(self._stopping.wait())
+        try:
+            while self.running and time.time() < state.deadline:
+                done, _ = await asyncio.wait([*waiting, stopping], return_when=asyncio.FIRST_COMPLETED,
+                                             timeout=min(BRACKET_RECONCILE_INTERVAL, state.deadline - time.time()))
+                if done:  # fill/otkazivanje naloga ili stop_bot
+                    break
+                await asyncio.gather(*(self.execution.reconcile(symbol, leg) for leg in legs.values()))
+        finally:
+            stopping.cancel()
+        finished = [legs[name]["done"] for name in legs if legs[name]["done"].done()]
+        if finished:
+            name = waiting[finished[0]]
+            other = legs["TP" if name == "SL" else "SL"]
+            result = legs[name]["done"].result()
+            await self.execution.cancel(symbol, other)
+            if result["status"] == "FILLED":
+                price = result["price"] or (state.sl if name == "SL" else state.tp)
+                log_action(f"{name} filled on exchange for {symbol} at {price:.4f}")
+                self._settle_trade(symbol, state, price, name)
+                return name
+            # Nalog je otkazan/istekao mimo bota (ručno, likvidacija...) - ostatak roka prati klijent
+            log_action(f"{name} order for {symbol} ended as {result['status']}, monitoring client-side.", logging.WARNING)
+            journal_position(symbol, mode="client")
+            return await self._monitor_trade(symbol, entry_price, quantity, state)
+        if not self.running:
+            log_action(f"Bot stopped; exchange-side SL/TP for {symbol} stay active.")
+            return "DETACHED"
+        results = await asyncio.gather(*(self.execution.cancel(symbol, leg) for leg in legs.values()))
+        for name, result in zip(legs, results):
+            if result and result["status"] == "FILLED":  # popunjen baš pre otkazivanja
+                self._settle_trade(symbol, state, result["price"], name)
+                return name
+        return await self._close_timeout(symbol, state, quantity)
 
-    async def _execute_buy_order(self, symbol, quantity):
+    async def _execute_buy_order(self, symbol, quantity, signal_at=None):
         try:
-            order = await self.exchange.create_market_buy_order(symbol, quantity)
+            with ORDER_SECONDS.labels(side="buy").time():
+                order = await self.execution.submit(symbol, 'buy', quantity, signal_at)
+            ORDERS.labels(side="buy", status="ok").inc()
             log_action(f"Executed BUY order for {symbol}: {order}")
             return order
         except Exception as e:
+            ORDERS.labels(side="buy", status="error").inc()
             log_action(f"Error executing buy order for {symbol}: {e}")
             return None
 
     # U ChovusSmartBot_v9.py, popravljene metode _execute_sell_order i _open_long
-    async def _execute_sell_order(self, symbol, quantity):
+    async def _execute_sell_order(self, symbol, quantity, signal_at=None):
+        # Kroz ExecutionEngine kao i ulaz: clientOrderId, red u executions, latencija izlaza i osvežen balans
         try:
-            order = await self.exchange.create_market_sell_order(symbol, quantity)
+            with ORDER_SECONDS.labels(side="sell").time():
+                order = await self.execution.submit(symbol, 'sell', quantity, signal_at, reduce_only=True)
+            ORDERS.labels(side="sell", status="ok").inc()
             log_action(f"Executed SELL order for {symbol}: {order}")
             return order
         except Exception as e:
+            ORDERS.labels(side="sell", status="error").inc()
             log_action(f"Error executing sell order for {symbol}: {e}")
             return None
 
-    async def _open_long(self, symbol, score):
+    async def _open_long(self, symbol, score, price=None, signal_at=None):
+        # Veličina iz keširanog balansa i cene (feed ili ticker skeniranja), pa samo create_order na berzu
+        started = time.perf_counter()
         try:
-            market = self.exchange.market(symbol)
-            ticker = await self.exchange.fetch_ticker(symbol)
-            price = ticker['ask']
-            balance = await self.exchange.fetch_balance({"type": "future"})
-            usdt_balance = balance['total']['USDT'] * 0.99
-            alloc = self.smart_allocation(score)
-            min_qty = market['limits']['amount']['min']
-            max_qty = market['limits']['amount']['max']
-            quantity = (usdt_balance * alloc * self.leverage) / price
-            quantity = self.exchange.amount_to_precision(symbol, quantity)
-            if quantity < min_qty:
-                log_action(f"Calculated quantity {quantity} is less than min_qty {min_qty}. Setting to min_qty.")
-                quantity = min_qty
-            if quantity > max_qty:
-                log_action(f"Calculated quantity {quantity} is more than max_qty {max_qty}. Setting to max_qty.")
-                quantity = max_qty
-            order = await self._execute_buy_order(symbol, float(quantity))
+            alloc = self.smart_allocation(score, symbol)
+            quantity, price = await self.execution.size(symbol, alloc, self.leverage, price)
+            order = await self._execute_buy_order(symbol, float(quantity), signal_at)
+            if order:
+                OPEN_LONG_SECONDS.observe(time.perf_counter() - started)
+                price = order.get('average') or price
             return order, price
         except Exception as e:
             log_action(f"Error opening long position for {symbol}: {e}")
             return None, None
 
-    # U ChovusSmartBot_v9.py, popravljena metoda _main_bot_loop
+    async def _run_position(self, symbol, state, quantity, legs=None):
+        started = time.monotonic()
+        try:
+            if BRACKET_ORDERS or legs:
+                trade_outcome = await self._monitor_bracket(symbol, state.entry_price, quantity, state, legs)
+            else:
+                trade_outcome = await self._monitor_trade(symbol, state.entry_price, quantity, state)
+            TRADE_SECONDS.observe(time.monotonic() - started)
+            TRADES.labels(outcome=trade_outcome).inc()
+            log_action(f"Trade for {symbol} finished with outcome: {trade_outcome}")
+        except Exception as ex:
+            log_action(f"Position task error for {symbol}: {str(ex)}")
+        finally:
+            # STOPPED/DETACHED pozicije ostaju u žurnalu i preuzimaju se na sledećem startu
+            if self.positions.get(symbol, {}).get("task") is asyncio.current_task():
+                del self.positions[symbol]
+            bus.publish("positions", self.get_open_positions())
+
+    async def _open_positions(self, targets):
+        # Simbol sa redom u žurnalu (npr. neuspelo zatvaranje koje čeka ponovni pokušaj) je i dalje zauzet
+        occupied = set(self.positions) | {row["symbol"] for row in load_positions()}
+        await self.execution.prewarm([t[0] for t in targets if t[0] not in occupied], self.leverage)
+        for symbol, price, volume, score, signal_at in targets:
+            if len(occupied) >= self.max_open_positions:
+                log_action(f"Max open positions reached ({self.max_open_positions}), skipping remaining targets.")
+                break
+            if symbol in occupied:
+                continue  # već imamo poziciju na ovom simbolu
+            log_action(f"[BOT] Opening position on {symbol} with score {score:.2f}")
+            order, entry_price = await self._open_long(symbol, score, price, signal_at)
+            if order:
+                log_action(f"Position opened for {symbol} at {entry_price}")
+                quantity = order.get('filled') or order.get('amount')
+                state = TradeState(entry_price, time.time())
+                journal_position(symbol, quantity=quantity, entry_price=entry_price, highest_price=state.highest_price,
+                                 tp=state.tp, sl=state.sl, opened_at=state.opened_at, deadline=state.deadline,
+                                 score=score, mode="client", sl_order_id=None, sl_client_id=None, tp_order_id=None,
+                                 tp_client_id=None)
+                self._track_position(symbol, state, quantity, score)
+                occupied.add(symbol)
+            else:
+                log_action(f"Could not open position for {symbol}.")
+
+    def _track_position(self, symbol, state, quantity, score, legs=None):
+        self.positions[symbol] = {
+            "entry_price": state.entry_price,
+            "score": score,
+            "opened_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(state.opened_at)),
+            "task": asyncio.create_task(self._run_position(symbol, state, quantity or 'ALL', legs)),
+        }
+        bus.publish("positions", self.get_open_positions())
+
+    async def resume_positions(self):
+        """Pozicije iz žurnala posle restarta; jedan fetch_positions i provere bracket naloga idu paralelno."""
+        rows = [row for row in load_positions() if row["symbol"] not in self.positions]
+        if not rows:
+            return 0
+        started = time.perf_counter()
+        try:
+            exchange_positions = await self.exchange.fetch_positions([row["symbol"] for row in rows])
+            open_amounts = {p['symbol']: float(p.get('contracts') or 0) for p in exchange_positions}
+        except Exception as e:
+            log_action(f"Could not fetch exchange positions ({e}), resuming journal as-is.", logging.WARNING)
+            open_amounts = None
+        results = await asyncio.gather(*(self._resume_position(row, open_amounts) for row in rows),
+                                       return_exceptions=True)
+        for row, result in zip(rows, results):
+            if isinstance(result, Exception):
+                log_action(f"Could not resume position for {row['symbol']}: {result}", logging.WARNING)
+        resumed = sum(1 for result in results if result is True)
+        log_action(f"Resumed {resumed}/{len(rows)} journaled positions in {time.perf_counter() - started:.2f}s")
+        return resumed
+
+    async def _resume_position(self, row, open_amounts):
+        symbol = row["symbol"]
+        state = TradeState.restore(row["entry_price"], row["opened_at"], row["highest_price"], row["tp"], row["sl"],
+                                   row["deadline"])
+        legs = None
+        if row["mode"] == "bracket" and row["sl_order_id"] and row["tp_order_id"]:
+            legs = await self.execution.adopt_bracket(symbol, {"SL": (row["sl_order_id"], row["sl_client_id"]),
+                                                               "TP": (row["tp_order_id"], row["tp_client_id"])})
+            for name, leg in legs.items():
+                result = leg["done"].result() if leg["done"].done() else None
+                if result and result["status"] == "FILLED":
+                    await self.execution.cancel(symbol, legs["TP" if name == "SL" else "SL"])
+                    log_action(f"{name} for {symbol} filled while the bot was down, booking it.")
+                    self._settle_trade(symbol, state, result["price"] or (state.sl if name == "SL" else state.tp), name)
+                    return False
+        if open_amounts is not None and open_amounts.get(symbol, 0) <= 0:
+            if legs:
+                await asyncio.gather(*(self.execution.cancel(symbol, leg) for leg in legs.values()))
+            log_action(f"Journaled position {symbol} is no longer open on the exchange, dropping it.", logging.WARNING)
+            delete_position(symbol)
+            return False
+        self._track_position(symbol, state, row["quantity"], row["score"], legs)
+        return True
+
+    # Skeniranje i praćenje pozicija rade nezavisno: svaka pozicija ima svoj task, a petlja nastavlja da skenira
     async def _main_bot_loop(self):
         log_action("[BOT] Starting main bot loop...")
+        await self.execution.start()
         while self.running:
             try:
+                # Prvi krug preuzima pozicije posle restarta, kasniji one čije zatvaranje nije uspelo
+                await self.resume_positions()
                 log_action("Initiating pair scan...")
-                targets = await self._scan_pairs()
-                log_action(f"Found {len(targets)} high-score targets")
+                targets = await self._scan_pairs(limit=max(5, self.max_open_positions))
+                log_action(f"Found {len(targets)} high-score targets, {len(self.positions)}/{self.max_open_positions} positions open")
                 if targets:
-                    symbol, price, volume, score = targets[0]
-                    log_action(f"[BOT] Opening position on {symbol} with score {score:.2f}")
-                    order, entry_price = await self._open_long(symbol, score)
-                    if order:
-                        log_action(f"Position opened for {symbol} at {entry_price}")
-                        trade_outcome = await self._monitor_trade(symbol, entry_price)
-                        log_action(f"Trade for {symbol} finished with outcome: {trade_outcome}")
-                    else:
-                        log_action(f"Could not open position for {symbol}.")
+                    await self._open_positions(targets)
                 else:
                     log_action("No high-score targets found in this scan.")
                 await self.learn_from_history()
             except Exception as ex:
                 log_action(f"Main bot loop error: {str(ex)}")
             await asyncio.sleep(15)
+        tasks = [p["task"] for p in self.positions.values()]
+        if tasks:
+            log_action(f"Waiting for {len(tasks)} position monitors to stop...")
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if self.orderbook:
+            await self.orderbook.set_symbols([])
+        await self.execution.stop()
 
     def _send_telegram_message(self, message):
         token = os.getenv('TELEGRAM_BOT_TOKEN')
@@ -487,6 +1035,6 @@ class ChovusSmartBot:
             time.sleep(1)
 
     def _send_daily_report(self):
-        msg = f"📊 ChovusBot Report:\nWallet = {float(get_config('balance', '0')):.2f} USDT, Score = {int(get_config('score', '0'))}"
+        msg = f"📊 ChovusBot Report:\nWallet = {float(get_config('balance', '0')):.2f} USDT, Score = {float(get_config('score', '0')):g}"
         self._send_telegram_message(msg)
         log_action(f"Daily report sent at {datetime.now().strftime('%H:%M')}")
\ No newline at end of file
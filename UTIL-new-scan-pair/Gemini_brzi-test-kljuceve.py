@@ -1,24 +1,36 @@
 import asyncio
 import json
+import os
+import sys
 import tkinter as tk
+from pathlib import Path
 from tkinter import ttk, scrolledtext
 import websockets
 import threading
 import time
 import aiohttp
-import threading
 from dotenv import load_dotenv
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from order_book import OrderBook
+from orderbook_service import book_signal
+
+load_dotenv()
+
 # --- Konfiguracija ---
+# Headless verzija za više simbola (bez GUI-ja, povezana sa botom): orderbook_service.py
 SYMBOL = "ETH/BTC"  # Koristimo ETHUSDT kao primer, prilagodi ako želiš ETH/BTC futures par
+SYMBOL_ID = SYMBOL.replace("/", "")  # REST i stream traže id bez kose crte (ETHBTC)
 LEVERAGE = 3
 API_KEY = os.getenv('API_KEY')  # Zamenite svojim API ključem
 API_SECRET = os.getenv('API_SECRET')  # Zamenite svojim API sekretom
 BASE_URL = "https://fapi.binance.com"
 WS_URL = "wss://fstream.binance.com/ws"
+WALL_THRESHOLD = 10  # Primer praga za "zid"
 
 # --- Globalne promenljive ---
-order_book_data = {"asks": {}, "bids": {}}
+order_book = OrderBook(SYMBOL_ID, decimals=5, wall_threshold=WALL_THRESHOLD)
+last_signal = None
 log_text = None
 
 def log(message):
@@ -33,114 +45,86 @@ def log(message):
         print(full_message, end="")
 
 async def fetch_order_book():
-    url = f"{BASE_URL}/fapi/v1/depth?symbol={SYMBOL}&limit=100"
+    # Snapshot se traži posle otvaranja stream-a; diff-ovi u međuvremenu čekaju u baferu OrderBook-a
+    url = f"{BASE_URL}/fapi/v1/depth?symbol={SYMBOL_ID}&limit=1000"
     try:
         async with aiohttp.ClientSession() as session:
             async with session.get(url) as response:
                 if response.status == 200:
                     data = await response.json()
-                    for ask in data['asks']:
-                        price = float(ask[0])
-                        volume = float(ask[1])
-                        order_book_data["asks"][price] = volume
-                    for bid in data['bids']:
-                        price = float(bid[0])
-                        volume = float(bid[1])
-                        order_book_data["bids"][price] = volume
-                    log(f"Order book fetched successfully.")
+                    if order_book.apply_snapshot(data) == "gap":
+                        log("Snapshot older than buffered updates, fetching again.")
+                        return False
+                    log(f"Order book fetched successfully (lastUpdateId {data['lastUpdateId']}).")
+                    return True
                 else:
                     log(f"Error fetching order book: {response.status}")
     except Exception as e:
         log(f"Exception while fetching order book: {e}")
+    return False
+
+async def sync_order_book():
+    backoff = 1
+    while not await fetch_order_book():
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 30)
 
 async def websocket_handler():
     backoff = 1
     max_backoff = 60
     while True:
         try:
-            async with websockets.connect(f"{WS_URL}/{SYMBOL.lower()}@depth@100ms") as ws:
+            async with websockets.connect(f"{WS_URL}/{SYMBOL_ID.lower()}@depth@100ms") as ws:
                 backoff = 1  # Reset backoff on successful connection
                 log(f"WebSocket connected to {SYMBOL} depth stream.")
+                order_book.reset()
+                sync_task = asyncio.create_task(sync_order_book())
                 while True:
                     try:
                         message = await asyncio.wait_for(ws.recv(), timeout=10)
-                        data = json.loads(message)
-                        update_order_book(data)
-                        analyze_order_book()
+                        result = order_book.apply_diff(json.loads(message))
+                        if result == "applied":
+                            analyze_order_book()
+                        elif result == "gap" and sync_task.done():
+                            log(f"Update gap detected, resyncing order book ({order_book.stats['gaps']} gaps so far).")
+                            sync_task = asyncio.create_task(sync_order_book())
                     except (asyncio.TimeoutError, websockets.ConnectionClosed) as e:
                         log(f"WebSocket error: {e}")
                         break
+                sync_task.cancel()
         except Exception as e:
             log(f"WebSocket connection failed: {e}")
             await asyncio.sleep(backoff)
             backoff = min(backoff * 2, max_backoff)  # Exponential backoff
 
-import threading
-
-order_book_lock = threading.Lock()
-
-def update_order_book(data):
-    global order_book_data
-    with order_book_lock:
-        if 'asks' in data:
-            for ask in data['asks']:
-            price = float(ask[0])
-            volume = float(ask[1])
-            if volume == 0:
-                if price in order_book_data["asks"]:
-                    del order_book_data["asks"][price]
-            else:
-                order_book_data["asks"][price] = volume
-    if 'bids' in data:
-        for bid in data['bids']:
-            price = float(bid[0])
-            volume = float(bid[1])
-            if volume == 0:
-                if price in order_book_data["bids"]:
-                    del order_book_data["bids"][price]
-            else:
-                order_book_data["bids"][price] = volume
-
 def analyze_order_book():
-    asks = sorted(order_book_data["asks"].items())
-    bids = sorted(order_book_data["bids"].items(), reverse=True)
-
-    if not asks or not bids:
+    # Pravila signala su u orderbook_service.book_signal (isti kod koristi i headless servis za bota)
+    global last_signal
+    result = book_signal(order_book)
+    if result is None:
         return
 
-    best_ask = asks[0][0]
-    best_bid = bids[0][0]
-
-    fifth_decimal_ask = int(round(best_ask * 100000) % 10)
-    fifth_decimal_bid = int(round(best_bid * 100000) % 10)
-
-    # Strategija "pomeranja zida" (pojednostavljena)
-    # Ovde implementiraj složeniju logiku analize zidova
-    # Za minimalni primer, fokusiracemo se na prisustvo značajnog obima
-    wall_threshold = 10  # Primer praga za "zid"
-
-    strong_ask_wall_at_9 = any(vol > wall_threshold for price, vol in asks if int(round(price * 100000) % 10) == 9)
-    strong_bid_wall_at_1 = any(vol > wall_threshold for price, vol in bids if int(round(price * 100000) % 10) == 1)
-
+    signal = None
     # Logika trgovanja bazirana na petoj decimali i "rokadi"
-    if fifth_decimal_ask == 7 or fifth_decimal_ask == 8:
-        log(f"Potencijalni SHORT signal na {best_ask:.5f}")
+    if result["digit_signal"] == "SHORT":
+        signal = f"Potencijalni SHORT signal na {result['ask']:.5f}"
         # Implementiraj slanje SHORT ordera ovde
-    elif fifth_decimal_bid == 2 or fifth_decimal_bid == 1:
-        log(f"Potencijalni LONG signal na {best_bid:.5f}")
+    elif result["digit_signal"] == "LONG":
+        signal = f"Potencijalni LONG signal na {result['bid']:.5f}"
         # Implementiraj slanje LONG ordera ovde
 
     # "Rokada" logika
-    if strong_ask_wall_at_9:
-        log(f"Detektovan jaki ASK zid na ...9. Potencijalna ROKADA (LONG umesto SHORT).")
+    if result["ask_wall_9"]:
+        signal = f"{signal or ''} | Detektovan jaki ASK zid na ...9. Potencijalna ROKADA (LONG umesto SHORT)."
         # Implementiraj logiku za prelazak na LONG strategiju
-    elif strong_bid_wall_at_1:
-        log(f"Detektovan jaki BID zid na ...1. Potencijalna ROKADA (SHORT umesto LONG).")
+    elif result["bid_wall_1"]:
+        signal = f"{signal or ''} | Detektovan jaki BID zid na ...1. Potencijalna ROKADA (SHORT umesto LONG)."
         # Implementiraj logiku za prelazak na SHORT strategiju
 
-    # Ograničavanje ispisa logova radi preglednosti
-    # log(f"Best Ask: {best_ask:.5f}, Best Bid: {best_bid:.5f}, Ask 5th: {fifth_decimal_ask}, Bid 5th: {fifth_decimal_bid}")
-    # log(f"Asks (top 5): {asks[:5]}, Bids (top 5): {bids[:5]}")
+    # Loguje se samo promena signala, ne svaka poruka na 100ms
+    if signal and signal != last_signal:
+        log(signal)
+    last_signal = signal
 
 # --- GUI ---
 def main_gui():
@@ -167,8 +151,6 @@ def run_asyncio_loop():
     asyncio.run(main())
 
 async def main():
-    import aiohttp
-    await fetch_order_book()
     await websocket_handler()
 
 if __name__ == "__main__":
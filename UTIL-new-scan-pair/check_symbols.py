@@ -1,8 +1,13 @@
 import asyncio
 import ccxt.async_support as ccxt
 import os
+import sys
+from pathlib import Path
 from dotenv import load_dotenv
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from markets_cache import MarketsCache, default_path
+
 load_dotenv()
 api_key = os.getenv('API_KEY')
 api_secret = os.getenv('API_SECRET')
@@ -18,8 +23,7 @@ async def check_markets():
     })
 
     try:
-        await exchange.load_markets()
-        markets = exchange.markets
+        markets = await MarketsCache(default_path(exchange.id)).load(exchange)
         perpetual_futures = [
             symbol for symbol, market in markets.items()
             if market['active'] and market['type'] == 'future'
@@ -1,7 +1,12 @@
 import ccxt
 import os
 import sqlite3
+import sys
 from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from markets_cache import MarketsCache, default_path
 
 DB_PATH = os.getenv("DB_PATH", "../backend/user_data/chovusbot.db")
 exchange = ccxt.binance({
@@ -11,9 +16,8 @@ exchange = ccxt.binance({
 
 def scan_top_pairs(limit=3):
     print(f"[{datetime.now()}] Scanning top {limit} USDT Futures pairs...")
-    exchange.load_markets()
+    markets = MarketsCache(default_path(exchange.id)).load_sync(exchange)
     tickers = exchange.fetch_tickers()
-    markets = exchange.load_markets()
 
     futures = [s for s in markets if s.endswith("/USDT") and markets[s].get('contract', False)]
     print(f"Found {len(futures)} futures markets ending with /USDT")
@@ -1,14 +1,17 @@
 # main.py
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
 import asyncio
 import os
-from pathlib import Path
+import time
 from dotenv import load_dotenv
-import sqlite3
-from ChovusSmartBot_v9 import ChovusSmartBot, get_config, set_config, log_trade, log_score
+import indicators
+from events import bus
+from response_cache import ResponseCache
+import metrics
+from ChovusSmartBot_v9 import ChovusSmartBot, db, get_config, set_config, get_all_config, log_trade, log_score, log_stats, retention, get_symbol_stats
 
 load_dotenv()
 
@@ -17,11 +20,56 @@ print(f"🔑 Using API_KEY: {key}")
 
 app = FastAPI()
 templates = Jinja2Templates(directory="html")
-DB_PATH = Path(os.getenv("DB_PATH", Path(__file__).resolve().parent / "user_data" / "chovusbot.db"))
 
 # Inicijalizuj bota
 bot = ChovusSmartBot()
 bot_task = None
+DASHBOARD_PUSH_INTERVAL = 5  # market_data/signals se računaju jednom za sve otvorene dashboard-e
+# Simulirana berza daje svoj simbol i timeframe (default_symbol/default_timeframe); živa koristi ETH/BTC na 15m
+DASHBOARD_SYMBOL = os.getenv("DASHBOARD_SYMBOL") or getattr(bot.exchange, "default_symbol", None) or "ETH/BTC"
+DASHBOARD_TIMEFRAME = os.getenv("DASHBOARD_TIMEFRAME") or getattr(bot.exchange, "default_timeframe", None) or "15m"
+
+# Keš read-only odgovora; bot događaji poništavaju odgovarajuće tagove čim se podaci promene
+response_cache = ResponseCache(maxsize=256)
+EVENT_TAGS = {
+    "trade": ("trades", "balance", "performance"),
+    "candidates": ("candidates",),
+    "balance": ("balance",),
+    "config": ("config", "balance"),
+    # "log" namerno nije ovde: stiže iz writer niti logova za svaku liniju, pa bi keš /api/logs bio stalno
+    # poništen, a zaključavanje keša bi išlo na putanju logovanja - /api/logs se oslanja na kratak TTL
+}
+
+def _invalidate_on_event(event, data):
+    tags = EVENT_TAGS.get(event)
+    if tags:
+        response_cache.invalidate(*tags)
+
+bus.add_listener(_invalidate_on_event)
+
+HTTP_SECONDS = metrics.histogram("chovusbot_http_request_seconds", "API request latency", ("path", "status"))
+
+def _collect_backend_metrics():
+    yield "chovusbot_response_cache_total", "counter", "Response cache lookups and invalidations", [
+        ({"event": k}, v) for k, v in response_cache.stats.items()]
+    yield "chovusbot_stream_subscribers", "gauge", "Open dashboard streams", [({}, bus.subscribers)]
+    yield "chovusbot_stream_events_total", "counter", "Dashboard stream events", [
+        ({"event": k}, v) for k, v in bus.stats.items()]
+
+metrics.register_collector(_collect_backend_metrics)
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    if route is not None and request.url.path != "/api/stream":  # stream traje koliko i konekcija
+        HTTP_SECONDS.labels(path=route.path, status=response.status_code).observe(time.perf_counter() - started)
+    return response
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 # API modeli
 class TelegramMessage(BaseModel):
@@ -36,6 +84,10 @@ class LeverageRequest(BaseModel):
 class AmountRequest(BaseModel):
     amount: float
 
+class PositionLimitsRequest(BaseModel):
+    max_open_positions: int
+    max_symbol_exposure: float
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
@@ -83,10 +135,12 @@ async def set_strategy_endpoint(request: StrategyRequest):
     return {"status": f"Strategy set to: {strategy_status}"}
 
 @app.get("/api/config")
+@response_cache.cached(ttl=60, tags=("config",))
 def get_config_api():
     return get_all_config()
 
 @app.get("/api/balance")
+@response_cache.cached(ttl=30, tags=("balance",))
 def get_balance():
     return {
         "wallet_balance": get_config("balance", "0"),
@@ -94,15 +148,25 @@ def get_balance():
     }
 
 @app.get("/api/trades")
+@response_cache.cached(ttl=30, tags=("trades",))
 def get_trades():
     try:
-        with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT symbol, price, timestamp, outcome FROM trades ORDER BY id DESC LIMIT 20")
-            return [{"symbol": s, "price": p, "time": t, "outcome": o} for s, p, t, o in cursor.fetchall()]
+        rows = db.query("SELECT symbol, price, timestamp, outcome FROM trades ORDER BY id DESC LIMIT 20")
+        return [{"symbol": s, "price": p, "time": t, "outcome": o} for s, p, t, o in rows]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching trades: {e}")
 
+# Agregat po simbolu (symbol_stats) koji bot ažurira uz svaki trejd - bez skeniranja trades tabele
+@app.get("/api/performance")
+@response_cache.cached(ttl=60, tags=("performance",))
+def get_performance(symbol: str = None):
+    if symbol is None:
+        return get_symbol_stats()
+    stats = get_symbol_stats(symbol)
+    if stats is None:
+        raise HTTPException(status_code=404, detail=f"No trades for {symbol}")
+    return stats
+
 @app.get("/api/pairs")
 def get_pairs():
     return get_config("available_pairs", "").split(",")
@@ -111,65 +175,83 @@ def get_pairs():
 async def send_telegram_endpoint(msg: TelegramMessage):
     return bot._send_telegram_message(msg.message)
 
+async def _market_data(symbol, timeframe=DASHBOARD_TIMEFRAME):
+    ticker = await bot.exchange.fetch_ticker(symbol)
+    df = await bot.get_candles(symbol, timeframe)
+    high = df['high'].rolling(50).max().iloc[-1]
+    low = df['low'].rolling(50).min().iloc[-1]
+    fib_range = high - low
+    support = high - fib_range * 0.618
+    resistance = high - fib_range * 0.382
+    close = df['close'].to_numpy(dtype=float)
+    smma = indicators.smma(close, 5)
+    wma = indicators.wma(close, 144)
+    trend = "Bullish" if smma[-1] > wma[-1] else "Bearish"
+    return {
+        "price": ticker['last'],
+        "support": support,
+        "resistance": resistance,
+        "trend": trend
+    }
+
 @app.get("/api/market_data")
-async def get_market_data(symbol: str = "ETH/BTC"):
+@response_cache.cached(ttl=5)
+async def get_market_data(symbol: str = DASHBOARD_SYMBOL, timeframe: str = DASHBOARD_TIMEFRAME):
     try:
-        ticker = await bot.exchange.fetch_ticker(symbol)
-        df = await bot.get_candles(symbol)
-        high = df['high'].rolling(50).max().iloc[-1]
-        low = df['low'].rolling(50).min().iloc[-1]
-        fib_range = high - low
-        support = high - fib_range * 0.618
-        resistance = high - fib_range * 0.382
-        smma = bot.calc_smma(df['close'], 5)
-        wma = bot.calc_wma(df['close'], 144)
-        trend = "Bullish" if smma.iloc[-1] > wma.iloc[-1] else "Bearish"
-        return {
-            "price": ticker['last'],
-            "support": support,
-            "resistance": resistance,
-            "trend": trend
-        }
+        return await _market_data(symbol, timeframe)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching market data: {e}")
 
 # U main.py, ažuriraj /api/candidates - polako
 @app.get("/api/candidates")
+@response_cache.cached(ttl=30, tags=("candidates",))
 async def get_candidates():
     try:
-        with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT symbol, price, score, timestamp FROM candidates ORDER BY score DESC, id DESC LIMIT 10")
-            return [{"symbol": s, "price": p, "score": sc, "time": t} for s, p, sc, t in cursor.fetchall()]
+        rows = db.query("SELECT symbol, price, score, timestamp FROM candidates ORDER BY score DESC, id DESC LIMIT 10")
+        return [{"symbol": s, "price": p, "score": sc, "time": t} for s, p, sc, t in rows]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching candidates: {e}")
 
-# U main.py, ažuriraj /api/signals
+# /api/signals čita zastavice koje je scanner već izračunao (candidates.crossover/fib_zone), bez berze.
+# Verzija = poslednji id TP trejda i signal kandidata; dok se ne promeni, odgovor se služi iz memorije.
+_signals_cache = {"etag": None, "signals": None}
+
+def _signals_etag():
+    tp = db.query_one("SELECT MAX(id) FROM trades WHERE outcome = 'TP'")[0] or 0
+    candidate = db.query_one("SELECT MAX(id) FROM candidates WHERE crossover = 1 AND fib_zone = 1")[0] or 0
+    return f'"signals-{tp}-{candidate}"'
+
+async def _signals():
+    etag = _signals_etag()
+    if etag == _signals_cache["etag"]:
+        return etag, _signals_cache["signals"]
+    signals = []
+    # Prvo proveri da li ima TP trejdova
+    rows = db.query("SELECT symbol, price, timestamp FROM trades WHERE outcome = 'TP' ORDER BY id DESC LIMIT 5")
+    signals.extend([{"symbol": s, "price": p, "time": t, "type": "Trade (TP)"} for s, p, t in rows])
+
+    # Ako nema TP trejdova, poslednji kandidati kod kojih je scanner video crossover + Fib zonu
+    if not signals:
+        candidates = db.query(
+            "SELECT symbol, price, score, timestamp, smma, wma, fib_382, fib_618 FROM candidates "
+            "WHERE crossover = 1 AND fib_zone = 1 AND score > 0.5 ORDER BY id DESC LIMIT 5")
+        signals.extend([{"symbol": symbol, "price": price, "time": timestamp, "type": "Potential (Crossover + Fib)",
+                         "score": score, "smma": smma, "wma": wma, "fib_382": fib_382, "fib_618": fib_618}
+                        for symbol, price, score, timestamp, smma, wma, fib_382, fib_618 in candidates])
+    signals = signals if signals else [{"symbol": "N/A", "price": 0, "time": "N/A", "type": "N/A"}]
+    _signals_cache.update(etag=etag, signals=signals)
+    return etag, signals
+
 @app.get("/api/signals")
-async def get_signals():
+async def get_signals(request: Request):
     try:
-        signals = []
-        # Prvo proveri da li ima TP trejdova
-        with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT symbol, price, timestamp FROM trades WHERE outcome = 'TP' ORDER BY id DESC LIMIT 5")
-            signals.extend([{"symbol": s, "price": p, "time": t, "type": "Trade (TP)"} for s, p, t in cursor.fetchall()])
-
-        # Ako nema TP trejdova, proveri kandidate za potencijalne signale
-        if not signals:
-            with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT symbol, price, score, timestamp FROM candidates WHERE score > 0.5 ORDER BY score DESC LIMIT 5")
-                candidates = cursor.fetchall()
-                for symbol, price, score, timestamp in candidates:
-                    df = await bot.get_candles(symbol)
-                    crossover = bot.confirm_smma_wma_crossover(df)
-                    in_fib_zone = bot.fib_zone_check(df)
-                    if crossover and in_fib_zone:
-                        signals.append({"symbol": symbol, "price": price, "time": timestamp, "type": "Potential (Crossover + Fib)"})
-        return signals if signals else [{"symbol": "N/A", "price": 0, "time": "N/A", "type": "N/A"}]
+        etag, signals = await _signals()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching signals: {e}")
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(signals, headers=headers)
 
 @app.post("/api/set_leverage")
 async def set_leverage(request: LeverageRequest):
@@ -189,19 +271,106 @@ async def set_manual_amount(request: AmountRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error setting manual amount: {e}")
 
+@app.post("/api/set_position_limits")
+async def set_position_limits(request: PositionLimitsRequest):
+    try:
+        bot.set_position_limits(request.max_open_positions, request.max_symbol_exposure)
+        set_config("max_open_positions", str(request.max_open_positions))
+        set_config("max_symbol_exposure", str(request.max_symbol_exposure))
+        return {"status": f"Position limits set to: {request.max_open_positions} open, {request.max_symbol_exposure:.0%} per symbol"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error setting position limits: {e}")
+
+@app.get("/api/positions")
+async def get_positions():
+    return bot.get_open_positions()
+
+# Latencija naloga (signal->ack/fill) iz executions tabele + stanje keša balansa
+@app.get("/api/executions")
+def get_executions(limit: int = 20):
+    rows = db.query("SELECT client_order_id, symbol, side, quantity, fill_price, status, signal_to_ack_ms, "
+                    "signal_to_fill_ms, error, ack_at FROM executions ORDER BY id DESC LIMIT ?", (limit,))
+    keys = ("client_order_id", "symbol", "side", "quantity", "fill_price", "status", "signal_to_ack_ms",
+            "signal_to_fill_ms", "error", "ack_at")
+    return {"summary": bot.execution.latency_summary(), "recent": [dict(zip(keys, row)) for row in rows]}
+
+# Signali order book servisa (peta decimala, rokada zidovi) za simbole na depth stream-u
+@app.get("/api/orderbook")
+async def get_orderbook(symbol: str = None):
+    if bot.orderbook is None:
+        raise HTTPException(status_code=404, detail="Order book service is disabled")
+    signals = bot.orderbook.snapshot()
+    if symbol is not None:
+        signals = [s for s in signals if s["symbol"] == symbol]
+        if not signals:
+            raise HTTPException(status_code=404, detail=f"No order book for {symbol}")
+        return {**signals[0], "book": bot.orderbook.book_stats().get(symbol)}
+    return {"signals": signals, "stats": bot.orderbook.stats}
+
 @app.get("/api/logs")
+@response_cache.cached(ttl=2)
 async def get_logs():
     try:
-        with sqlite3.connect(DB_PATH, check_same_thread=False) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT timestamp, message FROM bot_logs ORDER BY id DESC LIMIT 10")
-            return [{"time": t, "message": m} for t, m in cursor.fetchall()]
+        rows = db.query("SELECT timestamp, message FROM bot_logs ORDER BY id DESC LIMIT 10")
+        return [{"time": t, "message": m} for t, m in rows]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching logs: {e}")
 
+@app.get("/api/log_stats")
+async def get_log_stats():
+    return log_stats()
+
+# Push umesto polling-a: dashboard otvori jedan EventSource i dobija promene čim ih bot objavi
+@app.get("/api/stream")
+async def stream(request: Request):
+    return StreamingResponse(
+        bus.stream(bus.subscribe(), request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/cache_stats")
+async def get_cache_stats():
+    return response_cache.info()
+
+@app.get("/api/retention_stats")
+async def get_retention_stats():
+    return retention.last_run
+
+@app.get("/api/stream_stats")
+async def get_stream_stats():
+    return {"subscribers": bus.subscribers, **bus.stats}
+
+async def _dashboard_publisher():
+    # Berza i sveće se pitaju jednom po intervalu, samo dok je bar jedan dashboard otvoren
+    last_signals_etag = None
+    while True:
+        if bus.subscribers:
+            try:
+                bus.publish("market", await get_market_data(DASHBOARD_SYMBOL))
+            except Exception as e:
+                bus.publish("error", {"source": "market", "message": str(e)})
+            try:
+                etag, signals = await _signals()
+                if etag != last_signals_etag:
+                    last_signals_etag = etag
+                    bus.publish("signals", signals)
+            except Exception as e:
+                bus.publish("error", {"source": "signals", "message": str(e)})
+        await asyncio.sleep(DASHBOARD_PUSH_INTERVAL)
+
+@app.on_event("startup")
+async def start_dashboard_publisher():
+    retention.start()  # pozadinska retencija baze živi sa backend procesom, ne sa importom bota
+    bot._publish_status()
+    bus.publish("balance", {"wallet_balance": get_config("balance", "0"), "score": get_config("score", "0")})
+    asyncio.create_task(_dashboard_publisher())
+    # Proces je restartovan dok je bot radio: start odmah preuzima otvorene pozicije iz žurnala
+    if get_config("bot_running") == "1":
+        await bot.start_bot()
+
 # Dodaj u main.py privremeni endpoint za testiranje
 @app.get("/api/export_candidates")
 async def export_candidates():
     from ChovusSmartBot_v9 import export_candidates_to_json
-    export_candidates_to_json()
+    await asyncio.to_thread(export_candidates_to_json)  # flush + upit van event loop-a
     return {"status": "Export triggered"}
\ No newline at end of file
@@ -0,0 +1,300 @@
+# backtest.py
+"""Offline backtest: istorijske OHLCV sveće kroz isti scoring, izbor kandidata i pravila izlaza kao živi bot.
+
+Primer:
+    python backtest.py --data user_data/history/1h --timeframe 1h --exit-data user_data/history/1m \
+        --trades-out user_data/backtest_trades.csv
+
+Izlaz (TP/SL/timeout) se simulira po putanji cene unutar sveća iz --exit-data; one moraju biti mnogo
+kraće od trade_duration (najviše MAX_EXIT_BAR_FRACTION od njega), inače je svaki izlaz timeout.
+
+Fajlovi u --data su CSV ili Parquet po simbolu (BTC_USDT.csv -> BTC/USDT) sa kolonama
+timestamp, open, high, low, close, volume (timestamp u ms ili datum).
+"""
+import argparse
+import heapq
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import scoring
+from candle_cache import COLUMNS, timeframe_ms
+from strategy import StrategyParams, TradeState, allocation_for_score
+
+# Najduža sveća za izlaz kao deo trade_duration: sa 600s trejdom to je 1m (10 sveća = 40 tačaka putanje)
+MAX_EXIT_BAR_FRACTION = 0.1
+
+
+def load_ohlcv_file(path):
+    path = Path(path)
+    df = pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_csv(path)
+    df = df[COLUMNS].copy()
+    if not np.issubdtype(df['timestamp'].dtype, np.number):
+        df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True).astype('int64') // 1_000_000
+    df['timestamp'] = df['timestamp'].astype('int64')
+    return df.sort_values('timestamp').drop_duplicates('timestamp').reset_index(drop=True)
+
+
+def load_ohlcv_dir(path, symbols=None):
+    frames = {}
+    for file in sorted(Path(path).iterdir()):
+        if file.suffix not in (".csv", ".parquet"):
+            continue
+        symbol = file.stem.replace("_", "/")
+        if symbols and symbol not in symbols:
+            continue
+        frames[symbol] = load_ohlcv_file(file)
+    return frames
+
+
+class MarketData:
+    """Sveće svih simbola poravnate na zajedničku vremensku osu: matrice simboli x vreme.
+
+    Rupe se popunjavaju poslednjom poznatom cenom (sveće pre listinga prvom), a `bars_seen`
+    broji stvarne sveće do svakog trenutka da bi se simbol ocenjivao tek kad ima CANDLE_LIMIT sveća.
+    """
+
+    def __init__(self, frames, timeframe='1h'):
+        self.timeframe = timeframe
+        self.bar_ms = timeframe_ms(timeframe)
+        self.symbols = list(frames)
+        self.timestamps = np.unique(np.concatenate([f['timestamp'].to_numpy() for f in frames.values()])) \
+            if frames else np.array([], dtype='int64')
+        shape = (len(self.symbols), len(self.timestamps))
+        fields = {c: np.full(shape, np.nan) for c in COLUMNS[1:]}
+        present = np.zeros(shape, dtype=bool)
+        for i, symbol in enumerate(self.symbols):
+            df = frames[symbol]
+            idx = np.searchsorted(self.timestamps, df['timestamp'].to_numpy())
+            present[i, idx] = True
+            for c in fields:
+                fields[c][i, idx] = df[c].to_numpy(dtype=float)
+        self.present = present
+        self.bars_seen = np.cumsum(present, axis=1)
+        close = pd.DataFrame(fields['close'].T).ffill().bfill().to_numpy().T
+        for c in ('open', 'high', 'low'):
+            fields[c] = np.where(present, fields[c], close)
+        fields['close'] = close
+        fields['volume'] = np.where(present, fields['volume'], 0.0)
+        self.open, self.high, self.low, self.close, self.volume = (fields[c] for c in COLUMNS[1:])
+
+    ARRAYS = ('timestamps', 'present', 'bars_seen', 'open', 'high', 'low', 'close', 'volume', 'quote_volume')
+    EXIT_ARRAYS = ('timestamps', 'present', 'open', 'high', 'low', 'close')  # dovoljno za price_path
+
+    @classmethod
+    def from_arrays(cls, symbols, timeframe, arrays):
+        """Gradi MarketData nad već pripremljenim nizovima (npr. iz shared memory u optimize.py)."""
+        data = cls.__new__(cls)
+        data.timeframe = timeframe
+        data.bar_ms = timeframe_ms(timeframe)
+        data.symbols = list(symbols)
+        for name, array in arrays.items():
+            setattr(data, name, array)
+        return data
+
+    def quote_volume_24h(self):
+        # Zamena za ticker['quoteVolume']: zbir close * volume u poslednja 24h (računa se jednom)
+        if getattr(self, 'quote_volume', None) is None:
+            bars = max(1, int(86_400_000 // self.bar_ms))
+            qv = np.cumsum(self.close * self.volume, axis=1)
+            qv[:, bars:] = qv[:, bars:] - qv[:, :-bars]
+            self.quote_volume = qv
+        return self.quote_volume
+
+    def price_path(self, i, start_ms):
+        """Tačke (vreme ms, cena) od start_ms nadalje: open, pa low/high redom kojim je bar verovatno išao, pa close."""
+        t = np.searchsorted(self.timestamps, start_ms)
+        for j in range(t, len(self.timestamps)):
+            if not self.present[i, j]:
+                continue
+            ts = self.timestamps[j]
+            o, h, l, c = self.open[i, j], self.high[i, j], self.low[i, j], self.close[i, j]
+            middle = (l, h) if c >= o else (h, l)
+            yield ts, o
+            yield ts + self.bar_ms // 3, middle[0]
+            yield ts + 2 * self.bar_ms // 3, middle[1]
+            yield ts + self.bar_ms, c
+
+
+def check_exit_resolution(exit_timeframe, trade_duration):
+    """ValueError kad su sveće za izlaz pregrube za trade_duration.
+
+    Sa 1h svećama i 600s trejdom rok ističe pre druge tačke putanje bara, pa se TP/SL nikad ne
+    proveravaju i svi izlazi su TIMEOUT_* - metrike takvog backtest-a ništa ne govore o strategiji.
+    """
+    max_bar_ms = trade_duration * 1000 * MAX_EXIT_BAR_FRACTION
+    if timeframe_ms(exit_timeframe) > max_bar_ms:
+        raise ValueError(
+            f"Exit candles ({exit_timeframe}) are too coarse for trade_duration {trade_duration:.0f}s: "
+            f"TP/SL would never be evaluated and every exit would be a timeout. "
+            f"Pass --exit-data with candles of at most {max_bar_ms / 1000:.0f}s (e.g. 1m).")
+
+
+class Backtest:
+    def __init__(self, data, params=None, *, exit_data=None, leverage=10, initial_balance=1000.0, fee_rate=0.0004,
+                 slippage=0.0, max_open_positions=3, max_symbol_exposure=0.3, scan_limit=5):
+        self.data = data
+        self.exit_data = exit_data or data  # finije sveće (npr. 1m) daju precizniji izlaz
+        self.params = params or StrategyParams()
+        check_exit_resolution(self.exit_data.timeframe, self.params.trade_duration)
+        self.leverage = leverage
+        self.initial_balance = initial_balance
+        self.fee_rate = fee_rate
+        self.slippage = slippage
+        self.max_open_positions = max_open_positions
+        self.max_symbol_exposure = max_symbol_exposure
+        self.scan_limit = max(scan_limit, max_open_positions)
+        self._exit_index = {s: i for i, s in enumerate(self.exit_data.symbols)}
+
+    def scores(self):
+        p = self.params
+        d = self.data
+        score, crossover, fib_zone = scoring.score_series(
+            d.close, d.high, d.low, d.volume, d.quote_volume_24h(),
+            round_levels=p.round_levels, volume_spike_threshold=p.volume_spike_threshold, weights=p.score_weights,
+            smma_length=p.smma_length, wma_length=p.wma_length, window=p.fib_window)
+        eligible = d.present & (d.bars_seen >= p.candle_limit) & (score > p.candidate_threshold)
+        return np.where(eligible, score, 0.0), eligible
+
+    def simulate_exit(self, symbol, entry_price, entry_ms):
+        state = TradeState(entry_price, entry_ms / 1000, self.params)
+        i = self._exit_index[symbol]
+        last_ts, price = entry_ms, entry_price
+        for ts, next_price in self.exit_data.price_path(i, entry_ms):
+            deadline_ms = state.deadline * 1000
+            if ts >= deadline_ms:
+                # Cena u trenutku isteka: linearno između poslednje dve poznate tačke
+                weight = (deadline_ms - last_ts) / (ts - last_ts) if ts > last_ts else 1.0
+                price = price + (next_price - price) * weight
+                return state.timeout_outcome(price), price, int(deadline_ms)
+            last_ts, price = ts, next_price
+            outcome = state.update(price)
+            if outcome:
+                return outcome, price, ts
+        return "END_OF_DATA", price, last_ts  # poslednja skenirana tačka, ne ulaz
+
+    def run(self):
+        started = time.perf_counter()
+        score, eligible = self.scores()
+        signal_seconds = time.perf_counter() - started
+        d = self.data
+        equity = self.initial_balance
+        open_until = {}  # symbol -> vreme izlaza (ms)
+        pending = []  # heap (vreme izlaza, pnl)
+        trades = []
+        equity_curve = [(int(d.timestamps[0]) if len(d.timestamps) else 0, equity)]
+
+        for t in np.flatnonzero(eligible.any(axis=0)):
+            now = int(d.timestamps[t]) + d.bar_ms  # signal je poznat na zatvaranju bara t
+            while pending and pending[0][0] <= now:
+                exit_ms, pnl = heapq.heappop(pending)
+                equity += pnl
+                equity_curve.append((exit_ms, equity))
+            for symbol in [s for s, until in open_until.items() if until <= now]:
+                del open_until[symbol]
+            column = score[:, t]
+            ranked = np.argsort(-column, kind="stable")[:self.scan_limit]
+            for i in ranked:
+                if column[i] <= 0 or len(open_until) >= self.max_open_positions:
+                    break
+                symbol = d.symbols[i]
+                if symbol in open_until:
+                    continue
+                entry_price = d.close[i, t] * (1 + self.slippage)
+                alloc = allocation_for_score(column[i], self.max_symbol_exposure)
+                quantity = equity * 0.99 * alloc * self.leverage / entry_price
+                entry_equity = equity
+                outcome, exit_price, exit_ms = self.simulate_exit(symbol, entry_price, now)
+                exit_price *= (1 - self.slippage)
+                fees = (entry_price + exit_price) * quantity * self.fee_rate
+                pnl = (exit_price - entry_price) * quantity - fees
+                open_until[symbol] = exit_ms
+                heapq.heappush(pending, (exit_ms, pnl))
+                trades.append({
+                    "symbol": symbol, "score": float(column[i]), "entry_time": now, "entry_price": entry_price,
+                    "exit_time": exit_ms, "exit_price": exit_price, "quantity": quantity, "fees": fees,
+                    "pnl": pnl, "outcome": outcome, "entry_equity": entry_equity,
+                })
+        while pending:
+            exit_ms, pnl = heapq.heappop(pending)
+            equity += pnl
+            equity_curve.append((exit_ms, equity))
+
+        trades = pd.DataFrame(trades, columns=["symbol", "score", "entry_time", "entry_price", "exit_time",
+                                               "exit_price", "quantity", "fees", "pnl", "outcome", "entry_equity"])
+        curve = pd.Series([e for _, e in equity_curve], index=[ts for ts, _ in equity_curve], name="equity")
+        metrics = compute_metrics(trades, curve, self.initial_balance)
+        metrics["signal_seconds"] = round(signal_seconds, 3)
+        metrics["run_seconds"] = round(time.perf_counter() - started, 3)
+        return trades, curve, metrics
+
+
+def compute_metrics(trades, curve, initial_balance):
+    """Metrike trejdova i krive kapitala.
+
+    return_pct/max_drawdown_pct prate krivu sa složenim rastom (veličina pozicije raste sa kapitalom), pa
+    eksplodiraju na dugim periodima; simple_* sabiraju prinos svakog trejda na kapital pri ulazu
+    (bez složenog rasta) i ostaju uporedivi između skupova parametara.
+    """
+    pnl = trades["pnl"].to_numpy()
+    wins = pnl[pnl > 0]
+    losses = pnl[pnl <= 0]
+    peak = np.maximum.accumulate(curve.to_numpy()) if len(curve) else np.array([initial_balance])
+    drawdown = (peak - curve.to_numpy()) / peak if len(curve) else np.array([0.0])
+    final = curve.iloc[-1] if len(curve) else initial_balance
+    by_exit = trades.sort_values("exit_time", kind="stable")
+    simple = np.cumsum((by_exit["pnl"] / by_exit["entry_equity"]).to_numpy())
+    simple_drawdown = np.maximum.accumulate(np.concatenate([[0.0], simple]))[1:] - simple if len(simple) else np.array([0.0])
+    return {
+        "trades": int(len(trades)),
+        "win_rate": float(len(wins) / len(pnl)) if len(pnl) else 0.0,
+        "total_pnl": float(pnl.sum()),
+        "return_pct": float((final / initial_balance - 1) * 100),
+        "max_drawdown_pct": float(drawdown.max() * 100),
+        "simple_return_pct": float(simple[-1] * 100) if len(simple) else 0.0,
+        "simple_max_drawdown_pct": float(simple_drawdown.max() * 100),
+        "profit_factor": float(wins.sum() / -losses.sum()) if losses.sum() < 0 else float("inf") if len(wins) else 0.0,
+        "expectancy": float(pnl.mean()) if len(pnl) else 0.0,
+        "avg_hold_seconds": float(((trades["exit_time"] - trades["entry_time"]) / 1000).mean()) if len(trades) else 0.0,
+        "outcomes": trades["outcome"].value_counts().to_dict(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ChovusSmartBot backtest")
+    parser.add_argument("--data", required=True, help="direktorijum sa CSV/Parquet svećama po simbolu")
+    parser.add_argument("--timeframe", default="1h")
+    parser.add_argument("--exit-data", help="finije sveće za simulaciju izlaza; obavezne kad je --timeframe "
+                                            "duži od MAX_EXIT_BAR_FRACTION * trade_duration")
+    parser.add_argument("--exit-timeframe", default="1m")
+    parser.add_argument("--leverage", type=int, default=10)
+    parser.add_argument("--balance", type=float, default=1000.0)
+    parser.add_argument("--fee-rate", type=float, default=0.0004)
+    parser.add_argument("--max-open-positions", type=int, default=3)
+    parser.add_argument("--max-symbol-exposure", type=float, default=0.3)
+    parser.add_argument("--trades-out", help="CSV sa listom trejdova")
+    args = parser.parse_args()
+    try:
+        check_exit_resolution(args.exit_timeframe if args.exit_data else args.timeframe, StrategyParams().trade_duration)
+    except ValueError as e:
+        parser.error(str(e))
+
+    load_started = time.perf_counter()
+    data = MarketData(load_ohlcv_dir(args.data), args.timeframe)
+    exit_data = MarketData(load_ohlcv_dir(args.exit_data, set(data.symbols)), args.exit_timeframe) if args.exit_data else None
+    print(f"Loaded {len(data.symbols)} symbols x {len(data.timestamps)} bars in {time.perf_counter() - load_started:.2f}s")
+
+    trades, curve, metrics = Backtest(
+        data, exit_data=exit_data, leverage=args.leverage, initial_balance=args.balance, fee_rate=args.fee_rate,
+        max_open_positions=args.max_open_positions, max_symbol_exposure=args.max_symbol_exposure).run()
+    if args.trades_out:
+        trades.to_csv(args.trades_out, index=False)
+        print(f"Trades written to {args.trades_out}")
+    print(json.dumps(metrics, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+# benchmarks/run_benchmarks.py
+"""Reproducibilni benchmark vrućih putanja bota.
+
+Primer (iz korena repoa):
+    python benchmarks/run_benchmarks.py                    # sve grupe, rezultat u benchmarks/results/
+    python benchmarks/run_benchmarks.py --only indicators scan
+    python benchmarks/run_benchmarks.py --data user_data/history/1h --compare benchmarks/results/<stariji>.json
+
+Podaci su snimljene sveće (--data, isti format kao backtest.py) ili deterministički sintetički set
+(seed), a berza je SimulatedExchange sa fiksnim satom (speed=0), pa su ulazi isti između verzija.
+Svaki rezultat se čuva kao JSON sa git commit-om; --compare (podrazumevano poslednji prethodni
+rezultat) ispisuje promenu medijane i vraća exit code 1 ako je neka regresija veća od --threshold.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+GROUPS = ("indicators", "scan", "logging", "api", "orderbook")
+
+
+def timeit(fn, repeat=7, number=1):
+    fn()  # zagrevanje
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - started) / number)
+    return summarize(times)
+
+
+async def atimeit(fn, repeat=5, number=1):
+    await fn()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            await fn()
+        times.append((time.perf_counter() - started) / number)
+    return summarize(times)
+
+
+def summarize(times, **extra):
+    return {"median": statistics.median(times), "min": min(times), "mean": statistics.fmean(times),
+            "stdev": statistics.stdev(times) if len(times) > 1 else 0.0, "runs": len(times), "unit": "s", **extra}
+
+
+def bench_indicators(bot, data, results):
+    import pandas as pd
+    for bars in (150, 10_000):
+        n = min(bars, len(data.timestamps))
+        df = pd.DataFrame({col: getattr(data, col)[0, -n:] for col in ("close", "high", "low")})
+        close = df["close"]
+        number = 200 if n <= 150 else 5
+        results[f"calc_smma[{n}]"] = timeit(lambda: bot.calc_smma(close, 5), number=number)
+        results[f"calc_wma[{n}]"] = timeit(lambda: bot.calc_wma(close, 144), number=number)
+        results[f"fib_zone_check[{n}]"] = timeit(lambda: bot.fib_zone_check(df), number=number)
+        results[f"confirm_smma_wma_crossover[{n}]"] = timeit(lambda: bot.confirm_smma_wma_crossover(df), number=number)
+
+
+def bench_scan(bot, data, results, latency_ms):
+    from candle_cache import CandleCache
+    from markets_cache import MarketsCache
+    from sim_exchange import SimulatedExchange
+    import ChovusSmartBot_v9 as botmod
+
+    async def run():
+        out = {}
+        for latency in (0, latency_ms):
+            bot.exchange = SimulatedExchange(data, speed=0, latency=(latency * 0.5 / 1000, latency * 1.5 / 1000), seed=1)
+            bot.markets_cache = MarketsCache(None)
+            times = []
+            for _ in range(3):  # prazan keš sveća: svaki simbol ide na berzu
+                bot.candle_cache = CandleCache(botmod.db, max_bars=botmod.CANDLE_LIMIT * 2)
+                botmod.db.execute("DELETE FROM candles")
+                started = time.perf_counter()
+                await bot._scan_pairs(limit=5)
+                times.append(time.perf_counter() - started)
+            out[f"scan_pairs_cold[{len(data.symbols)}sym,{latency}ms]"] = summarize(times, **bot.last_scan_stats)
+            times = []
+            for _ in range(5):  # sveće su u kešu (< refresh_seconds), ostaje ticker + pre-filter + scoring
+                started = time.perf_counter()
+                await bot._scan_pairs(limit=5)
+                times.append(time.perf_counter() - started)
+            out[f"scan_pairs_warm[{len(data.symbols)}sym,{latency}ms]"] = summarize(times)
+        return out
+
+    saved = botmod.PREFILTER_TOP_N
+    botmod.PREFILTER_TOP_N = 0  # ceo univerzum; pre-filter bi sakrio regresije u fetch/scoring fazi
+    try:
+        results.update(asyncio.run(run()))
+    finally:
+        botmod.PREFILTER_TOP_N = saved
+        botmod.db.flush()
+
+
+def bench_score_batch(bot, data, results):
+    import pandas as pd
+    from strategy import CANDLE_LIMIT
+    frames = {s: pd.DataFrame({c: getattr(data, c)[i, -CANDLE_LIMIT:] for c in ("close", "high", "low", "volume")})
+              for i, s in enumerate(data.symbols)}
+    ticker_data = {s: (float(data.close[i, -1]), float(data.close[i, -24:] @ data.volume[i, -24:]))
+                   for i, s in enumerate(data.symbols)}
+    results[f"score_candidates[{len(frames)}sym]"] = timeit(lambda: bot.score_candidates(frames, ticker_data), number=5)
+
+
+def bench_logging(results, records):
+    import ChovusSmartBot_v9 as botmod
+
+    def drain(target, timeout=60):
+        deadline = time.monotonic() + timeout
+        while botmod._log_stats["written"] + botmod._log_stats["dropped"] < target and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+    times, drains, dropped = [], [], 0
+    for _ in range(5):
+        base = botmod._log_stats["written"] + botmod._log_stats["dropped"]
+        dropped_before = botmod._log_stats["dropped"]
+        started = time.perf_counter()
+        for n in range(records):
+            botmod.log_action(f"benchmark record {n}")
+        times.append((time.perf_counter() - started) / records)
+        drain(base + records)
+        botmod.db.flush()
+        drains.append(time.perf_counter() - started)
+        dropped += botmod._log_stats["dropped"] - dropped_before
+    results["log_action_call"] = summarize(times, records=records)
+    results[f"log_pipeline_drain[{records}]"] = summarize(drains, dropped=dropped)
+
+    def candidates():
+        for n in range(records):
+            botmod.log_candidate(f"SYM{n % 300}/USDT", 1.0 + n, 0.5, True, False, 1.0, 1.0, 1.1, 0.9, 100.0, 80.0)
+        botmod.db.flush()
+    results[f"log_candidate_flush[{records}]"] = timeit(candidates, repeat=5)
+
+
+def bench_orderbook(results, seed, levels=1000, messages=2000):
+    # Depth diff tok kao @depth@100ms: ~40 promena nivoa po poruci oko sredine book-a
+    import random
+    from order_book import OrderBook
+    rng = random.Random(seed)
+    snapshot = {"lastUpdateId": 1,
+                "bids": [[f"{0.05 - i * 1e-5:.5f}", str(rng.randint(1, 20))] for i in range(levels // 2)],
+                "asks": [[f"{0.05 + (i + 1) * 1e-5:.5f}", str(rng.randint(1, 20))] for i in range(levels // 2)]}
+
+    def side(sign):
+        return [[f"{0.05 + sign * rng.randint(1, levels // 2) * 1e-5:.5f}", str(rng.choice((0, rng.randint(1, 30))))]
+                for _ in range(20)]
+    events = [{"U": 1 + 2 * n, "u": 2 + 2 * n, "pu": 2 * n, "b": side(-1), "a": side(1)} for n in range(messages)]
+
+    times = []
+    for _ in range(5):
+        book = OrderBook("BENCH")
+        book.apply_snapshot(snapshot)
+        started = time.perf_counter()
+        for event in events:
+            book.apply_diff(event)
+            book.last_digit("ask"), book.last_digit("bid"), book.has_wall("ask", 9), book.has_wall("bid", 1)
+        times.append((time.perf_counter() - started) / messages)
+        assert book.stats["applied"] == messages, book.stats
+    results[f"orderbook_diff_message[{levels}]"] = summarize(times, messages=messages)
+
+
+def bench_api(results, requests_per_endpoint, concurrency):
+    import httpx
+    sys.path.insert(0, str(ROOT / "backend"))
+    import main as backend
+
+    endpoints = ["/api/status", "/api/balance", "/api/trades", "/api/candidates", "/api/logs", "/api/signals",
+                 "/api/positions"]
+
+    async def run():
+        out = {}
+        transport = httpx.ASGITransport(app=backend.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for endpoint in endpoints:
+                latencies = []
+                semaphore = asyncio.Semaphore(concurrency)
+
+                async def one():
+                    async with semaphore:
+                        started = time.perf_counter()
+                        response = await client.get(endpoint)
+                        latencies.append(time.perf_counter() - started)
+                        response.raise_for_status()
+
+                await one()
+                latencies.clear()
+                started = time.perf_counter()
+                await asyncio.gather(*(one() for _ in range(requests_per_endpoint)))
+                elapsed = time.perf_counter() - started
+                latencies.sort()
+                out[f"{endpoint}[c={concurrency}]"] = summarize(
+                    latencies, requests_per_second=requests_per_endpoint / elapsed,
+                    p95=latencies[int(len(latencies) * 0.95) - 1])
+        return out
+
+    results.update(asyncio.run(run()))
+    backend.response_cache.clear()
+
+
+def git_revision():
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+        return sha + ("-dirty" if dirty else "")
+    except OSError:
+        return "unknown"
+
+
+def compare(current, previous_path, threshold):
+    previous = json.loads(Path(previous_path).read_text())
+    print(f"\nCompared with {previous_path} ({previous['meta'].get('revision')}):")
+    regressions = []
+    for name, result in current["results"].items():
+        old = previous["results"].get(name)
+        if not old:
+            continue
+        change = result["median"] / old["median"] - 1 if old["median"] else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"  {name:55s} {old['median'] * 1000:10.3f}ms -> {result['median'] * 1000:10.3f}ms  {change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ChovusSmartBot hot-path benchmarks")
+    parser.add_argument("--data", help="direktorijum sa snimljenim svećama (CSV/Parquet po simbolu); bez njega sintetički set")
+    parser.add_argument("--symbols", type=int, default=300)
+    parser.add_argument("--bars", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency-ms", type=float, default=50, help="simulirana latencija berze za drugi scan prolaz")
+    parser.add_argument("--log-records", type=int, default=5000)
+    parser.add_argument("--api-requests", type=int, default=500)
+    parser.add_argument("--api-concurrency", type=int, default=50)
+    parser.add_argument("--only", nargs="+", choices=GROUPS, default=list(GROUPS))
+    parser.add_argument("--output", help="putanja rezultata (podrazumevano benchmarks/results/<vreme>_<commit>.json)")
+    parser.add_argument("--compare", help="raniji rezultat za poređenje (podrazumevano poslednji u benchmarks/results)")
+    parser.add_argument("--threshold", type=float, default=0.2, help="dozvoljeno usporenje medijane pre nego što se prijavi regresija")
+    args = parser.parse_args()
+
+    # Izolovana baza i simulirana berza - benchmark nikad ne dira user_data ni Binance
+    workdir = tempfile.mkdtemp(prefix="chovusbot-bench-")
+    os.environ.update(DB_PATH=str(Path(workdir) / "bench.db"), EXCHANGE_MODE="sim", SIM_SYMBOLS="5", SIM_LATENCY_MS="0")
+    os.chdir(ROOT)
+    sys.path.insert(0, str(ROOT))
+
+    from backtest import MarketData, load_ohlcv_dir
+    from sim_exchange import synthetic_market_data
+    import ChovusSmartBot_v9 as botmod
+    botmod._console_handler.setLevel(logging.CRITICAL)  # zapisi i dalje idu kroz red i u bot_logs
+
+    data = (MarketData(load_ohlcv_dir(args.data), "1h") if args.data
+            else synthetic_market_data(args.symbols, bars=args.bars, seed=args.seed))
+    bot = botmod.ChovusSmartBot()
+    results = {}
+    started = time.perf_counter()
+    if "indicators" in args.only:
+        bench_indicators(bot, data, results)
+        bench_score_batch(bot, data, results)
+    if "scan" in args.only:
+        bench_scan(bot, data, results, args.latency_ms)
+    if "logging" in args.only:
+        bench_logging(results, args.log_records)
+    if "api" in args.only:
+        bench_api(results, args.api_requests, args.api_concurrency)
+    if "orderbook" in args.only:
+        bench_orderbook(results, args.seed)
+
+    report = {
+        "meta": {"revision": git_revision(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                 "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+                 "data": args.data or f"synthetic(symbols={args.symbols}, bars={args.bars}, seed={args.seed})",
+                 "seconds": round(time.perf_counter() - started, 1)},
+        "results": results,
+    }
+    for name, result in results.items():
+        extra = f"  {result['requests_per_second']:.0f} req/s, p95 {result['p95'] * 1000:.2f}ms" if "requests_per_second" in result else ""
+        print(f"{name:55s} median {result['median'] * 1000:10.3f}ms  min {result['min'] * 1000:10.3f}ms{extra}")
+
+    RESULTS_DIR.mkdir(exist_ok=True)
+    previous = args.compare or next(iter(sorted(RESULTS_DIR.glob("*.json"), reverse=True)), None)
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}_{report['meta']['revision']}.json"
+    output.write_text(json.dumps(report, indent=2, default=float))
+    print(f"\nSaved {len(results)} results to {output}")
+    regressions = compare(report, previous, args.threshold) if previous else []
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# candle_cache.py
+import asyncio
+import time
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+TIMEFRAME_SECONDS = {'m': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def timeframe_ms(timeframe):
+    return int(timeframe[:-1]) * TIMEFRAME_SECONDS[timeframe[-1]] * 1000
+
+
+class CandleCache:
+    """Keš OHLCV sveća po (symbol, timeframe): ring buffer u memoriji + SQLite tabela `candles` (preko Storage).
+
+    Posle prvog punog preuzimanja traže se samo sveće od poslednjeg keširanog timestamp-a
+    (`since`), pa se poslednja (još otvorena) sveća uvek ponovo preuzme i prepiše. Koliko sveća
+    nedostaje računa se po satu berze (simulirana berza ima svoj, ccxt timeDifference za Binance),
+    pomerenom najviše do najnovije viđene sveće, a ne po lokalnom satu.
+    """
+
+    def __init__(self, db, max_bars=500, refresh_seconds=10):
+        self.db = db
+        self.max_bars = max_bars
+        self.refresh_seconds = refresh_seconds
+        self._bars = {}  # (symbol, timeframe) -> np.ndarray (n x 6), sortirano po vremenu
+        self._fetched_at = {}
+        self._locks = {}
+        self.stats = {"hits": 0, "incremental": 0, "full": 0}
+        self._latest_candle_ms = 0  # najnovija sveća sa berze - donja granica za njen sat
+
+    def _exchange_now_ms(self, exchange):
+        clock = getattr(exchange, 'now_ms', None)
+        if clock is not None:
+            now = clock()
+        else:
+            now = time.time() * 1000 - (getattr(exchange, 'options', None) or {}).get('timeDifference', 0)
+        return max(now, self._latest_candle_ms)
+
+    def _load(self, symbol, timeframe):
+        rows = self.db.query(
+            "SELECT timestamp, open, high, low, close, volume FROM candles WHERE symbol=? AND timeframe=? "
+            "ORDER BY timestamp DESC LIMIT ?", (symbol, timeframe, self.max_bars))
+        return np.array(rows[::-1], dtype=float).reshape(-1, 6)
+
+    def _persist(self, symbol, timeframe, rows):
+        sql = ("INSERT OR REPLACE INTO candles (symbol, timeframe, timestamp, open, high, low, close, volume) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+        for r in rows:
+            self.db.enqueue(sql, (symbol, timeframe, int(r[0]), *map(float, r[1:])))
+        self.db.enqueue("DELETE FROM candles WHERE symbol=? AND timeframe=? AND timestamp < ?",
+                        (symbol, timeframe, int(self._bars[(symbol, timeframe)][0, 0])))
+
+    def _merge(self, key, fetched):
+        cached = self._bars.get(key)
+        if cached is None or not len(cached):
+            merged = fetched
+        else:
+            step = timeframe_ms(key[1])
+            if fetched[0, 0] > cached[-1, 0] + step:
+                merged = fetched  # preuzeti blok se ne nastavlja na keš - stari deo bi ostavio rupu
+            else:
+                # Sveće sa istim timestamp-om (otvorena sveća) zamenjuju keširane
+                keep = cached[cached[:, 0] < fetched[0, 0]]
+                merged = np.vstack([keep, fetched])
+        self._bars[key] = merged[-self.max_bars:]
+
+    async def get(self, exchange, symbol, timeframe='15m', limit=100):
+        key = (symbol, timeframe)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            if key not in self._bars:
+                self._bars[key] = self._load(symbol, timeframe)
+            cached = self._bars[key]
+            now = time.time()
+            fresh = now - self._fetched_at.get(key, 0) < self.refresh_seconds
+            if fresh and len(cached) >= limit:
+                self.stats["hits"] += 1
+            else:
+                step = timeframe_ms(timeframe)
+                missing = int((self._exchange_now_ms(exchange) - cached[-1, 0]) // step) + 1 if len(cached) else limit
+                if len(cached) >= limit and missing < limit:
+                    self.stats["incremental"] += 1
+                    ohlcv = await exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=int(cached[-1, 0]), limit=missing + 1)
+                else:
+                    self.stats["full"] += 1
+                    ohlcv = await exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+                if ohlcv:
+                    fetched = np.array(ohlcv, dtype=float).reshape(-1, 6)
+                    self._latest_candle_ms = max(self._latest_candle_ms, fetched[-1, 0])
+                    self._merge(key, fetched)
+                    self._persist(symbol, timeframe, fetched)
+                self._fetched_at[key] = now
+            df = pd.DataFrame(self._bars[key][-limit:], columns=COLUMNS)
+            df['timestamp'] = df['timestamp'].astype('int64')
+            return df
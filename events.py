@@ -0,0 +1,91 @@
+# events.py
+"""Interni pub/sub za push ka dashboard-u (/api/stream, Server-Sent Events).
+
+Bot objavljuje promene stanja (log linije, kandidati, trejdovi, balans, pozicije, tick-ovi) čim se
+dese; svaki otvoren browser je jedan pretplatnik sa sopstvenim ograničenim redom. Događaj se
+serijalizuje jednom, bez obzira na broj pretplatnika, a poslednje stanje po tipu se pamti da bi
+nov klijent odmah dobio kompletan prikaz. publish je bezbedan i iz drugih niti (log writer).
+"""
+import asyncio
+import json
+import time
+
+SUBSCRIBER_QUEUE_SIZE = 256
+SNAPSHOT_EVENTS = ("status", "balance", "positions", "candidates", "market", "signals", "orderbook")
+
+
+class EventBus:
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.stats = {"published": 0, "delivered": 0, "dropped": 0}
+        self._subscribers = set()
+        self._snapshot = {}  # tip -> poslednja SSE poruka za SNAPSHOT_EVENTS
+        self._loop = None
+        self._listeners = []
+
+    @property
+    def subscribers(self):
+        return len(self._subscribers)
+
+    @staticmethod
+    def format(event, data):
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    def add_listener(self, callback):
+        """callback(event, data) se zove sinhrono u niti koja objavljuje - mora biti brz i thread-safe."""
+        self._listeners.append(callback)
+
+    def publish(self, event, data):
+        for callback in self._listeners:
+            callback(event, data)
+        message = self.format(event, data)
+        if event in SNAPSHOT_EVENTS:
+            self._snapshot[event] = message
+        self.stats["published"] += 1
+        loop = self._loop
+        if not self._subscribers or loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._dispatch(message)
+        else:
+            loop.call_soon_threadsafe(self._dispatch, message)
+
+    def _dispatch(self, message):
+        for q in list(self._subscribers):
+            if q.full():
+                q.get_nowait()  # spor klijent: baci najstariji događaj umesto da blokira bota
+                self.stats["dropped"] += 1
+            q.put_nowait(message)
+            self.stats["delivered"] += 1
+
+    def subscribe(self):
+        self._loop = asyncio.get_running_loop()
+        q = asyncio.Queue(maxsize=self.queue_size)
+        for message in list(self._snapshot.values()):
+            q.put_nowait(message)
+        self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        self._subscribers.discard(q)
+
+    async def stream(self, q, is_disconnected, keepalive=15.0):
+        """Generator SSE poruka za jednog klijenta; keepalive komentar drži proxy-je otvorenim."""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(q.get(), keepalive)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        break
+                    yield f": keepalive {int(time.time())}\n\n"
+        finally:
+            self.unsubscribe(q)
+
+
+bus = EventBus()
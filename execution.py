@@ -0,0 +1,381 @@
+# execution.py
+"""Izvršenje naloga sa unapred spremnim stanjem i merenjem latencije od signala do fill-a.
+
+Ranije je _open_long između signala i naloga čekao tri REST poziva (fetch_ticker, fetch_balance,
+create_order). Ovde su balans i leverage uvek u memoriji:
+  - balans osvežava Binance user-data stream (ACCOUNT_UPDATE), a bez njega (simulirana berza, nema
+    API ključa) pozadinska petlja na refresh_interval i osvežavanje posle svakog naloga,
+  - leverage se postavlja jednom po simbolu (prewarm za sve mete skeniranja odjednom) i pamti,
+  - cena za veličinu pozicije je tick sa price feed-a ili cena iz tickera skeniranja,
+pa na kritičnoj putanji ostaje samo create_order. Svaki nalog je red u tabeli executions sa
+signal->ack i signal->fill vremenom (fill iz odgovora ili iz ORDER_TRADE_UPDATE događaja); prekoračenje
+budget_ms se loguje i broji u metrikama.
+
+Bracket izlazi (place_bracket) su reduce-only STOP_MARKET (SL) i TRAILING_STOP_MARKET (TP) na berzi.
+Konačno stanje svakog naloga stiže kroz future iz ORDER_TRADE_UPDATE događaja, pa pozicija ne troši
+zahteve dok čeka; reconcile() je retka REST provera za događaje propuštene tokom reconnect-a.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+
+import websockets
+
+import metrics
+from events import bus
+
+EXECUTION_LATENCY_BUDGET_MS = float(os.getenv("EXECUTION_LATENCY_BUDGET_MS", "1500"))
+BALANCE_REFRESH_INTERVAL = float(os.getenv("BALANCE_REFRESH_INTERVAL", "30"))  # bez user-data stream-a
+BALANCE_MAX_AGE = float(os.getenv("BALANCE_MAX_AGE", "300"))  # stariji keš se pre naloga osveži preko REST-a
+EXECUTION_USER_STREAM = os.getenv("EXECUTION_USER_STREAM", "1") == "1"
+USER_STREAM_URL = "wss://fstream.binance.com/ws"
+LISTEN_KEY_KEEPALIVE = 30 * 60  # Binance listenKey ističe posle 60 minuta bez keepalive-a
+QUOTE_CURRENCY = "USDT"
+FINAL_ORDER_STATUSES = ("FILLED", "CANCELED", "EXPIRED", "REJECTED")
+CCXT_ORDER_STATUS = {"closed": "FILLED", "canceled": "CANCELED", "expired": "EXPIRED", "rejected": "REJECTED"}
+
+logger = logging.getLogger(__name__)
+
+EXECUTION_SECONDS = metrics.histogram("chovusbot_execution_seconds", "Order latency by stage", ("stage",),
+                                      buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 1.5, 2.5, 5.0, 10.0))
+EXECUTION_BUDGET_EXCEEDED = metrics.counter("chovusbot_execution_budget_exceeded_total",
+                                            "Orders whose signal-to-ack latency exceeded the budget")
+SIZING_SOURCE = metrics.counter("chovusbot_execution_sizing_total", "Where sizing inputs came from", ("input", "source"))
+
+
+class ExecutionEngine:
+    def __init__(self, exchange, price_feed, db, budget_ms=EXECUTION_LATENCY_BUDGET_MS,
+                 refresh_interval=BALANCE_REFRESH_INTERVAL, max_balance_age=BALANCE_MAX_AGE,
+                 user_stream=EXECUTION_USER_STREAM, user_stream_url=USER_STREAM_URL, log=None):
+        self.exchange = exchange
+        self.price_feed = price_feed
+        self.db = db
+        self.budget_ms = budget_ms
+        self.refresh_interval = refresh_interval
+        self.max_balance_age = max_balance_age
+        self.user_stream_url = user_stream_url
+        self.listen_key_stream = (user_stream and bool(getattr(exchange, 'apiKey', None))
+                                  and hasattr(exchange, 'fapiPrivatePostListenKey'))
+        # Simulirana berza šalje iste događaje direktno (subscribe_user_events), bez WebSocket-a
+        self.user_stream = self.listen_key_stream or (user_stream and hasattr(exchange, 'subscribe_user_events'))
+        self.balance = None  # ukupni USDT (wallet balance)
+        self.balance_updated = 0.0  # time.monotonic()
+        self.balance_source = None  # "rest" ili "stream"
+        self.leverage = {}  # symbol -> leverage potvrđen na berzi
+        self.stats = {"orders": 0, "order_errors": 0, "budget_exceeded": 0, "balance_refreshes": 0,
+                      "stream_events": 0, "stream_fills": 0, "stream_reconnects": 0,
+                      "bracket_orders": 0, "bracket_fills": 0, "bracket_cancels": 0, "bracket_reconciles": 0}
+        self._pending = {}  # clientOrderId -> signal_at dok fill ne stigne
+        self._watchers = {}  # clientOrderId -> future sa konačnim stanjem naloga (bracket)
+        self._ids = itertools.count(1)
+        self._tasks = []
+        self._refresh_task = None
+        # log(message, level) - bot prosleđuje log_action da upozorenja stignu u bot_logs i na dashboard
+        self._log = log or (lambda message, level=logging.INFO: logger.log(level, message))
+
+    # --- stanje naloga ---
+
+    async def start(self):
+        await self.refresh_balance()
+        if self.listen_key_stream:
+            self._tasks.append(asyncio.create_task(self._run_user_stream()))
+        elif self.user_stream:
+            self.exchange.subscribe_user_events(self._on_user_event)
+        self._tasks.append(asyncio.create_task(self._refresh_loop()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        if self.user_stream and not self.listen_key_stream:
+            self.exchange.unsubscribe_user_events(self._on_user_event)
+
+    async def refresh_balance(self):
+        try:
+            balance = await self.exchange.fetch_balance({"type": "future"})
+            self._set_balance(float(balance['total'][QUOTE_CURRENCY]), "rest")
+            self.stats["balance_refreshes"] += 1
+        except Exception as e:
+            logger.warning(f"Balance refresh failed, keeping cached value: {e}")
+        return self.balance
+
+    def _set_balance(self, value, source):
+        self.balance = value
+        self.balance_updated = time.monotonic()
+        self.balance_source = source
+
+    def _refresh_soon(self):
+        if not self.user_stream and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self.refresh_balance())
+
+    async def _refresh_loop(self):
+        # Sa user-data stream-om ovo je samo provera; bez njega je jedini izvor svežeg balansa
+        interval = self.refresh_interval * (10 if self.user_stream else 1)
+        while True:
+            await asyncio.sleep(interval)
+            await self.refresh_balance()
+
+    def invalidate_leverage(self):
+        self.leverage.clear()
+
+    async def ensure_leverage(self, symbol, leverage):
+        if self.leverage.get(symbol) == leverage:
+            return True
+        try:
+            await self.exchange.set_leverage(leverage, symbol)
+            self.leverage[symbol] = leverage
+            return True
+        except Exception as e:
+            self._log(f"Setting {leverage}x leverage for {symbol} failed: {e}", logging.WARNING)
+            return False
+
+    async def prewarm(self, symbols, leverage):
+        """Leverage za sve mete paralelno, pre prvog naloga; balans se osveži ako je keš zastareo."""
+        jobs = [self.ensure_leverage(s, leverage) for s in symbols if self.leverage.get(s) != leverage]
+        if self.balance is None or time.monotonic() - self.balance_updated > self.max_balance_age:
+            jobs.append(self.refresh_balance())
+        if jobs:
+            await asyncio.gather(*jobs)
+
+    # --- veličina i slanje naloga ---
+
+    async def size(self, symbol, alloc, leverage, price=None, max_price_age=3.0):
+        """Količina iz keširanog balansa i cene; REST samo ako keša nema. Vraća (količina, cena)."""
+        if self.balance is None or time.monotonic() - self.balance_updated > self.max_balance_age:
+            SIZING_SOURCE.labels(input="balance", source="rest").inc()
+            await self.refresh_balance()
+        else:
+            SIZING_SOURCE.labels(input="balance", source=self.balance_source).inc()
+        feed_price = self.price_feed.latest(symbol, max_price_age) if self.price_feed else None
+        if feed_price:
+            price = feed_price
+            SIZING_SOURCE.labels(input="price", source="feed").inc()
+        elif price:
+            SIZING_SOURCE.labels(input="price", source="scan").inc()
+        else:
+            price = (await self.exchange.fetch_ticker(symbol))['ask']
+            SIZING_SOURCE.labels(input="price", source="rest").inc()
+
+        market = self.exchange.market(symbol)
+        min_qty = market['limits']['amount']['min']
+        max_qty = market['limits']['amount']['max']
+        quantity = float(self.exchange.amount_to_precision(symbol, (self.balance * 0.99 * alloc * leverage) / price))
+        if min_qty and quantity < min_qty:
+            self._log(f"Calculated quantity {quantity} is less than min_qty {min_qty}. Setting to min_qty.")
+            quantity = min_qty
+        if max_qty and quantity > max_qty:
+            self._log(f"Calculated quantity {quantity} is more than max_qty {max_qty}. Setting to max_qty.")
+            quantity = max_qty
+        return quantity, price
+
+    def _client_order_id(self):
+        return f"cb{int(time.time() * 1000)}_{next(self._ids)}"  # Binance: do 36 znakova
+
+    async def submit(self, symbol, side, quantity, signal_at=None, reduce_only=False):
+        """Market nalog u jednom zahtevu; vraća ccxt order, latencija ide u executions i metrike.
+
+        reduce_only je za izlaze: nalog može samo da smanji poziciju, nikad da otvori suprotnu.
+        """
+        signal_at = signal_at or time.time()
+        client_id = self._client_order_id()
+        params = {"newClientOrderId": client_id}
+        if reduce_only:
+            params["reduceOnly"] = True
+        if getattr(self.exchange, 'id', None) in ('binance', 'binanceusdm'):
+            params["newOrderRespType"] = "RESULT"  # odgovor odmah nosi status i prosečnu cenu fill-a
+        submitted_at = time.time()
+        try:
+            order = await self.exchange.create_order(symbol, 'market', side, quantity, None, params)
+        except Exception as e:
+            self.stats["order_errors"] += 1
+            self._record(client_id, symbol, side, quantity, None, "error", signal_at, submitted_at, None, None, str(e))
+            raise
+        ack_at = time.time()
+        self.stats["orders"] += 1
+        filled = order.get('status') == 'closed'
+        self._record(client_id, symbol, side, quantity, order.get('average') or order.get('price'),
+                     order.get('status'), signal_at, submitted_at, ack_at, ack_at if filled else None)
+        if not filled:
+            self._pending[client_id] = signal_at
+        EXECUTION_SECONDS.labels(stage="submit_to_ack").observe(ack_at - submitted_at)
+        EXECUTION_SECONDS.labels(stage="signal_to_ack").observe(ack_at - signal_at)
+        if filled:
+            EXECUTION_SECONDS.labels(stage="signal_to_fill").observe(ack_at - signal_at)
+        signal_to_ack_ms = (ack_at - signal_at) * 1000
+        if signal_to_ack_ms > self.budget_ms:
+            self.stats["budget_exceeded"] += 1
+            EXECUTION_BUDGET_EXCEEDED.inc()
+            self._log(f"Execution latency budget exceeded for {symbol}: signal->ack {signal_to_ack_ms:.0f}ms "
+                      f"(budget {self.budget_ms:.0f}ms, submit->ack {(ack_at - submitted_at) * 1000:.0f}ms)", logging.WARNING)
+        self._refresh_soon()
+        return order
+
+    # --- bracket izlazi ---
+
+    async def place_bracket(self, symbol, quantity, stop_price, activation_price, callback_rate):
+        """SL i trailing TP za long poziciju, paralelno; vraća {"SL": leg, "TP": leg}.
+
+        leg = {"order", "client_id", "done"}, gde je done future sa {"status", "price", "filled"} kad nalog
+        završi (FILLED, CANCELED, EXPIRED, REJECTED). Ako jedan nalog ne prođe, drugi se otkazuje i greška
+        se prosleđuje - pozicija onda ide na praćenje u klijentu.
+        """
+        specs = {
+            "SL": ("STOP_MARKET", {"stopPrice": self.exchange.price_to_precision(symbol, stop_price)}),
+            "TP": ("TRAILING_STOP_MARKET", {"callbackRate": round(callback_rate, 1),
+                                            "activationPrice": self.exchange.price_to_precision(symbol, activation_price)}),
+        }
+        legs = {name: {"client_id": self._client_order_id(), "order": None} for name in specs}
+        for leg in legs.values():
+            # Future pre slanja: događaj sa berze može da stigne pre REST odgovora
+            leg["done"] = self._watchers[leg["client_id"]] = asyncio.get_running_loop().create_future()
+
+        async def place(name):
+            order_type, params = specs[name]
+            params.update({"reduceOnly": True, "workingType": "MARK_PRICE", "newClientOrderId": legs[name]["client_id"]})
+            legs[name]["order"] = await self.exchange.create_order(symbol, order_type, 'sell', quantity, None, params)
+
+        results = await asyncio.gather(*(place(name) for name in legs), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            await asyncio.gather(*(self.cancel(symbol, leg) for leg in legs.values() if leg["order"]))
+            for leg in legs.values():
+                self._watchers.pop(leg["client_id"], None)
+            raise errors[0]
+        self.stats["bracket_orders"] += len(legs)
+        return legs
+
+    async def adopt_bracket(self, symbol, orders):
+        """Bracket nalozi iz žurnala posle restarta ({"SL": (id, clientOrderId), ...}): future-i za događaje i
+        paralelna REST provera, jer su fill-ovi dok bot nije radio propušteni."""
+        loop = asyncio.get_running_loop()
+        legs = {name: {"client_id": client_id, "order": {"id": order_id},
+                       "done": self._watchers.setdefault(client_id, loop.create_future())}
+                for name, (order_id, client_id) in orders.items()}
+        await asyncio.gather(*(self.reconcile(symbol, leg) for leg in legs.values()))
+        return legs
+
+    def _resolve(self, client_id, status, price, filled):
+        future = self._watchers.pop(client_id, None)
+        if future is not None and not future.done():
+            if status == "FILLED":
+                self.stats["bracket_fills"] += 1
+            future.set_result({"status": status, "price": price, "filled": filled})
+
+    async def cancel(self, symbol, leg):
+        """Otkazuje bracket nalog; ako više nije otvoren (upravo popunjen), stanje se proveri preko REST-a."""
+        if leg["done"].done():
+            return leg["done"].result()
+        try:
+            await self.exchange.cancel_order(leg["order"]["id"], symbol)
+            self.stats["bracket_cancels"] += 1
+            self._resolve(leg["client_id"], "CANCELED", None, 0.0)
+        except Exception as e:
+            logger.info(f"Cancel of {leg['client_id']} for {symbol} failed ({e}), reconciling")
+            await self.reconcile(symbol, leg)
+        return leg["done"].result() if leg["done"].done() else None
+
+    async def reconcile(self, symbol, leg):
+        """REST provera jednog bracket naloga; razrešava future ako je nalog završen."""
+        if leg["done"].done():
+            return
+        self.stats["bracket_reconciles"] += 1
+        try:
+            order = await self.exchange.fetch_order(leg["order"]["id"], symbol)
+        except Exception as e:
+            logger.warning(f"Reconciling {leg['client_id']} for {symbol} failed: {e}")
+            return
+        status = CCXT_ORDER_STATUS.get(order.get('status'))
+        if status:
+            self._resolve(leg["client_id"], status, order.get('average'), float(order.get('filled') or 0))
+
+    def _record(self, client_id, symbol, side, quantity, fill_price, status, signal_at, submitted_at, ack_at,
+                filled_at, error=None):
+        # Red ide u red za upis (flusher nit), a događaj posle tekućeg koraka petlje - nalog se vraća bez čekanja na bazu
+        def ms(end):
+            return round((end - signal_at) * 1000, 1) if end else None
+        self.db.enqueue(
+            "INSERT INTO executions (client_order_id, symbol, side, quantity, fill_price, status, signal_at, "
+            "submitted_at, ack_at, filled_at, signal_to_ack_ms, signal_to_fill_ms, error) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (client_id, symbol, side, quantity, fill_price, status, signal_at, submitted_at, ack_at, filled_at,
+             ms(ack_at), ms(filled_at), error))
+        asyncio.get_running_loop().call_soon(
+            bus.publish, "execution", {"client_order_id": client_id, "symbol": symbol, "side": side, "status": status,
+                                       "signal_to_ack_ms": ms(ack_at), "signal_to_fill_ms": ms(filled_at)})
+
+    # --- user-data stream ---
+
+    async def _keep_listen_key_alive(self):
+        while True:
+            await asyncio.sleep(LISTEN_KEY_KEEPALIVE)
+            try:
+                await self.exchange.fapiPrivatePutListenKey()
+            except Exception as e:
+                logger.warning(f"listenKey keepalive failed: {e}")
+
+    async def _run_user_stream(self):
+        backoff = 1
+        while True:
+            keepalive = None
+            try:
+                listen_key = (await self.exchange.fapiPrivatePostListenKey())['listenKey']
+                keepalive = asyncio.create_task(self._keep_listen_key_alive())
+                async with websockets.connect(f"{self.user_stream_url}/{listen_key}", ping_interval=20) as ws:
+                    backoff = 1
+                    await self.refresh_balance()  # događaji pre konekcije su propušteni
+                    async for message in ws:
+                        event = json.loads(message)
+                        if event.get("e") == "listenKeyExpired":
+                            break
+                        self._on_user_event(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"User data stream error: {e}")
+            finally:
+                if keepalive:
+                    keepalive.cancel()
+            self.stats["stream_reconnects"] += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+    def _on_user_event(self, event):
+        self.stats["stream_events"] += 1
+        kind = event.get("e")
+        if kind == "ACCOUNT_UPDATE":
+            for balance in event.get("a", {}).get("B", ()):
+                if balance.get("a") == QUOTE_CURRENCY:
+                    self._set_balance(float(balance["wb"]), "stream")
+        elif kind == "ORDER_TRADE_UPDATE":
+            order = event.get("o", {})
+            if order.get("X") in FINAL_ORDER_STATUSES and order.get("c") in self._watchers:
+                self._resolve(order["c"], order["X"], float(order.get("ap") or 0) or None, float(order.get("z") or 0))
+            signal_at = self._pending.get(order.get("c"))
+            if signal_at is not None and order.get("X") == "FILLED":
+                del self._pending[order["c"]]
+                filled_at = order.get("T", event.get("E")) / 1000  # vreme berze; razlika satova ulazi u merenje
+                self.stats["stream_fills"] += 1
+                EXECUTION_SECONDS.labels(stage="signal_to_fill").observe(max(0.0, filled_at - signal_at))
+                # Isti red za upis kao INSERT iz _record, pa UPDATE uvek ide posle njega
+                self.db.enqueue(
+                    "UPDATE executions SET status = 'closed', fill_price = ?, filled_at = ?, signal_to_fill_ms = ? "
+                    "WHERE client_order_id = ?",
+                    (float(order.get("ap") or 0) or None, filled_at, round((filled_at - signal_at) * 1000, 1), order["c"]))
+
+    def latency_summary(self, limit=100):
+        """p50/p95/max poslednjih `limit` naloga (ms) - za /api/executions."""
+        rows = self.db.query("SELECT signal_to_ack_ms, signal_to_fill_ms FROM executions WHERE status != 'error' "
+                             "ORDER BY id DESC LIMIT ?", (limit,))
+        summary = {}
+        for i, name in enumerate(("signal_to_ack_ms", "signal_to_fill_ms")):
+            values = sorted(r[i] for r in rows if r[i] is not None)
+            if values:
+                summary[name] = {"p50": values[len(values) // 2], "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                                 "max": values[-1], "count": len(values)}
+        return {"budget_ms": self.budget_ms, "balance": self.balance, "balance_source": self.balance_source,
+                "balance_age": round(time.monotonic() - self.balance_updated, 1) if self.balance is not None else None,
+                "user_stream": self.user_stream, **summary, "stats": self.stats}
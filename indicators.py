@@ -0,0 +1,93 @@
+# indicators.py
+import math
+
+import numpy as np
+
+import metrics
+
+WMA_BLOCK = 4096  # dužina bloka kumulativnih zbirova u wma (ograničava grešku zaokruživanja)
+INDICATOR_SECONDS = metrics.histogram("chovusbot_indicator_seconds", "Indicator computation time in seconds", ("fn",))
+
+
+@metrics.timed(INDICATOR_SECONDS.labels(fn="smma"))
+def smma(values, length):
+    """SMMA kao rekurzivni filter y[i] = (y[i-1] * (length - 1) + x[i]) / length, y[0] = x[0].
+
+    Računa se po poslednjoj osi (radi i za matricu simboli x sveće) kumulativnom formulacijom:
+    unutar bloka y[s+j] = a^j * (y[s] + b * cumsum(x * a^-k)), a blokovi su dovoljno kratki
+    da a^-k ne pređe 1e100.
+    """
+    x = np.asarray(values, dtype=float)
+    if length <= 1 or x.shape[-1] == 0:
+        return x.copy()
+    a = (length - 1) / length
+    b = 1 / length
+    block = max(1, int(100 * math.log(10) / -math.log(a)))
+    out = np.empty_like(x)
+    out[..., 0] = x[..., 0]
+    carry = x[..., :1]
+    for start in range(1, x.shape[-1], block):
+        chunk = x[..., start:start + block]
+        k = np.arange(1, chunk.shape[-1] + 1)
+        decay = a ** k
+        out[..., start:start + block] = decay * (carry + b * np.cumsum(chunk / decay, axis=-1))
+        carry = out[..., start + chunk.shape[-1] - 1:start + chunk.shape[-1]]
+    return out
+
+
+@metrics.timed(INDICATOR_SECONDS.labels(fn="wma"))
+def wma(values, length):
+    """Ponderisani pokretni prosek sa težinama 1..length; prvih length-1 vrednosti je NaN.
+
+    O(n) po seriji: brojilac prozora koji se završava na k-tom elementu je
+    (C2[k] - C2[k-L]) - (k-L) * (C1[k] - C1[k-L]), gde su C1 = cumsum(x) i C2 = cumsum(i * x).
+    Zbirovi kreću iznova na svakih WMA_BLOCK elemenata (sa preklopom od length - 1) nad serijom
+    centriranom oko srednje vrednosti bloka, pa oduzimanje velikih zbirova ne gubi preciznost ni na
+    dugim serijama. Prozor koji sadrži NaN daje NaN, kao rolling().apply.
+    """
+    x = np.asarray(values, dtype=float)
+    out = np.full_like(x, np.nan)
+    n = x.shape[-1]
+    if length < 1 or n < length:
+        return out
+    norm = length * (length + 1) / 2
+    for start in range(0, n - length + 1, WMA_BLOCK):
+        seg = x[..., start:start + WMA_BLOCK + length - 1]
+        m = seg.shape[-1]
+        missing = np.isnan(seg)
+        present = np.maximum((~missing).sum(axis=-1, keepdims=True), 1)
+        center = np.where(missing, 0.0, seg).sum(axis=-1, keepdims=True) / present
+        d = np.where(missing, 0.0, seg - center)
+        pad = [(0, 0)] * (x.ndim - 1) + [(1, 0)]
+        c1 = np.pad(np.cumsum(d, axis=-1), pad)
+        c2 = np.pad(np.cumsum(d * np.arange(1, m + 1), axis=-1), pad)
+        cn = np.pad(np.cumsum(missing, axis=-1), pad)
+        k = np.arange(length, m + 1)
+        block = (c2[..., k] - c2[..., k - length] - (k - length) * (c1[..., k] - c1[..., k - length])) / norm + center
+        block[cn[..., k] - cn[..., k - length] > 0] = np.nan
+        out[..., start + length - 1:start + m] = block
+    return out
+
+
+def rolling_max(values, window):
+    x = np.asarray(values, dtype=float)
+    out = np.full_like(x, np.nan)
+    if x.shape[-1] >= window:
+        out[..., window - 1:] = np.lib.stride_tricks.sliding_window_view(x, window, axis=-1).max(axis=-1)
+    return out
+
+
+def rolling_min(values, window):
+    x = np.asarray(values, dtype=float)
+    out = np.full_like(x, np.nan)
+    if x.shape[-1] >= window:
+        out[..., window - 1:] = np.lib.stride_tricks.sliding_window_view(x, window, axis=-1).min(axis=-1)
+    return out
+
+
+def rolling_sum(values, window):
+    x = np.asarray(values, dtype=float)
+    out = np.full_like(x, np.nan)
+    if x.shape[-1] >= window:
+        out[..., window - 1:] = np.lib.stride_tricks.sliding_window_view(x, window, axis=-1).sum(axis=-1)
+    return out
@@ -0,0 +1,124 @@
+# markets_cache.py
+"""Keš metapodataka tržišta (exchangeInfo) na disku, deljen između bota i UTIL skripti.
+
+load_markets na Binance futures-u skida više MB; ovde se rezultat čuva u JSON fajlu i pri startu
+samo učita u exchange preko set_markets. Posle `ttl` sekundi keš se osvežava u pozadini, a do tada
+scan i order path rade sa postojećim podacima i nikad ne čekaju na mrežu (osim pri prvom startu
+bez keša).
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+MARKETS_CACHE_TTL = float(os.getenv("MARKETS_CACHE_TTL", "3600"))
+
+logger = logging.getLogger(__name__)
+
+
+def default_path(exchange_id="binance"):
+    return Path(os.getenv("DB_PATH", Path(__file__).resolve().parent / "user_data" / "chovusbot.db")).parent / f"markets_{exchange_id}.json"
+
+
+def market_metadata(market):
+    """Sažetak jednog tržišta: ono što scan i _open_long stvarno koriste."""
+    limits = market.get('limits') or {}
+    precision = market.get('precision') or {}
+    return {
+        "symbol": market.get('symbol'),
+        "id": market.get('id'),
+        "active": market.get('active'),
+        "future": bool(market.get('future') or market.get('swap') or market.get('contract')),
+        "min_qty": (limits.get('amount') or {}).get('min'),
+        "max_qty": (limits.get('amount') or {}).get('max'),
+        "min_cost": (limits.get('cost') or {}).get('min'),
+        "amount_precision": precision.get('amount'),
+        "tick_size": precision.get('price'),
+    }
+
+
+class MarketsCache:
+    def __init__(self, path=None, ttl=MARKETS_CACHE_TTL):
+        self.path = Path(path) if path else None  # None = samo u memoriji (npr. simulirana berza)
+        self.ttl = ttl
+        self.fetched_at = 0.0
+        self.stats = {"disk_loads": 0, "refreshes": 0, "refresh_errors": 0}
+        self._refresh_task = None
+
+    def is_fresh(self):
+        return time.time() - self.fetched_at < self.ttl
+
+    def _read(self):
+        if not self.path or not self.path.exists():
+            return None
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable markets cache {self.path}: {e}")
+            return None
+
+    def _write(self, markets, currencies):
+        if not self.path:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"fetched_at": self.fetched_at, "markets": markets, "currencies": currencies}, f, default=str)
+        os.replace(tmp, self.path)
+
+    def apply(self, exchange):
+        """Učita keš sa diska u exchange (set_markets); vraća True ako je bilo šta učitano."""
+        cached = self._read()
+        if not cached or not cached.get("markets"):
+            return False
+        exchange.set_markets(cached["markets"], cached.get("currencies") or None)
+        self.fetched_at = cached.get("fetched_at", 0.0)
+        self.stats["disk_loads"] += 1
+        return True
+
+    async def refresh(self, exchange):
+        markets = await exchange.load_markets(reload=True)
+        self.fetched_at = time.time()
+        self.stats["refreshes"] += 1
+        await asyncio.to_thread(self._write, markets, getattr(exchange, 'currencies', None))
+        return markets
+
+    def refresh_sync(self, exchange):
+        """Za sinhroni ccxt (UTIL skripte)."""
+        markets = exchange.load_markets(reload=True)
+        self.fetched_at = time.time()
+        self.stats["refreshes"] += 1
+        self._write(markets, getattr(exchange, 'currencies', None))
+        return markets
+
+    async def load(self, exchange):
+        """Kao ensure, ali zastareli keš osveži odmah (kratkoživeće skripte nemaju pozadinu)."""
+        if self.apply(exchange) and self.is_fresh():
+            return exchange.markets
+        return await self.refresh(exchange)
+
+    def load_sync(self, exchange):
+        if self.apply(exchange) and self.is_fresh():
+            return exchange.markets
+        return self.refresh_sync(exchange)
+
+    async def _refresh_in_background(self, exchange):
+        try:
+            await self.refresh(exchange)
+        except Exception as e:
+            self.stats["refresh_errors"] += 1
+            logger.warning(f"Markets cache refresh failed, keeping cached data: {e}")
+
+    async def ensure(self, exchange):
+        """Vraća exchange.markets; na mrežu čeka samo ako nema ni keša u memoriji ni na disku."""
+        if not exchange.markets and not self.apply(exchange):
+            return await self.refresh(exchange)
+        if not self.is_fresh() and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self._refresh_in_background(exchange))
+        return exchange.markets
+
+    def metadata(self, exchange, symbol):
+        return market_metadata(exchange.market(symbol))
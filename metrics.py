@@ -0,0 +1,205 @@
+# metrics.py
+"""Minimalni Prometheus metrički sloj (counter, gauge, histogram) bez spoljnih zavisnosti.
+
+Merenja su jedan lock + sabiranje po pozivu, pa mogu ostati uključena u produkciji. render() daje
+tekstualni exposition format za /metrics u backend/main.py; postojeći stats rečnici (candle keš,
+price feed, log red, ...) se ne dupliraju nego čitaju kroz register_collector u trenutku scrape-a.
+"""
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        return self.labels() if not self.labelnames else None
+
+    def samples(self):
+        for key, child in list(self._children.items()):
+            yield from child.samples(self.name, dict(zip(self.labelnames, key)))
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Counter(_Metric):
+    type = "counter"
+    _new_child = _Value
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    type = "gauge"
+    _new_child = _Value
+
+    def set(self, value):
+        self._default().set(value)
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            yield f"{name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, cumulative
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def register_collector(self, collector):
+        """collector() -> iterabla (ime, tip, opis, [(labele, vrednost), ...]) čitana pri svakom scrape-u."""
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for name, labels, value in metric.samples())
+        for collector in self._collectors:
+            try:
+                collected = list(collector())
+            except Exception as e:
+                lines.append(f"# collector {getattr(collector, '__name__', collector)} failed: {e}")
+                continue
+            for name, metric_type, documentation, samples in collected:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def register_collector(collector):
+    REGISTRY.register_collector(collector)
+
+
+def render():
+    return REGISTRY.render()
+
+
+def timed(metric):
+    """Dekorator za sinhrone funkcije: trajanje poziva ide u histogram (ili njegovo dete sa labelama)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metric.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
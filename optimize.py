@@ -0,0 +1,222 @@
+# optimize.py
+"""Pretraga parametara strategije nad istorijskim svećama, paralelno na svim jezgrima.
+
+Primer:
+    python optimize.py --data user_data/history/1h --exit-data user_data/history/1m --method random --samples 200
+
+Sveće se učitaju jednom i stave u shared memory; svaki proces iz ProcessPoolExecutor-a ih
+samo mapira (bez pickle-ovanja DataFrame-ova po zadatku) i pokreće Backtest sa svojim parametrima.
+Rezultati idu u tabelu optimizer_results u bazi bota, rangirani po izabranom cilju.
+
+Sveće za izlaz moraju biti dovoljno fine za najkraći trade_duration u prostoru pretrage
+(backtest.check_exit_resolution), inače se sweep odbija: sa grubim svećama su svi izlazi timeout i
+optimizer bi samo birao najduže trajanje. return i calmar se računaju na prinosima bez složenog
+rasta (simple_*), jer složeni rast daje vrednosti od 1e10 naviše koje ništa ne rangiraju.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+
+from backtest import Backtest, MarketData, check_exit_resolution, load_ohlcv_dir
+from storage import Storage
+from strategy import StrategyParams
+
+DB_PATH = Path(os.getenv("DB_PATH", Path(__file__).resolve().parent / "user_data" / "chovusbot.db"))
+
+# Podrazumevani prostor pretrage: lista = diskretni izbori, {"min", "max"} = kontinualni opseg (samo random)
+DEFAULT_SPACE = {
+    "volume_spike_threshold": [1.2, 1.5, 2.0, 3.0],
+    "round_levels": [[0.01, 0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000], [0.1, 1, 10, 100, 1000]],
+    "weight_round": [0.5, 1.0],
+    "weight_volume": [0.5, 1.0],
+    "weight_crossover": [1.0, 1.2, 1.5],
+    "weight_fib": [0.5, 0.8],
+    "candidate_threshold": [0.4, 0.5],
+    "smma_length": [3, 5, 8],
+    "wma_length": [100, 144],
+    "stop_loss_percent": [0.005, 0.01, 0.02],
+    "trailing_tp_step": [0.003, 0.005, 0.01],
+    "trailing_tp_offset": [0.01, 0.02],
+    "trade_duration": [600, 1800, 3600],
+}
+OBJECTIVES = {
+    "return": lambda m: m["simple_return_pct"],
+    "calmar": lambda m: m["simple_return_pct"] / max(m["simple_max_drawdown_pct"], 1.0),
+    "expectancy": lambda m: m["expectancy"],
+    "profit_factor": lambda m: min(m["profit_factor"], 100.0),
+}
+
+_worker = {}
+
+
+def to_params(sample):
+    params = StrategyParams()
+    weights = dict(params.score_weights)
+    for key, value in sample.items():
+        if key.startswith("weight_"):
+            weights[key[len("weight_"):]] = value
+        else:
+            setattr(params, key, value)
+    params.score_weights = weights
+    params.candle_limit = max(params.candle_limit, params.wma_length + 1)
+    return params
+
+
+def grid_samples(space):
+    keys = list(space)
+    for values in itertools.product(*(space[k] for k in keys)):
+        yield dict(zip(keys, values))
+
+
+def random_samples(space, count, seed=None):
+    rng = random.Random(seed)
+    for _ in range(count):
+        sample = {}
+        for key, choices in space.items():
+            if isinstance(choices, dict):
+                value = rng.uniform(choices["min"], choices["max"])
+                sample[key] = int(round(value)) if isinstance(choices["min"], int) and isinstance(choices["max"], int) else value
+            else:
+                sample[key] = rng.choice(choices)
+        yield sample
+
+
+def min_trade_duration(samples):
+    return min((to_params(sample).trade_duration for sample in samples), default=StrategyParams().trade_duration)
+
+
+def share_arrays(data, names=MarketData.ARRAYS):
+    """Kopira nizove MarketData u shared memory; vraća (blokove, opis za workere)."""
+    if "quote_volume" in names:
+        data.quote_volume_24h()
+    blocks, layout = [], {}
+    for name in names:
+        array = np.ascontiguousarray(getattr(data, name))
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        layout[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, layout
+
+
+def _attach(symbols, timeframe, layout):
+    arrays = {}
+    for name, (block_name, shape, dtype) in layout.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker.setdefault("blocks", []).append(block)  # drži mapiranje živim
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return MarketData.from_arrays(symbols, timeframe, arrays)
+
+
+def _init_worker(symbols, timeframe, layout, backtest_kwargs, exit_spec=None):
+    _worker["data"] = _attach(symbols, timeframe, layout)
+    _worker["kwargs"] = dict(backtest_kwargs)
+    if exit_spec:
+        _worker["kwargs"]["exit_data"] = _attach(*exit_spec)
+
+
+def _evaluate(sample):
+    _, _, metrics = Backtest(_worker["data"], to_params(sample), **_worker["kwargs"]).run()
+    return sample, metrics
+
+
+def init_results_table(db):
+    db.execute('''CREATE TABLE IF NOT EXISTS optimizer_results (id INTEGER PRIMARY KEY AUTOINCREMENT, run_id TEXT, timestamp TEXT, params TEXT, trades INTEGER, win_rate REAL, total_pnl REAL, return_pct REAL, max_drawdown_pct REAL, profit_factor REAL, expectancy REAL, objective REAL)''')
+
+
+def run_sweep(data, samples, *, exit_data=None, objective="calmar", workers=None, backtest_kwargs=None, db=None):
+    """ValueError pre pokretanja ako su sveće za izlaz pregrube za najkraći trade_duration u uzorcima."""
+    backtest_kwargs = backtest_kwargs or {}
+    score = OBJECTIVES[objective]
+    check_exit_resolution((exit_data or data).timeframe, min_trade_duration(samples))
+    run_id = uuid.uuid4().hex[:12]
+    if db:
+        init_results_table(db)
+    blocks, layout = share_arrays(data)
+    exit_spec = None
+    if exit_data is not None:
+        exit_blocks, exit_layout = share_arrays(exit_data, MarketData.EXIT_ARRAYS)
+        blocks += exit_blocks
+        exit_spec = (exit_data.symbols, exit_data.timeframe, exit_layout)
+    results = []
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                                 initargs=(data.symbols, data.timeframe, layout, backtest_kwargs, exit_spec)) as pool:
+            futures = [pool.submit(_evaluate, sample) for sample in samples]
+            for done, future in enumerate(as_completed(futures), 1):
+                sample, metrics = future.result()
+                value = score(metrics)
+                results.append((value, sample, metrics))
+                if db:
+                    db.enqueue(
+                        "INSERT INTO optimizer_results (run_id, timestamp, params, trades, win_rate, total_pnl, return_pct, max_drawdown_pct, profit_factor, expectancy, objective) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (run_id, time.strftime("%Y-%m-%d %H:%M:%S"), json.dumps(sample), metrics["trades"],
+                         metrics["win_rate"], metrics["total_pnl"], metrics["return_pct"],
+                         metrics["max_drawdown_pct"], metrics["profit_factor"], metrics["expectancy"], value))
+                print(f"[{done}/{len(futures)}] {objective}={value:.3f} trades={metrics['trades']} {json.dumps(sample)}")
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+        if db:
+            db.flush()
+    results.sort(key=lambda r: r[0], reverse=True)
+    print(f"Run {run_id}: {len(results)} parameter sets in {time.perf_counter() - started:.1f}s")
+    return run_id, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ChovusSmartBot parameter sweep")
+    parser.add_argument("--data", required=True, help="direktorijum sa CSV/Parquet svećama po simbolu")
+    parser.add_argument("--timeframe", default="1h")
+    parser.add_argument("--exit-data", help="finije sveće za simulaciju izlaza; obavezne kad je --timeframe grublji "
+                                            "od najkraćeg trade_duration u prostoru pretrage")
+    parser.add_argument("--exit-timeframe", default="1m")
+    parser.add_argument("--space", help="JSON fajl sa prostorom pretrage (podrazumevano DEFAULT_SPACE)")
+    parser.add_argument("--method", choices=["grid", "random"], default="random")
+    parser.add_argument("--samples", type=int, default=100, help="broj uzoraka za --method random")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--objective", choices=list(OBJECTIVES), default="calmar")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--leverage", type=int, default=10)
+    parser.add_argument("--fee-rate", type=float, default=0.0004)
+    parser.add_argument("--max-open-positions", type=int, default=3)
+    args = parser.parse_args()
+
+    space = json.loads(Path(args.space).read_text()) if args.space else DEFAULT_SPACE
+    samples = list(grid_samples(space) if args.method == "grid" else random_samples(space, args.samples, args.seed))
+    try:
+        check_exit_resolution(args.exit_timeframe if args.exit_data else args.timeframe, min_trade_duration(samples))
+    except ValueError as e:
+        parser.error(str(e))
+    data = MarketData(load_ohlcv_dir(args.data), args.timeframe)
+    exit_data = MarketData(load_ohlcv_dir(args.exit_data, set(data.symbols)), args.exit_timeframe) if args.exit_data else None
+    print(f"Loaded {len(data.symbols)} symbols x {len(data.timestamps)} bars, evaluating {len(samples)} parameter sets")
+
+    db = Storage(DB_PATH)
+    run_id, results = run_sweep(
+        data, samples, exit_data=exit_data, objective=args.objective, workers=args.workers, db=db,
+        backtest_kwargs={"leverage": args.leverage, "fee_rate": args.fee_rate,
+                         "max_open_positions": args.max_open_positions})
+    print(f"Top {args.top} by {args.objective} (stored as run {run_id} in optimizer_results):")
+    for value, sample, metrics in results[:args.top]:
+        print(f"{value:10.3f} | return {metrics['simple_return_pct']:8.2f}% | dd {metrics['simple_max_drawdown_pct']:6.2f}% | "
+              f"trades {metrics['trades']:5d} | {json.dumps(sample)}")
+    print(json.dumps(asdict(to_params(results[0][1])), indent=2) if results else "No results.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+# order_book.py
+"""Lokalna kopija Binance order book-a iz snapshot-a (REST depth) i diff tokova (@depth).
+
+Cene se čuvaju kao celi brojevi u tick jedinicama (cena * 10**decimals), pa je poslednja decimala
+tačna: tick % 10. decimals mora da odgovara preciznosti cene simbola (price_decimals iz ccxt
+precision['price']); konverzija je tačna (Decimal iz stringa sa berze), pa cena sa više decimala od
+toga ne može da se spoji sa susednim nivoom - book se tada proglašava neispravnim ("invalid") umesto
+da tiho radi sa pogrešnim nivoima. Svaka strana je sortirana lista ključeva
+(bisect) + dict nivo -> količina: promena nivoa je O(log n) pretraga, najbolja cena je prvi element, a
+broj "zidova" po poslednjoj cifri se održava pri svakoj promeni. Zid je nivo čija vrednost (količina *
+cena, u quote valuti) prelazi wall_notional, pa isti prag važi za BTC i za PEPE; bez wall_notional
+prag je količina wall_threshold (UTIL skripta za jedan simbol).
+Analiza po poruci je zato konstantna, a ne sortiranje celog book-a.
+
+Sekvenciranje prati Binance uputstvo: diff-ovi pre snapshot-a se baferuju, oni sa u < lastUpdateId se
+odbacuju, prvi primenjen mora da premosti lastUpdateId (U <= id <= u), a posle toga svaki mora da se
+nastavlja na prethodni (pu == prethodni u na futures-u, U == prethodni u + 1 na spot-u). Rupa u nizu
+znači da book više nije tačan - apply_diff vraća "gap" i pozivalac treba da skine nov snapshot.
+"""
+import bisect
+from collections import deque
+from decimal import Decimal
+
+DEFAULT_DECIMALS = 5
+DEFAULT_WALL_THRESHOLD = 10.0
+MAX_BUFFERED_EVENTS = 1000
+
+
+def price_decimals(precision, default=DEFAULT_DECIMALS):
+    """Broj decimala cene iz ccxt market['precision']['price'].
+
+    U TICK_SIZE modu (Binance u ccxt 4) to je tick size kao float (1e-07 -> 7, 0.5 -> 1), a u
+    DECIMAL_PLACES modu ceo broj decimala.
+    """
+    if precision is None:
+        return default
+    if isinstance(precision, int):
+        return precision
+    return max(0, -Decimal(str(precision)).normalize().as_tuple().exponent)
+
+
+class BookSide:
+    def __init__(self, descending, wall_threshold=DEFAULT_WALL_THRESHOLD, wall_notional=None, scale=1):
+        self.descending = descending
+        self.wall_threshold = wall_threshold
+        self.wall_notional = wall_notional
+        self._wall_ticks = wall_notional * scale if wall_notional is not None else None  # qty * tick > ovoga
+        self.levels = {}  # tick -> količina
+        self.wall_counts = [0] * 10  # poslednja cifra tick-a -> broj nivoa iznad wall_threshold
+        self._keys = []  # rastuće; za bid stranu negirani tick-ovi, pa je najbolja cena uvek _keys[0]
+
+    def __len__(self):
+        return len(self.levels)
+
+    def clear(self):
+        self.levels.clear()
+        self._keys.clear()
+        self.wall_counts = [0] * 10
+
+    def set(self, tick, qty):
+        old = self.levels.get(tick)
+        key = -tick if self.descending else tick
+        if qty:
+            if old is None:
+                bisect.insort(self._keys, key)
+            self.levels[tick] = qty
+        elif old is not None:
+            del self.levels[tick]
+            del self._keys[bisect.bisect_left(self._keys, key)]
+        else:
+            return
+        was_wall = old is not None and self.is_wall(tick, old)
+        is_wall = self.is_wall(tick, qty)
+        if was_wall != is_wall:
+            self.wall_counts[tick % 10] += 1 if is_wall else -1
+
+    def is_wall(self, tick, qty):
+        if self._wall_ticks is None:
+            return qty > self.wall_threshold
+        return qty * tick > self._wall_ticks
+
+    def best(self):
+        """(tick, količina) najbolje cene ili None za praznu stranu."""
+        if not self._keys:
+            return None
+        tick = -self._keys[0] if self.descending else self._keys[0]
+        return tick, self.levels[tick]
+
+    def top(self, n):
+        ticks = (-k for k in self._keys[:n]) if self.descending else self._keys[:n]
+        return [(tick, self.levels[tick]) for tick in ticks]
+
+
+class OrderBook:
+    def __init__(self, symbol, decimals=DEFAULT_DECIMALS, wall_threshold=DEFAULT_WALL_THRESHOLD,
+                 wall_notional=None, max_buffer=MAX_BUFFERED_EVENTS):
+        self.symbol = symbol
+        self.decimals = decimals
+        self.scale = 10 ** decimals
+        self.bids = BookSide(descending=True, wall_threshold=wall_threshold, wall_notional=wall_notional, scale=self.scale)
+        self.asks = BookSide(descending=False, wall_threshold=wall_threshold, wall_notional=wall_notional, scale=self.scale)
+        self.last_update_id = None  # None = čeka se snapshot
+        self.synced = False  # True kad je primenjen prvi diff koji premošćuje snapshot
+        self.stats = {"applied": 0, "buffered": 0, "stale": 0, "gaps": 0, "snapshots": 0, "invalid": 0}
+        self.error = None  # cena finija od decimals; book se više ne ažurira
+        self._buffer = deque(maxlen=max_buffer)
+
+    def to_tick(self, price):
+        scaled = Decimal(str(price)).scaleb(self.decimals)
+        tick = int(scaled)
+        if tick != scaled:
+            raise ValueError(f"{self.symbol}: price {price} has more than {self.decimals} decimals")
+        return tick
+
+    def to_price(self, tick):
+        return tick / self.scale
+
+    def reset(self):
+        """Novi stream (reconnect): stari book i bafer ne važe, čeka se nov snapshot."""
+        self.bids.clear()
+        self.asks.clear()
+        self.last_update_id = None
+        self.synced = False
+        self._buffer.clear()
+
+    def _ticks(self, levels):
+        return [(self.to_tick(price), float(qty)) for price, qty in levels]
+
+    def _invalidate(self, error):
+        # Preciznost je pogrešna za ovaj simbol; prazan i nesinhronizovan book ne daje signal
+        self.error = str(error)
+        self.stats["invalid"] += 1
+        self.reset()
+        return "invalid"
+
+    def apply_snapshot(self, snapshot):
+        """REST depth odgovor ({"lastUpdateId", "bids", "asks"}); posle njega se primene baferovani diff-ovi.
+
+        Vraća "ok", "gap" (snapshot stariji od baferovanih diff-ova) ili "invalid".
+        """
+        if self.error:
+            self.stats["invalid"] += 1
+            return "invalid"
+        try:
+            bids, asks = self._ticks(snapshot["bids"]), self._ticks(snapshot["asks"])
+        except ValueError as e:
+            return self._invalidate(e)
+        self.bids.clear()
+        self.asks.clear()
+        for tick, qty in bids:
+            self.bids.set(tick, qty)
+        for tick, qty in asks:
+            self.asks.set(tick, qty)
+        self.last_update_id = snapshot["lastUpdateId"]
+        self.synced = False
+        self.stats["snapshots"] += 1
+        buffered, self._buffer = list(self._buffer), deque(maxlen=self._buffer.maxlen)
+        for event in buffered:
+            result = self.apply_diff(event)
+            if result in ("gap", "invalid"):
+                return result
+        return "ok"
+
+    def apply_diff(self, event):
+        """Diff poruka (U, u, pu, b, a); vraća "applied", "buffered", "stale", "gap" ili "invalid"."""
+        if self.error:
+            self.stats["invalid"] += 1
+            return "invalid"
+        if self.last_update_id is None:
+            self._buffer.append(event)
+            self.stats["buffered"] += 1
+            return "buffered"
+        first_id, final_id = event["U"], event["u"]
+        if final_id < self.last_update_id or (self.synced and final_id == self.last_update_id):
+            self.stats["stale"] += 1
+            return "stale"
+        if not self.synced:
+            in_sequence = first_id <= self.last_update_id
+        elif "pu" in event:
+            in_sequence = event["pu"] == self.last_update_id
+        else:
+            in_sequence = first_id == self.last_update_id + 1
+        if not in_sequence:
+            self.stats["gaps"] += 1
+            self.reset()
+            self._buffer.append(event)
+            return "gap"
+        try:
+            bids, asks = self._ticks(event.get("b", ())), self._ticks(event.get("a", ()))
+        except ValueError as e:
+            return self._invalidate(e)
+        for tick, qty in bids:
+            self.bids.set(tick, qty)
+        for tick, qty in asks:
+            self.asks.set(tick, qty)
+        self.last_update_id = final_id
+        self.synced = True
+        self.stats["applied"] += 1
+        return "applied"
+
+    def best_bid(self):
+        best = self.bids.best()
+        return (self.to_price(best[0]), best[1]) if best else None
+
+    def best_ask(self):
+        best = self.asks.best()
+        return (self.to_price(best[0]), best[1]) if best else None
+
+    def last_digit(self, side):
+        """Poslednja (decimals-ta) cifra najbolje cene na strani "bid"/"ask", ili None."""
+        best = (self.bids if side == "bid" else self.asks).best()
+        return best[0] % 10 if best else None
+
+    def has_wall(self, side, digit):
+        return (self.bids if side == "bid" else self.asks).wall_counts[digit] > 0
+
+    def top(self, n=5):
+        return {"bids": [(self.to_price(t), q) for t, q in self.bids.top(n)],
+                "asks": [(self.to_price(t), q) for t, q in self.asks.top(n)]}
@@ -0,0 +1,390 @@
+# orderbook_service.py
+"""Headless servis order book signala za više simbola (peta decimala + "rokada" zidovi).
+
+Svi simboli dele jednu combined WebSocket konekciju (<id>@depth@100ms), svaki ima svoj OrderBook
+(order_book.py) koji se sinhronizuje REST snapshot-om i ponovo sinhronizuje na rupu u nizu update
+id-jeva. Broj decimala book-a je preciznost cene futures tržišta simbola (price_precision, iz
+markets keša), a zid je nivo vredan više od wall_notional USDT - simbol bez poznate preciznosti se
+ne prati. Posle svake primenjene poruke signal simbola se preračuna u O(1) (book_signal) i:
+  - bot ga čita kao dodatni ulaz u score (bias(), -1..1 u smeru LONG/SHORT),
+  - backend ga dobija preko bus-a ("orderbook" događaj, najčešće na publish_interval) i /api/orderbook.
+
+record_path snima sirove poruke i snapshot-e u JSONL, a ReplayOrderBookService ih pušta bez mreže.
+Iz komandne linije: python orderbook_service.py ETH/USDT BTC/USDT [--record fajl.jsonl | --replay fajl.jsonl]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import aiohttp
+import ccxt.async_support as ccxt
+import websockets
+
+import metrics
+from events import bus
+from markets_cache import MarketsCache, default_path as markets_cache_path
+from order_book import OrderBook, price_decimals
+from price_feed import FUTURES_STREAM_URL, market_id
+
+FUTURES_DEPTH_URL = "https://fapi.binance.com/fapi/v1/depth"
+SNAPSHOT_LIMIT = 1000
+PUBLISH_INTERVAL = 1.0
+WALL_NOTIONAL = 50000.0  # USDT (količina * cena) da bi nivo bio "zid"
+
+logger = logging.getLogger(__name__)
+
+ORDERBOOK_MESSAGE_SECONDS = metrics.histogram(
+    "chovusbot_orderbook_message_seconds", "Depth message processing time (parse, apply, signal)",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05))
+ORDERBOOK_EVENT_LAG_SECONDS = metrics.histogram(
+    "chovusbot_orderbook_event_lag_seconds", "Exchange event time to local processing",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+ORDERBOOK_UPDATES = metrics.counter("chovusbot_orderbook_updates_total", "Depth diffs by sequencing result", ("result",))
+
+
+def futures_price_precision(markets, symbol):
+    """precision['price'] USDT-M futures tržišta sa market id-jem depth streama, ili None."""
+    mid = market_id(symbol)
+    for market in markets.values():
+        if market.get('id') == mid and (market.get('swap') or market.get('future') or market.get('contract')):
+            return (market.get('precision') or {}).get('price')
+    return None
+
+
+def book_signal(book):
+    """Signal iz stanja book-a; ista pravila kao analyze_order_book u UTIL skripti. None dok je book prazan."""
+    best_bid, best_ask = book.best_bid(), book.best_ask()
+    if not best_bid or not best_ask:
+        return None
+    ask_digit, bid_digit = book.last_digit("ask"), book.last_digit("bid")
+    if ask_digit in (7, 8):
+        digit_signal = "SHORT"
+    elif bid_digit in (1, 2):
+        digit_signal = "LONG"
+    else:
+        digit_signal = None
+    ask_wall_9, bid_wall_1 = book.has_wall("ask", 9), book.has_wall("bid", 1)
+    # Rokada: jak ASK zid na ...9 okreće ka LONG-u, jak BID zid na ...1 ka SHORT-u
+    rokada = "LONG" if ask_wall_9 else "SHORT" if bid_wall_1 else None
+    return {
+        "bid": best_bid[0], "ask": best_ask[0], "bid_digit": bid_digit, "ask_digit": ask_digit,
+        "digit_signal": digit_signal, "ask_wall_9": ask_wall_9, "bid_wall_1": bid_wall_1, "rokada": rokada,
+        "direction": rokada or digit_signal, "update_id": book.last_update_id,
+    }
+
+
+class OrderBookService:
+    def __init__(self, url=FUTURES_STREAM_URL, depth_url=FUTURES_DEPTH_URL, price_precision=None,
+                 wall_notional=WALL_NOTIONAL, snapshot_limit=SNAPSHOT_LIMIT,
+                 publish_interval=PUBLISH_INTERVAL, record_path=None):
+        self.url = url
+        self.depth_url = depth_url
+        self.price_precision = price_precision  # symbol -> ccxt precision['price'] ili None
+        self.wall_notional = wall_notional
+        self.snapshot_limit = snapshot_limit
+        self.publish_interval = publish_interval
+        self.books = {}  # market id -> OrderBook
+        self.signals = {}  # symbol -> book_signal + "updated_at" (time.monotonic)
+        self.stats = {"messages": 0, "snapshots": 0, "snapshot_errors": 0, "reconnects": 0}
+        self._symbols = {}  # market id -> symbol
+        self._snapshot_tasks = {}
+        self._ws = None
+        self._task = None
+        self._session = None
+        self._request_id = 0
+        self._last_published = 0.0
+        self._record = open(record_path, "a") if record_path else None
+        self._record_started = time.monotonic()
+
+    @property
+    def symbols(self):
+        return list(self._symbols.values())
+
+    def _stream(self, symbol):
+        return f"{market_id(symbol).lower()}@depth@100ms"
+
+    async def _send(self, method, streams):
+        if self._ws is None or not streams:
+            return
+        self._request_id += 1
+        try:
+            await self._ws.send(json.dumps({"method": method, "params": streams, "id": self._request_id}))
+        except websockets.ConnectionClosed:
+            pass  # _run će se ponovo povezati i pretplatiti
+
+    async def subscribe(self, symbol):
+        mid = market_id(symbol)
+        if mid in self._symbols:
+            return
+        precision = self.price_precision(symbol) if self.price_precision else None
+        if precision is None:
+            logger.warning(f"No price precision for {symbol}, not tracking its order book")
+            return
+        self._symbols[mid] = symbol
+        self.books[mid] = OrderBook(mid, decimals=price_decimals(precision), wall_notional=self.wall_notional)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        else:
+            await self._send("SUBSCRIBE", [self._stream(symbol)])
+            self._request_snapshot(mid)
+
+    async def unsubscribe(self, symbol):
+        mid = market_id(symbol)
+        if self._symbols.pop(mid, None) is None:
+            return
+        self.books.pop(mid, None)
+        self.signals.pop(symbol, None)
+        task = self._snapshot_tasks.pop(mid, None)
+        if task:
+            task.cancel()
+        if self._symbols:
+            await self._send("UNSUBSCRIBE", [self._stream(symbol)])
+        elif self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def set_symbols(self, symbols):
+        """Prati tačno ove simbole (npr. vrh poslednjeg skeniranja + otvorene pozicije)."""
+        wanted = {market_id(s): s for s in symbols}
+        for symbol in [s for mid, s in self._symbols.items() if mid not in wanted]:
+            await self.unsubscribe(symbol)
+        for mid, symbol in wanted.items():
+            if mid not in self._symbols:
+                await self.subscribe(symbol)
+
+    async def _run(self):
+        backoff = 1
+        while self._symbols:
+            try:
+                async with websockets.connect(self.url, ping_interval=20) as ws:
+                    self._ws = ws
+                    backoff = 1
+                    await self._send("SUBSCRIBE", [self._stream(s) for s in self._symbols.values()])
+                    # Diff-ovi se baferuju u book-u dok snapshot ne stigne (Binance redosled: stream pa REST)
+                    for mid, book in self.books.items():
+                        book.reset()
+                        self._request_snapshot(mid)
+                    async for message in ws:
+                        self._on_raw(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Order book stream connection error: {e}")
+            finally:
+                self._ws = None
+            if self._symbols:
+                self.stats["reconnects"] += 1
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+
+    def _request_snapshot(self, mid):
+        task = self._snapshot_tasks.get(mid)
+        if task is None or task.done():
+            self._snapshot_tasks[mid] = asyncio.create_task(self._load_snapshot(mid))
+
+    async def _fetch_snapshot(self, mid):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        async with self._session.get(self.depth_url, params={"symbol": mid, "limit": self.snapshot_limit}) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def _load_snapshot(self, mid):
+        backoff = 1
+        while mid in self.books:
+            try:
+                snapshot = await self._fetch_snapshot(mid)
+                book = self.books.get(mid)
+                if book is None:
+                    return
+                self._write_record({"snapshot": mid, "data": snapshot})
+                self.stats["snapshots"] += 1
+                result = book.apply_snapshot(snapshot)
+                if result == "ok":
+                    self._update_signal(mid, book)
+                    return
+                if result == "invalid":
+                    self._warn_invalid(mid, book)
+                    return
+                # Snapshot stariji od baferovanih diff-ova - book je resetovan, pokušaj ponovo
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["snapshot_errors"] += 1
+                logger.warning(f"Order book snapshot for {mid} failed: {e}")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _write_record(self, entry):
+        if self._record:
+            self._record.write(json.dumps({"t": round(time.monotonic() - self._record_started, 3), **entry}) + "\n")
+
+    def _on_raw(self, raw):
+        started = time.perf_counter()
+        message = json.loads(raw)
+        if self._record and "id" not in message:
+            self._write_record(message)
+        self._on_message(message)
+        ORDERBOOK_MESSAGE_SECONDS.observe(time.perf_counter() - started)
+
+    def _on_message(self, message):
+        data = message.get("data", message)
+        mid = data.get("s")
+        book = self.books.get(mid)
+        if book is None:
+            return  # odgovor na SUBSCRIBE ili simbol koji više ne pratimo
+        self.stats["messages"] += 1
+        if "E" in data:
+            ORDERBOOK_EVENT_LAG_SECONDS.observe(max(0.0, time.time() - data["E"] / 1000))
+        result = book.apply_diff(data)
+        ORDERBOOK_UPDATES.labels(result=result).inc()
+        if result == "applied":
+            self._update_signal(mid, book)
+        elif result == "gap":
+            self._request_snapshot(mid)
+        elif result == "invalid":
+            self._warn_invalid(mid, book)
+
+    def _warn_invalid(self, mid, book):
+        if book.stats["invalid"] == 1:  # samo prvi put; posle toga book odbija sve poruke
+            logger.warning(f"Order book for {mid} disabled: {book.error}")
+
+    def _update_signal(self, mid, book):
+        signal = book_signal(book)
+        if signal is None:
+            return
+        symbol = self._symbols[mid]
+        self.signals[symbol] = {**signal, "updated_at": time.monotonic()}
+        if time.monotonic() - self._last_published >= self.publish_interval:
+            self._last_published = time.monotonic()
+            bus.publish("orderbook", self.snapshot())
+
+    def snapshot(self, max_age=None):
+        """Signali za API/dashboard; max_age izostavlja simbole bez sveže poruke."""
+        now = time.monotonic()
+        return [{"symbol": symbol, "age": round(now - s["updated_at"], 3),
+                 **{k: v for k, v in s.items() if k != "updated_at"}}
+                for symbol, s in self.signals.items() if max_age is None or now - s["updated_at"] <= max_age]
+
+    def bias(self, symbol, max_age):
+        """+1 LONG, -1 SHORT, 0 bez signala ili kad je book zastareo/nesinhronizovan."""
+        signal = self.signals.get(symbol)
+        book = self.books.get(market_id(symbol))
+        if not signal or not book or not book.synced or time.monotonic() - signal["updated_at"] > max_age:
+            return 0.0
+        return {"LONG": 1.0, "SHORT": -1.0}.get(signal["direction"], 0.0)
+
+    def book_stats(self):
+        return {symbol: {**self.books[mid].stats, "synced": self.books[mid].synced, "decimals": self.books[mid].decimals,
+                         "bids": len(self.books[mid].bids), "asks": len(self.books[mid].asks)}
+                for mid, symbol in self._symbols.items()}
+
+    async def close(self):
+        self._symbols.clear()
+        for task in self._snapshot_tasks.values():
+            task.cancel()
+        self._snapshot_tasks.clear()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._session:
+            await self._session.close()
+            self._session = None
+        if self._record:
+            self._record.close()
+            self._record = None
+
+
+class ReplayOrderBookService(OrderBookService):
+    """Pušta snimak iz record_path (sirove poruke + snapshot-i) umesto Binance-a - za testove.
+
+    Polje "t" je vreme od početka snimka (skalira se sa `speed`, 0 = bez pauza); snapshot-i se
+    primenjuju onako kako su snimljeni, pa se i resync posle rupe ponavlja deterministički.
+    """
+
+    def __init__(self, path, speed=1.0, **kwargs):
+        super().__init__(url=None, depth_url=None, **kwargs)
+        self.path = path
+        self.speed = speed
+        self.finished = asyncio.Event()
+
+    async def _send(self, method, streams):
+        pass
+
+    def _request_snapshot(self, mid):
+        pass  # snapshot-i dolaze iz snimka
+
+    async def _run(self):
+        started = time.monotonic()
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    if not self._symbols:
+                        return
+                    entry = json.loads(line)
+                    offset = entry.pop("t", 0)
+                    delay = offset / self.speed - (time.monotonic() - started) if self.speed else 0
+                    await asyncio.sleep(max(delay, 0))
+                    if "snapshot" in entry:
+                        book = self.books.get(entry["snapshot"])
+                        self.stats["snapshots"] += 1
+                        if book is not None and book.apply_snapshot(entry["data"]) == "ok":
+                            self._update_signal(entry["snapshot"], book)
+                    else:
+                        self._on_raw(json.dumps(entry))
+        finally:
+            self.finished.set()
+
+
+async def _run_cli(args):
+    # Preciznost cena iz istog markets keša koji koristi bot (osvežava se ako je zastareo)
+    exchange = ccxt.binance({'options': {'defaultType': 'future'}})
+    try:
+        markets = await MarketsCache(markets_cache_path(exchange.id)).load(exchange)
+    finally:
+        await exchange.close()
+
+    def precision(symbol):
+        return futures_price_precision(markets, symbol)
+
+    if args.replay:
+        service = ReplayOrderBookService(args.replay, speed=args.speed, price_precision=precision,
+                                         wall_notional=args.wall_notional)
+    else:
+        service = OrderBookService(price_precision=precision, wall_notional=args.wall_notional, record_path=args.record)
+    for symbol in args.symbols:
+        await service.subscribe(symbol)
+    last = {}
+    try:
+        while not (args.replay and service.finished.is_set()):
+            await asyncio.sleep(args.interval)
+            for entry in service.snapshot():
+                key = (entry["direction"], entry["rokada"])
+                if last.get(entry["symbol"]) != key:
+                    last[entry["symbol"]] = key
+                    print(f"{entry['symbol']}: bid {entry['bid']} ask {entry['ask']} -> {entry['direction']} (rokada: {entry['rokada']})")
+    finally:
+        print(json.dumps({"service": service.stats, "books": service.book_stats()}, indent=2))
+        await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Order book signal service (depth streams)")
+    parser.add_argument("symbols", nargs="+", help="npr. ETH/USDT BTC/USDT")
+    parser.add_argument("--wall-notional", type=float, default=WALL_NOTIONAL, help="USDT vrednost nivoa za zid")
+    parser.add_argument("--record", help="snimi poruke i snapshot-e u JSONL")
+    parser.add_argument("--replay", help="pusti snimak umesto Binance streama")
+    parser.add_argument("--speed", type=float, default=1.0, help="brzina replay-a (0 = bez pauza)")
+    parser.add_argument("--interval", type=float, default=1.0, help="koliko često se ispisuju promene signala")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_run_cli(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# price_feed.py
+import asyncio
+import json
+import logging
+import time
+
+import websockets
+
+FUTURES_STREAM_URL = "wss://fstream.binance.com/stream"
+
+logger = logging.getLogger(__name__)
+
+
+def market_id(symbol):
+    # "BTC/USDT" ili "BTC/USDT:USDT" -> "BTCUSDT"
+    return symbol.split(":")[0].replace("/", "").upper()
+
+
+class PriceFeed:
+    """Binance futures bookTicker tokovi preko jedne (combined) WebSocket konekcije.
+
+    Cena za izlaz iz long pozicije je najbolji bid (po njemu bi prošao market sell). Konekcija se
+    otvara na prvi subscribe, zatvara kad nema pretplata, a posle prekida se ponovo povezuje uz
+    exponential backoff i ponovo šalje SUBSCRIBE za sve simbole.
+    """
+
+    def __init__(self, url=FUTURES_STREAM_URL, channel="bookTicker"):
+        self.url = url
+        self.channel = channel
+        self.prices = {}  # symbol -> (cena, time.monotonic() poslednjeg tick-a)
+        self.stats = {"ticks": 0, "reconnects": 0}
+        self._symbols = {}  # market id -> symbol
+        self._events = {}
+        self._ticks = {}  # symbol -> redni broj poslednjeg tick-a (stats["ticks"] u trenutku objave)
+        self._read = {}  # (symbol, consumer) -> redni broj tick-a koji je taj potrošač poslednji pročitao
+        self._ws = None
+        self._task = None
+        self._request_id = 0
+
+    def _stream(self, symbol):
+        return f"{market_id(symbol).lower()}@{self.channel}"
+
+    async def _send(self, method, streams):
+        if self._ws is None or not streams:
+            return
+        self._request_id += 1
+        try:
+            await self._ws.send(json.dumps({"method": method, "params": streams, "id": self._request_id}))
+        except websockets.ConnectionClosed:
+            pass  # _run će se ponovo povezati i pretplatiti
+
+    async def subscribe(self, symbol):
+        if market_id(symbol) in self._symbols:
+            return
+        self._symbols[market_id(symbol)] = symbol
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        else:
+            await self._send("SUBSCRIBE", [self._stream(symbol)])
+
+    async def unsubscribe(self, symbol):
+        if self._symbols.pop(market_id(symbol), None) is None:
+            return
+        self.prices.pop(symbol, None)
+        self._ticks.pop(symbol, None)
+        for key in [k for k in self._read if k[0] == symbol]:
+            del self._read[key]
+        if self._symbols:
+            await self._send("UNSUBSCRIBE", [self._stream(symbol)])
+        elif self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        backoff = 1
+        while self._symbols:
+            try:
+                async with websockets.connect(self.url, ping_interval=20) as ws:
+                    self._ws = ws
+                    backoff = 1
+                    await self._send("SUBSCRIBE", [self._stream(s) for s in self._symbols.values()])
+                    async for message in ws:
+                        self._on_message(json.loads(message))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Price feed connection error: {e}")
+            finally:
+                self._ws = None
+            if self._symbols:
+                self.stats["reconnects"] += 1
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+
+    def _on_message(self, message):
+        data = message.get("data", message)
+        symbol = self._symbols.get(data.get("s", ""))
+        if symbol is None:
+            return  # odgovor na SUBSCRIBE ili simbol koji više pratimo
+        if data.get("e") == "markPriceUpdate":
+            price = data["p"]
+        elif data.get("e") == "kline":
+            price = data["k"]["c"]
+        else:  # bookTicker
+            price = data["b"]
+        self._publish(symbol, float(price))
+
+    def _publish(self, symbol, price):
+        self.prices[symbol] = (price, time.monotonic())
+        self.stats["ticks"] += 1
+        self._ticks[symbol] = self.stats["ticks"]
+        event = self._events.pop(symbol, None)
+        if event:
+            event.set()
+
+    def latest(self, symbol, max_age):
+        price, at = self.prices.get(symbol, (None, 0))
+        return price if time.monotonic() - at <= max_age else None
+
+    async def next_price(self, symbol, timeout, consumer=None):
+        """Cena iz tick-a koji `consumer` još nije pročitao; čeka sledeći ako takvog nema.
+
+        Tick stigao između dva poziva vraća se odmah iz keša, bez čekanja. Vraća None ako novog
+        tick-a nema `timeout` sekundi (tok je zastareo).
+        """
+        key = (symbol, consumer)
+        if self._ticks.get(symbol, 0) <= self._read.get(key, 0):
+            # Događaj se troši pri objavi (_publish ga izbacuje), pa svako čekanje dobija svež
+            event = self._events.setdefault(symbol, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if symbol not in self.prices:
+            return None  # otkazana pretplata dok se čekalo
+        self._read[key] = self._ticks[symbol]
+        return self.prices[symbol][0]
+
+    async def close(self):
+        self._symbols.clear()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+class ReplayPriceFeed(PriceFeed):
+    """Zamena za testove: pušta snimljene poruke iz JSONL fajla umesto prave konekcije.
+
+    Svaka linija je sirova poruka sa streama; opciono polje "t" (sekunde od početka snimka)
+    određuje pauzu pre poruke, skaliranu sa `speed`.
+    """
+
+    def __init__(self, path, speed=1.0, channel="bookTicker"):
+        super().__init__(url=None, channel=channel)
+        self.path = path
+        self.speed = speed
+
+    async def _send(self, method, streams):
+        pass
+
+    async def _run(self):
+        started = time.monotonic()
+        with open(self.path) as f:
+            for line in f:
+                if not self._symbols:
+                    return
+                message = json.loads(line)
+                delay = message.pop("t", 0) / self.speed - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    await asyncio.sleep(0)
+                self._on_message(message)
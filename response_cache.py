@@ -0,0 +1,109 @@
+# response_cache.py
+"""TTL/LRU keš odgovora read-only API endpoint-a (backend/main.py).
+
+Ključ je ime endpoint-a + parametri; svaki unos nosi tagove ("trades", "candidates", ...) koje
+bot događaji (events.bus) poništavaju čim se podaci promene, pa TTL služi samo kao gornja granica
+zastarelosti. Istovremeni promašaji za isti ključ dele jedno računanje (jedan poziv berzi ili
+bazi umesto po jedan za svaki dashboard).
+"""
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+
+from starlette.concurrency import run_in_threadpool
+
+
+class ResponseCache:
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "invalidations": 0, "evictions": 0}
+        self._entries = OrderedDict()  # ključ -> (ističe, vrednost, tagovi)
+        self._generation = {}  # tag -> broj poništavanja; računanje starije generacije se ne upisuje
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _generations(self, tags):
+        return tuple(self._generation.get(tag, 0) for tag in tags)
+
+    def set(self, key, value, ttl, tags, generations=None):
+        with self._lock:
+            if generations is not None and generations != self._generations(tags):
+                return  # podaci su se promenili dok smo računali
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                self._generation[tag] = self._generation.get(tag, 0) + 1
+            stale = [key for key, (_, _, entry_tags) in self._entries.items() if set(entry_tags) & set(tags)]
+            for key in stale:
+                del self._entries[key]
+            self.stats["invalidations"] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def info(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {**self.stats, "entries": len(self._entries), "maxsize": self.maxsize,
+                "hit_ratio": round(self.stats["hits"] / lookups, 3) if lookups else 0.0}
+
+    async def get_or_compute(self, key, compute, ttl, tags=()):
+        entry = self.get(key)
+        if entry is not None:
+            self.stats["hits"] += 1
+            return entry[1]
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending)
+        self.stats["misses"] += 1
+        with self._lock:
+            generations = self._generations(tags)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+            self.set(key, value, ttl, tags, generations)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # bez "exception was never retrieved" kad niko ne čeka
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def cached(self, ttl, tags=()):
+        """Dekorator za FastAPI endpoint: ključ = ime funkcije + njeni argumenti (query parametri)."""
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                key = (func.__name__, tuple(sorted(bound.arguments.items())))
+                if inspect.iscoroutinefunction(func):
+                    compute = lambda: func(*args, **kwargs)
+                else:
+                    compute = lambda: run_in_threadpool(func, *args, **kwargs)
+                return await self.get_or_compute(key, compute, ttl, tags)
+            return wrapper
+        return decorator
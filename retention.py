@@ -0,0 +1,218 @@
+# retention.py
+"""Ograničen rast baze: indeksi, retencija, dnevni rollup kandidata i incremental vacuum.
+
+Pozadinska nit (kao flusher u storage.py) na svakih `interval` sekundi:
+  - stare kandidate (starije od candidates_days) sabija u candidate_daily (simbol x dan) pa ih briše,
+  - bot_logs drži na poslednjih logs_max_rows redova i ne starije od logs_days,
+  - score_log briše posle score_days,
+  - vraća oslobođene stranice OS-u sa PRAGMA incremental_vacuum.
+Brisanje ide u komadima od `chunk` redova po transakciji da writer bota nikad ne čeka dugo.
+
+incremental_vacuum radi samo kad je baza u auto_vacuum=INCREMENTAL modu, a prelaz na njega je pun
+VACUUM koji drži write lock celo vreme prepisivanja. Zato se ne radi sam od sebe: ili jednom ručno
+(python retention.py --enable-incremental-vacuum, najbolje dok bot ne radi), ili uz
+RETENTION_ENABLE_INCREMENTAL_VACUUM=1 posle prvog prolaza retencije, nad već očišćenom bazom.
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "600"))
+CANDIDATES_RETENTION_DAYS = float(os.getenv("CANDIDATES_RETENTION_DAYS", "2"))
+BOT_LOGS_RETENTION_DAYS = float(os.getenv("BOT_LOGS_RETENTION_DAYS", "7"))
+BOT_LOGS_MAX_ROWS = int(os.getenv("BOT_LOGS_MAX_ROWS", "100000"))
+SCORE_LOG_RETENTION_DAYS = float(os.getenv("SCORE_LOG_RETENTION_DAYS", "90"))
+RETENTION_ENABLE_INCREMENTAL_VACUUM = os.getenv("RETENTION_ENABLE_INCREMENTAL_VACUUM", "0") == "1"
+
+RETENTION_ROWS = metrics.counter("chovusbot_retention_rows_total", "Rows removed or rolled up by retention", ("table", "action"))
+RETENTION_SECONDS = metrics.histogram("chovusbot_retention_seconds", "Duration of one retention pass")
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS candidate_daily (
+        symbol TEXT, day TEXT, scans INTEGER, score_sum REAL, max_score REAL,
+        min_price REAL, max_price REAL, last_price REAL, crossovers INTEGER, fib_hits INTEGER,
+        PRIMARY KEY (symbol, day));
+    CREATE INDEX IF NOT EXISTS idx_candidates_score ON candidates(score DESC, id DESC);
+    CREATE INDEX IF NOT EXISTS idx_candidates_timestamp ON candidates(timestamp);
+    CREATE INDEX IF NOT EXISTS idx_bot_logs_timestamp ON bot_logs(timestamp);
+    CREATE INDEX IF NOT EXISTS idx_score_log_timestamp ON score_log(timestamp);
+'''
+
+# Dan se sabira sa već postojećim redom (rollup može da dođe u više prolaza za isti dan)
+ROLLUP_SQL = '''
+    INSERT INTO candidate_daily (symbol, day, scans, score_sum, max_score, min_price, max_price, last_price, crossovers, fib_hits)
+    SELECT symbol, substr(timestamp, 1, 10), COUNT(*), SUM(score), MAX(score), MIN(price), MAX(price),
+           (SELECT c2.price FROM candidates c2
+            WHERE c2.symbol = c.symbol AND c2.id <= :max_id AND c2.timestamp < :cutoff
+              AND substr(c2.timestamp, 1, 10) = substr(c.timestamp, 1, 10)
+            ORDER BY c2.id DESC LIMIT 1),
+           SUM(COALESCE(crossover, 0)), SUM(COALESCE(fib_zone, 0))
+    FROM candidates c WHERE id <= :max_id AND timestamp < :cutoff
+    GROUP BY symbol, substr(timestamp, 1, 10)
+    ON CONFLICT(symbol, day) DO UPDATE SET
+        scans = scans + excluded.scans,
+        score_sum = score_sum + excluded.score_sum,
+        max_score = MAX(max_score, excluded.max_score),
+        min_price = MIN(min_price, excluded.min_price),
+        max_price = MAX(max_price, excluded.max_price),
+        last_price = excluded.last_price,
+        crossovers = crossovers + excluded.crossovers,
+        fib_hits = fib_hits + excluded.fib_hits
+'''
+
+
+def _cutoff(days):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time() - days * 86400))
+
+
+class Retention:
+    def __init__(self, db, interval=RETENTION_INTERVAL, candidates_days=CANDIDATES_RETENTION_DAYS,
+                 logs_days=BOT_LOGS_RETENTION_DAYS, logs_max_rows=BOT_LOGS_MAX_ROWS,
+                 score_days=SCORE_LOG_RETENTION_DAYS, chunk=5000, vacuum_pages=2000,
+                 enable_incremental_vacuum=RETENTION_ENABLE_INCREMENTAL_VACUUM):
+        self.db = db
+        self.interval = interval
+        self.candidates_days = candidates_days
+        self.logs_days = logs_days
+        self.logs_max_rows = logs_max_rows
+        self.score_days = score_days
+        self.chunk = chunk
+        self.vacuum_pages = vacuum_pages
+        self.convert_auto_vacuum = enable_incremental_vacuum  # jednokratni pun VACUUM posle prvog prolaza
+        self.last_run = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def init_schema(self):
+        self.db.executescript(SCHEMA)
+
+    def enable_incremental_vacuum(self):
+        """auto_vacuum se menja samo uz pun VACUUM; radi se jednom, posle toga samo incremental_vacuum."""
+        if self.db.query_one("PRAGMA auto_vacuum")[0] == 2:
+            return False
+        started = time.perf_counter()
+        conn = self.db.connection()
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        logger.info(f"Enabled incremental auto_vacuum in {time.perf_counter() - started:.1f}s")
+        return True
+
+    def _delete_chunked(self, table, where, params=()):
+        deleted = 0
+        while True:
+            cursor = self.db.execute(
+                f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE {where} ORDER BY id LIMIT ?)",
+                (*params, self.chunk))
+            deleted += cursor.rowcount
+            if cursor.rowcount < self.chunk:
+                return deleted
+
+    def rollup_candidates(self):
+        cutoff = _cutoff(self.candidates_days)
+        rolled = 0
+        while True:
+            # Komad po id-u: sve do max_id ide u rollup i briše se u istoj transakciji
+            row = self.db.query_one(
+                "SELECT MAX(id), COUNT(*) FROM (SELECT id FROM candidates WHERE timestamp < ? ORDER BY id LIMIT ?)",
+                (cutoff, self.chunk))
+            max_id, count = row
+            if not count:
+                return rolled
+            conn = self.db.connection()
+            with conn:
+                conn.execute(ROLLUP_SQL, {"max_id": max_id, "cutoff": cutoff})
+                conn.execute("DELETE FROM candidates WHERE id <= ? AND timestamp < ?", (max_id, cutoff))
+            rolled += count
+
+    def prune_logs(self):
+        deleted = self._delete_chunked("bot_logs", "timestamp < ?", (_cutoff(self.logs_days),))
+        newest = self.db.query_one("SELECT MAX(id) FROM bot_logs")[0]
+        if newest and self.logs_max_rows:
+            deleted += self._delete_chunked("bot_logs", "id <= ?", (newest - self.logs_max_rows,))
+        return deleted
+
+    def prune_score_log(self):
+        cursor = self.db.execute("DELETE FROM score_log WHERE timestamp < ?", (_cutoff(self.score_days),))
+        return cursor.rowcount
+
+    def vacuum(self):
+        before = self.db.query_one("PRAGMA freelist_count")[0]
+        if before:
+            # executescript, jer execute() u sqlite3 modulu oslobodi samo jednu stranicu po pozivu
+            self.db.connection().executescript(f"PRAGMA incremental_vacuum({self.vacuum_pages});")
+        self.db.connection().execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        return before - self.db.query_one("PRAGMA freelist_count")[0]
+
+    def run_once(self):
+        started = time.perf_counter()
+        self.db.flush()
+        result = {
+            "candidates_rolled_up": self.rollup_candidates(),
+            "bot_logs_deleted": self.prune_logs(),
+            "score_log_deleted": self.prune_score_log(),
+        }
+        result["pages_freed"] = self.vacuum()
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        RETENTION_SECONDS.observe(result["seconds"])
+        RETENTION_ROWS.labels(table="candidates", action="rollup").inc(result["candidates_rolled_up"])
+        RETENTION_ROWS.labels(table="bot_logs", action="delete").inc(result["bot_logs_deleted"])
+        RETENTION_ROWS.labels(table="score_log", action="delete").inc(result["score_log_deleted"])
+        self.last_run = {"at": time.strftime("%Y-%m-%d %H:%M:%S"), **result}
+        return result
+
+    def _loop(self):
+        delay = min(30, self.interval)  # prvi prolaz ubrzo posle starta, da se ne čeka ceo interval
+        while not self._stop.wait(delay):
+            delay = self.interval
+            try:
+                result = self.run_once()
+                if result["candidates_rolled_up"] or result["bot_logs_deleted"] or result["score_log_deleted"]:
+                    logger.info(f"Retention pass: {result}")
+            except sqlite3.Error as e:
+                logger.warning(f"Retention pass failed: {e}")
+                continue
+            if self.convert_auto_vacuum:
+                # Tek posle čišćenja: VACUUM prepisuje samo ono što je ostalo
+                self.convert_auto_vacuum = False
+                try:
+                    self.enable_incremental_vacuum()
+                except sqlite3.Error as e:
+                    logger.warning(f"Could not enable incremental vacuum: {e}")
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._loop, name="retention", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def main():
+    from storage import Storage
+
+    parser = argparse.ArgumentParser(description="Retencija i održavanje baze bota")
+    parser.add_argument("--db", default=os.getenv("DB_PATH", Path(__file__).resolve().parent / "user_data" / "chovusbot.db"))
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="posle prolaza retencije jednom prebaci bazu na auto_vacuum=INCREMENTAL (pun VACUUM)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    db = Storage(str(args.db))
+    retention = Retention(db)
+    retention.init_schema()
+    print(retention.run_once())
+    if args.enable_incremental_vacuum and not retention.enable_incremental_vacuum():
+        print("Incremental auto_vacuum is already enabled.")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# scoring.py
+import numpy as np
+import pandas as pd
+
+import indicators
+
+COLUMNS = ["symbol", "price", "volume", "avg_volume", "near_round", "volume_spike", "crossover", "fib_zone",
+           "smma", "wma", "fib_382", "fib_618", "score"]
+
+
+def near_round(prices, round_levels):
+    """Vektorizovana verzija ChovusSmartBot.is_near_round za niz cena."""
+    p = np.asarray(prices, dtype=float)[:, None]
+    levels = np.asarray(round_levels, dtype=float)[None, :]
+    rem = p % levels
+    return ((np.abs(rem - levels) < 0.01 * levels) | (rem < 0.01 * levels)).any(axis=1)
+
+
+def combine_score(round_hit, volume_spike, crossover, in_fib_zone, weights):
+    raw = (round_hit * weights["round"] + volume_spike * weights["volume"]
+           + crossover * weights["crossover"] + in_fib_zone * weights["fib"])
+    return np.minimum(raw / 4.0, 1.0)
+
+
+def score_batch(symbols, prices, volumes, close, high, low, volume, *, round_levels, volume_spike_threshold,
+                weights, smma_length=5, wma_length=144, window=50):
+    """Ocenjuje sve simbole odjednom.
+
+    `prices`/`volumes` su poslednja cena i quoteVolume iz tickera (jedna vrednost po simbolu),
+    a `close`/`high`/`low`/`volume` matrice simboli x sveće iste dužine. Vraća tabelu kandidata
+    sortiranu po score-u, sa istim pravilima kao confirm_smma_wma_crossover, fib_zone_check i ai_score.
+    """
+    if not len(symbols):
+        return pd.DataFrame(columns=COLUMNS)
+    prices = np.asarray(prices, dtype=float)
+    volumes = np.asarray(volumes, dtype=float)
+    close = np.asarray(close, dtype=float)
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    volume = np.asarray(volume, dtype=float)
+    bars = close.shape[1]
+
+    smma = indicators.smma(close, smma_length)[:, -2:]
+    if bars >= wma_length:
+        wma = indicators.wma(close[:, -(wma_length + 1):], wma_length)[:, -2:]
+        crossover = (smma[:, 0] < wma[:, 0]) & (smma[:, 1] > wma[:, 1])
+    else:
+        wma = np.full_like(smma, np.nan)
+        crossover = np.zeros(len(close), dtype=bool)
+
+    if bars >= window:
+        fib_high = high[:, -window:].max(axis=1)
+        fib_low = low[:, -window:].min(axis=1)
+        fib_range = fib_high - fib_low
+        fib_382 = fib_high - fib_range * 0.382
+        fib_618 = fib_high - fib_range * 0.618
+        in_fib_zone = (fib_618 <= close[:, -1]) & (close[:, -1] <= fib_382)
+        avg_volume = volume[:, -window:].mean(axis=1)
+    else:
+        fib_382 = fib_618 = np.full(len(close), np.nan)
+        in_fib_zone = np.zeros(len(close), dtype=bool)
+        avg_volume = volumes
+
+    round_hit = near_round(prices, round_levels)
+    volume_spike = volumes > avg_volume * volume_spike_threshold
+    score = combine_score(round_hit, volume_spike, crossover, in_fib_zone, weights)
+
+    table = pd.DataFrame({
+        "symbol": list(symbols),
+        "price": prices,
+        "volume": volumes,
+        "avg_volume": avg_volume,
+        "near_round": round_hit,
+        "volume_spike": volume_spike,
+        "crossover": crossover,
+        "fib_zone": in_fib_zone,
+        "smma": smma[:, -1],
+        "wma": wma[:, -1],
+        "fib_382": fib_382,
+        "fib_618": fib_618,
+        "score": score,
+    })
+    return table.sort_values("score", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def apply_orderbook_bias(table, biases, weight):
+    """Dodaje weight * bias (-1 SHORT .. +1 LONG iz orderbook_service) na score i ponovo sortira."""
+    if table.empty:
+        return table
+    table = table.assign(orderbook=table["symbol"].map(biases).fillna(0.0).astype(float))
+    table["score"] = np.clip(table["score"] + weight * table["orderbook"], 0.0, 1.0)
+    return table.sort_values("score", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def score_series(close, high, low, volume, quote_volume, *, round_levels, volume_spike_threshold, weights,
+                 smma_length=5, wma_length=144, window=50):
+    """Score za svaki simbol u svakom trenutku (matrice simboli x vreme) - za backtest i optimizaciju.
+
+    Kolona t odgovara onome što bi score_batch dao sa svećama do t (uključujući t) i tickerom
+    cena = close[t], quoteVolume = quote_volume[t]. SMMA je ovde zasejana na početku cele istorije
+    umesto na početku prozora od 150 sveća; uticaj semena posle 150 sveća je reda a^150 i zanemarljiv.
+    Vraća (score, crossover, fib_zone) matrice; NaN ulazi daju score 0.
+    """
+    close = np.asarray(close, dtype=float)
+    smma = indicators.smma(close, smma_length)
+    wma = indicators.wma(close, wma_length)
+    crossover = np.zeros(close.shape, dtype=bool)
+    crossover[:, 1:] = (smma[:, :-1] < wma[:, :-1]) & (smma[:, 1:] > wma[:, 1:])
+
+    fib_high = indicators.rolling_max(high, window)
+    fib_low = indicators.rolling_min(low, window)
+    fib_range = fib_high - fib_low
+    in_fib_zone = (fib_high - fib_range * 0.618 <= close) & (close <= fib_high - fib_range * 0.382)
+    avg_volume = indicators.rolling_sum(volume, window) / window
+
+    round_hit = near_round(close.ravel(), round_levels).reshape(close.shape)
+    volume_spike = np.asarray(quote_volume, dtype=float) > avg_volume * volume_spike_threshold
+    score = combine_score(round_hit, volume_spike, crossover, in_fib_zone, weights)
+    return np.nan_to_num(score), crossover, in_fib_zone
+
+
+def prefilter(symbols, prices, quote_volumes, changes, spreads, *, round_levels, top_n=0, min_quote_volume=0.0,
+              max_spread=None, min_abs_change=0.0):
+    """Jeftino sužavanje univerzuma samo iz fetch_tickers odgovora, pre skidanja sveća.
+
+    Redom odbacuje: neispravne tickere (cena/volumen <= 0), premali quoteVolume, preširok spread
+    (samo kad ticker ima bid/ask), premalu 24h promenu u %, pa od preostalih zadržava `top_n`
+    (0 = sve) - prvo one blizu okruglog nivoa (taj deo score-a je poznat već iz tickera), zatim po
+    quoteVolume. Vraća (zadržani simboli, broj odbačenih po fazi).
+    """
+    symbols = np.asarray(symbols, dtype=object)
+    prices = np.nan_to_num(np.asarray(prices, dtype=float))
+    quote_volumes = np.nan_to_num(np.asarray(quote_volumes, dtype=float))
+    changes = np.nan_to_num(np.asarray(changes, dtype=float))
+    spreads = np.asarray(spreads, dtype=float)
+
+    eliminated = {}
+    keep = (prices > 0) & (quote_volumes > 0)
+    eliminated["invalid"] = int((~keep).sum())
+    for stage, passed in (
+            ("quote_volume", quote_volumes >= min_quote_volume),
+            ("spread", np.isnan(spreads) | (spreads <= max_spread) if max_spread is not None else True),
+            ("change", np.abs(changes) >= min_abs_change)):
+        eliminated[stage] = int((keep & ~passed).sum())
+        keep &= passed
+
+    idx = np.flatnonzero(keep)
+    if not len(idx):
+        eliminated["top_n"] = 0
+        return [], eliminated
+    round_hit = near_round(prices[idx], round_levels)
+    order = idx[np.lexsort((-quote_volumes[idx], ~round_hit))]
+    if top_n and len(order) > top_n:
+        order = order[:top_n]
+    eliminated["top_n"] = int(len(idx) - len(order))
+    return symbols[order].tolist(), eliminated
@@ -0,0 +1,434 @@
+# sim_exchange.py
+"""Simulirana berza (paper trading) sa istim async interfejsom koji bot koristi od ccxt.binance.
+
+Cene dolaze iz snimljenih sveća (backtest.MarketData) ili iz sintetičkog random walk-a; simulirani
+sat ide `speed` puta brže od stvarnog (speed=0: sat se pomera samo sa advance()). Podesivi su
+latencija, provizija, slippage, spread i nasumične greške limita (RateLimitExceeded), a težina
+zahteva se broji kao na Binance-u i vraća u last_response_headers.
+
+Pored market naloga podržani su reduce-only STOP_MARKET i TRAILING_STOP_MARKET (bracket izlazi): okidaju
+se u pozadinskoj petlji na svakih trigger_interval sekundi, a promene naloga i balansa idu pretplatnicima
+(subscribe_user_events) u obliku Binance user-data događaja (ORDER_TRADE_UPDATE, ACCOUNT_UPDATE).
+"""
+import asyncio
+import os
+import random
+import time
+from collections import Counter
+
+import ccxt
+import numpy as np
+import pandas as pd
+
+from backtest import MarketData, load_ohlcv_dir
+from candle_cache import timeframe_ms
+from price_feed import PriceFeed
+
+WEIGHT_LIMIT = 2400
+WEIGHTS = {"fetch_ohlcv": 2, "fetch_tickers": 40, "fetch_ticker": 1, "fetch_balance": 5, "create_order": 1, "load_markets": 1,
+           "cancel_order": 1, "fetch_order": 1, "fetch_open_orders": 1, "fetch_positions": 5}
+CONDITIONAL_TYPES = ("STOP_MARKET", "TRAILING_STOP_MARKET")
+ORDER_STATUS = {"closed": "FILLED", "canceled": "CANCELED", "expired": "EXPIRED", "open": "NEW"}  # ccxt -> Binance X
+
+
+def synthetic_market_data(symbols=50, bars=2000, timeframe='1h', seed=0):
+    rng = np.random.default_rng(seed)
+    step = timeframe_ms(timeframe)
+    start = (int(time.time() * 1000) // step - bars) * step
+    frames = {}
+    for i in range(symbols):
+        close = 10 ** rng.uniform(-2, 3) * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+        open_ = np.r_[close[0], close[:-1]]
+        frames[f"SIM{i}/USDT"] = pd.DataFrame({
+            'timestamp': start + np.arange(bars) * step,
+            'open': open_,
+            'high': np.maximum(open_, close) * (1 + rng.uniform(0, 0.004, bars)),
+            'low': np.minimum(open_, close) * (1 - rng.uniform(0, 0.004, bars)),
+            'close': close,
+            'volume': rng.lognormal(8, 1, bars),
+        })
+    return MarketData(frames, timeframe)
+
+
+class SimPriceFeed(PriceFeed):
+    """Tick-ovi iz simulirane berze za _monitor_trade, umesto Binance WebSocket-a.
+
+    Kao bookTicker, objavljuje najbolji bid (isti kao 'bid' u fetch_ticker), a ne srednju cenu.
+    """
+
+    def __init__(self, exchange, interval=0.1):
+        super().__init__(url=None)
+        self.exchange = exchange
+        self.interval = interval
+
+    async def _send(self, method, streams):
+        pass
+
+    async def _run(self):
+        while self._symbols:
+            for symbol in list(self._symbols.values()):
+                self._publish(symbol, self.exchange.price(symbol)[0] * (1 - self.exchange.spread / 2))
+            await asyncio.sleep(self.interval)
+
+
+class SimulatedExchange:
+    """Podskup ccxt.binance (futures, samo long, market i stop nalozi) nad snimljenim ili sintetičkim svećama."""
+
+    id = "sim"
+
+    def __init__(self, data, *, start_index=None, speed=1.0, latency=(0.0, 0.0), fee_rate=0.0004, slippage=0.0,
+                 spread=0.0002, rate_limit_error_rate=0.0, balance=1000.0, leverage=10, seed=None,
+                 trigger_interval=0.1):
+        self.data = data
+        self.speed = speed
+        self.latency = latency
+        self.fee_rate = fee_rate
+        self.slippage = slippage
+        self.spread = spread
+        self.rate_limit_error_rate = rate_limit_error_rate
+        self.leverage = leverage
+        self.balance = balance
+        self.positions = {}  # symbol -> {"amount", "entry_price"}
+        self.orders = []  # svi nalozi; id = indeks + 1
+        self.open_orders = {}  # id -> STOP_MARKET/TRAILING_STOP_MARKET nalog koji čeka okidanje
+        self.trigger_interval = trigger_interval
+        self.calls = Counter()
+        self.last_response_headers = {}
+        self._rng = random.Random(seed)
+        self._weight = (0, 0)  # (minut, iskorišćena težina)
+        start_index = start_index if start_index is not None else min(len(data.timestamps) - 1, 200)
+        self._start_ms = int(data.timestamps[start_index])
+        self._t0 = time.monotonic()
+        self._offset_ms = 0
+        self.markets = {
+            s: {'id': s.replace('/', ''), 'symbol': s, 'type': 'future', 'future': True, 'contract': True,
+                'linear': True, 'active': True, 'quote': 'USDT', 'base': s.split('/')[0],
+                'limits': {'amount': {'min': 0.001, 'max': 1e9}, 'cost': {'min': 5}},
+                'precision': {'amount': 0.001, 'price': 1e-8}}
+            for s in data.symbols}
+        self._index = {s: i for i, s in enumerate(data.symbols)}
+        # Podrazumevani simbol i timeframe za dashboard (backend/main.py) - ETH/BTC ovde ne postoji
+        self.default_symbol = data.symbols[0] if data.symbols else None
+        self.default_timeframe = data.timeframe
+        self._user_listeners = []
+        self._trigger_task = None
+
+    @classmethod
+    def from_env(cls):
+        timeframe = os.getenv("SIM_TIMEFRAME", "1h")
+        data_dir = os.getenv("SIM_DATA_DIR")
+        if data_dir:
+            data = MarketData(load_ohlcv_dir(data_dir), timeframe)
+        else:
+            data = synthetic_market_data(int(os.getenv("SIM_SYMBOLS", "50")), timeframe=timeframe)
+        latency_ms = float(os.getenv("SIM_LATENCY_MS", "50"))
+        return cls(data, speed=float(os.getenv("SIM_SPEED", "1")),
+                   latency=(latency_ms * 0.5 / 1000, latency_ms * 1.5 / 1000),
+                   fee_rate=float(os.getenv("SIM_FEE_RATE", "0.0004")),
+                   slippage=float(os.getenv("SIM_SLIPPAGE", "0.0002")),
+                   rate_limit_error_rate=float(os.getenv("SIM_RATE_LIMIT_ERROR_RATE", "0")),
+                   balance=float(os.getenv("SIM_BALANCE", "1000")))
+
+    # --- simulirani sat i cene ---
+    def now_ms(self):
+        return self._start_ms + self._offset_ms + int((time.monotonic() - self._t0) * 1000 * self.speed)
+
+    def advance(self, seconds):
+        self._offset_ms += int(seconds * 1000)
+
+    def _bar(self, symbol):
+        now = self.now_ms()
+        j = max(0, min(int(np.searchsorted(self.data.timestamps, now, side='right')) - 1, len(self.data.timestamps) - 1))
+        return self._index[symbol], j, now
+
+    def _path(self, i, j):
+        """Putanja cene unutar bara: linearno kroz open -> low/high -> close, (vremena, cene) temena."""
+        d = self.data
+        o, h, l, c = d.open[i, j], d.high[i, j], d.low[i, j], d.close[i, j]
+        start = int(d.timestamps[j])
+        return [start + d.bar_ms * k / 3 for k in range(4)], ([o, l, h, c] if c >= o else [o, h, l, c])
+
+    def price(self, symbol):
+        """(trenutna cena, indeks bara) sa putanje tekućeg bara."""
+        i, j, now = self._bar(symbol)
+        return float(np.interp(now, *self._path(i, j))), j
+
+    def _segment(self, i, j, t0, t1):
+        """(open, high, low, close) putanje bara j između t0 i t1."""
+        times, points = self._path(i, j)
+        first, last = np.interp([t0, t1], times, points)
+        inside = [p for t, p in zip(times, points) if t0 < t < t1]
+        return float(first), float(max(first, last, *inside)), float(min(first, last, *inside)), float(last)
+
+    def _resampled_ohlcv(self, symbol, timeframe, since, limit):
+        """Sveće proizvoljnog timeframe-a sa putanje baznih sveća (manji se dele, veći spajaju)."""
+        step = timeframe_ms(timeframe)
+        i, _, now = self._bar(symbol)
+        d = self.data
+        current = now // step * step
+        first = -(-since // step) * step if since is not None else current - (limit - 1) * step
+        first = max(first, -(-int(d.timestamps[0]) // step) * step)
+        rows = []
+        for start in range(first, current + 1, step):
+            end = min(start + step, now)  # otvorena sveća se završava na trenutnoj ceni
+            k = max(0, int(np.searchsorted(d.timestamps, start, side='right')) - 1)
+            candle = None
+            volume = 0.0
+            while k < len(d.timestamps) and d.timestamps[k] <= end:
+                t0, t1 = max(start, int(d.timestamps[k])), min(end, int(d.timestamps[k]) + d.bar_ms)
+                if d.present[i, k] and t0 <= t1 and not (t0 == t1 and candle is not None):
+                    o, h, l, c = self._segment(i, k, t0, t1)
+                    candle = [o, h, l, c] if candle is None else [candle[0], max(candle[1], h), min(candle[2], l), c]
+                    volume += float(d.volume[i, k]) * (t1 - t0) / d.bar_ms
+                k += 1
+            if candle:
+                rows.append([start, *candle, volume])
+            if len(rows) >= limit:
+                break
+        return rows
+
+    async def _request(self, method):
+        self.calls[method] += 1
+        if self.latency[1] > 0:
+            await asyncio.sleep(self._rng.uniform(*self.latency))
+        minute = int(time.time() // 60)
+        used = (self._weight[1] if self._weight[0] == minute else 0) + WEIGHTS.get(method, 1)
+        self._weight = (minute, used)
+        self.last_response_headers = {'x-mbx-used-weight-1m': str(used)}
+        if used > WEIGHT_LIMIT or self._rng.random() < self.rate_limit_error_rate:
+            self.calls["rate_limited"] += 1
+            self.last_response_headers['Retry-After'] = "1"
+            raise ccxt.RateLimitExceeded(f"binance 429 simulated rate limit ({method})")
+
+    # --- ccxt interfejs ---
+    async def load_markets(self, reload=False, params=None):
+        await self._request("load_markets")
+        return self.markets
+
+    def set_markets(self, markets, currencies=None):
+        self.markets = {m['symbol']: m for m in (markets.values() if isinstance(markets, dict) else markets)}
+        return self.markets
+
+    def market(self, symbol):
+        return self.markets[symbol]
+
+    def market_id(self, symbol):
+        return self.markets[symbol]['id']
+
+    def amount_to_precision(self, symbol, amount):
+        step = self.markets[symbol]['precision']['amount']
+        return f"{np.floor(float(amount) / step) * step:.8f}".rstrip('0').rstrip('.')
+
+    async def fetch_ohlcv(self, symbol, timeframe='1h', since=None, limit=100, params=None):
+        await self._request("fetch_ohlcv")
+        if timeframe != self.data.timeframe:
+            return self._resampled_ohlcv(symbol, timeframe, since, limit)
+        i, j, _ = self._bar(symbol)
+        d = self.data
+        lo = int(np.searchsorted(d.timestamps, since)) if since is not None else max(0, j + 1 - limit)
+        rows = []
+        for k in range(lo, min(j + 1, lo + limit)):
+            if not d.present[i, k]:
+                continue
+            close = self.price(symbol)[0] if k == j else d.close[i, k]  # otvorena sveća
+            high = max(d.high[i, k], close) if k == j else d.high[i, k]
+            low = min(d.low[i, k], close) if k == j else d.low[i, k]
+            rows.append([int(d.timestamps[k]), float(d.open[i, k]), float(high), float(low), float(close), float(d.volume[i, k])])
+        return rows
+
+    def _ticker(self, symbol):
+        i, j, _ = self._bar(symbol)
+        d = self.data
+        last, _ = self.price(symbol)
+        day = max(1, int(86_400_000 // d.bar_ms))
+        window = slice(max(0, j - day + 1), j + 1)
+        base = d.close[i, max(0, j - day + 1)]
+        return {
+            'symbol': symbol, 'timestamp': self.now_ms(), 'last': last, 'close': last,
+            'bid': last * (1 - self.spread / 2), 'ask': last * (1 + self.spread / 2),
+            'quoteVolume': float((d.close[i, window] * d.volume[i, window]).sum()),
+            'percentage': float(last / base - 1) * 100 if base else 0.0,
+        }
+
+    async def fetch_ticker(self, symbol, params=None):
+        await self._request("fetch_ticker")
+        return self._ticker(symbol)
+
+    async def fetch_tickers(self, symbols=None, params=None):
+        await self._request("fetch_tickers")
+        return {s: self._ticker(s) for s in (symbols or self.data.symbols) if s in self._index}
+
+    async def fetch_balance(self, params=None):
+        await self._request("fetch_balance")
+        used = sum(p['amount'] * p['entry_price'] / self.leverage for p in self.positions.values())
+        return {'total': {'USDT': self.balance}, 'free': {'USDT': self.balance - used}, 'used': {'USDT': used}}
+
+    async def fetch_positions(self, symbols=None, params=None):
+        await self._request("fetch_positions")
+        return [{'symbol': s, 'contracts': p['amount'], 'entryPrice': p['entry_price'], 'side': 'long',
+                 'leverage': self.leverage} for s, p in self.positions.items() if symbols is None or s in symbols]
+
+    async def set_leverage(self, leverage, symbol=None, params=None):
+        self.leverage = leverage
+        return {'leverage': leverage}
+
+    def price_to_precision(self, symbol, price):
+        step = self.markets[symbol]['precision']['price']
+        return f"{round(float(price) / step) * step:.8f}".rstrip('0').rstrip('.')
+
+    async def create_order(self, symbol, type, side, amount, price=None, params=None):
+        await self._request("create_order")
+        params = params or {}
+        if type.upper() in CONDITIONAL_TYPES:
+            return self._place_conditional(symbol, type.upper(), side, amount, params)
+        if type != 'market':
+            raise ccxt.NotSupported(f"simulated exchange only fills market and stop orders, got {type}")
+        order = self._fill(symbol, side, amount, self._new_order(symbol, type, side, amount, params))
+        self._emit_order(order)
+        return order
+
+    def _new_order(self, symbol, type, side, amount, params):
+        order = {
+            'id': str(len(self.orders) + 1), 'clientOrderId': params.get('newClientOrderId'), 'symbol': symbol,
+            'type': type, 'side': side, 'amount': amount, 'filled': 0.0, 'average': None, 'price': None,
+            'status': 'open', 'timestamp': self.now_ms(), 'reduceOnly': bool(params.get('reduceOnly')), 'info': {},
+        }
+        self.orders.append(order)
+        return order
+
+    def _fill(self, symbol, side, amount, order):
+        ticker = self._ticker(symbol)
+        position = self.positions.get(symbol)
+        if side == 'buy':
+            fill = ticker['ask'] * (1 + self.slippage)
+            amount = float(amount)
+            used = sum(p['amount'] * p['entry_price'] / self.leverage for p in self.positions.values())
+            if amount * fill / self.leverage > self.balance - used:
+                order['status'] = 'rejected'
+                raise ccxt.InsufficientFunds(f"simulated margin insufficient for {amount} {symbol}")
+            if position:
+                total = position['amount'] + amount
+                position['entry_price'] = (position['entry_price'] * position['amount'] + fill * amount) / total
+                position['amount'] = total
+            else:
+                self.positions[symbol] = {'amount': amount, 'entry_price': fill}
+            pnl = 0.0
+        else:
+            if not position:
+                order['status'] = 'rejected'
+                raise ccxt.InvalidOrder(f"no simulated position to sell for {symbol}")
+            fill = ticker['bid'] * (1 - self.slippage)
+            amount = position['amount'] if amount == 'ALL' else min(float(amount), position['amount'])
+            pnl = (fill - position['entry_price']) * amount
+            position['amount'] -= amount
+            if position['amount'] <= 1e-12:
+                del self.positions[symbol]
+        fee = fill * amount * self.fee_rate
+        self.balance += pnl - fee
+        order.update({'amount': amount, 'filled': amount, 'average': fill, 'price': fill, 'status': 'closed',
+                      'lastTradeTimestamp': self.now_ms(), 'fee': {'cost': fee, 'currency': 'USDT'},
+                      'info': {'realizedPnl': pnl}})
+        self._emit({"e": "ACCOUNT_UPDATE", "E": self.now_ms(), "a": {"B": [{"a": "USDT", "wb": str(self.balance)}]}})
+        return order
+
+    # --- bracket nalozi (reduce-only) ---
+    def _place_conditional(self, symbol, type, side, amount, params):
+        if side != 'sell' or not params.get('reduceOnly'):
+            raise ccxt.NotSupported("simulated exchange only supports reduce-only sell stop orders")
+        order = self._new_order(symbol, type, side, float(amount), params)
+        if type == "STOP_MARKET":
+            order['stopPrice'] = float(params['stopPrice'])
+        else:
+            rate = float(params['callbackRate'])
+            if not 0.1 <= rate <= 5:
+                order['status'] = 'rejected'
+                raise ccxt.InvalidOrder(f"callbackRate {rate} out of range [0.1, 5]")
+            order['callbackRate'] = rate
+            order['activationPrice'] = float(params.get('activationPrice') or 0) or None
+            order['highest'] = None  # najviša cena od aktivacije
+        self.open_orders[order['id']] = order
+        self._emit_order(order)
+        if self._trigger_task is None or self._trigger_task.done():
+            self._trigger_task = asyncio.create_task(self._trigger_loop())
+        return dict(order)
+
+    def _triggered(self, order, price):
+        if order['type'] == "STOP_MARKET":
+            return price <= order['stopPrice']
+        if order['highest'] is None:
+            if order['activationPrice'] and price < order['activationPrice']:
+                return False
+            order['highest'] = price
+        order['highest'] = max(order['highest'], price)
+        return price <= order['highest'] * (1 - order['callbackRate'] / 100)
+
+    def check_triggers(self):
+        """Okida stop naloge po trenutnoj ceni; poziva ga pozadinska petlja (ili test posle advance())."""
+        for order in list(self.open_orders.values()):
+            if not self._triggered(order, self.price(order['symbol'])[0]):
+                continue
+            del self.open_orders[order['id']]
+            try:
+                self._fill(order['symbol'], 'sell', order['amount'], order)
+            except ccxt.InvalidOrder:
+                order['status'] = 'expired'  # reduce-only bez pozicije (već zatvorena)
+            self._emit_order(order)
+
+    async def _trigger_loop(self):
+        while self.open_orders:
+            await asyncio.sleep(self.trigger_interval)
+            self.check_triggers()
+
+    async def cancel_order(self, id, symbol=None, params=None):
+        await self._request("cancel_order")
+        order = self.open_orders.pop(str(id), None)
+        if order is None:
+            raise ccxt.OrderNotFound(f"simulated order {id} is not open")
+        order['status'] = 'canceled'
+        self._emit_order(order)
+        return dict(order)
+
+    async def fetch_order(self, id, symbol=None, params=None):
+        await self._request("fetch_order")
+        index = int(id) - 1
+        if not 0 <= index < len(self.orders):
+            raise ccxt.OrderNotFound(f"simulated order {id} does not exist")
+        return dict(self.orders[index])
+
+    async def fetch_open_orders(self, symbol=None, since=None, limit=None, params=None):
+        await self._request("fetch_open_orders")
+        return [dict(o) for o in self.open_orders.values() if symbol is None or o['symbol'] == symbol]
+
+    # --- user-data događaji ---
+    def subscribe_user_events(self, callback):
+        if callback not in self._user_listeners:
+            self._user_listeners.append(callback)
+
+    def unsubscribe_user_events(self, callback):
+        if callback in self._user_listeners:
+            self._user_listeners.remove(callback)
+
+    def _emit(self, event):
+        for callback in list(self._user_listeners):
+            callback(event)
+
+    def _emit_order(self, order):
+        now = self.now_ms()
+        self._emit({"e": "ORDER_TRADE_UPDATE", "E": now, "T": now, "o": {
+            "s": self.market_id(order['symbol']), "c": order['clientOrderId'], "S": order['side'].upper(),
+            "o": order['type'].upper(), "X": ORDER_STATUS.get(order['status'], order['status'].upper()),
+            "i": int(order['id']), "z": str(order['filled']), "ap": str(order['average'] or 0),
+            "R": order['reduceOnly'], "T": order.get('lastTradeTimestamp') or now}})
+
+    async def create_market_buy_order(self, symbol, amount, params=None):
+        return await self.create_order(symbol, 'market', 'buy', amount, params=params)
+
+    async def create_market_sell_order(self, symbol, amount, params=None):
+        return await self.create_order(symbol, 'market', 'sell', amount, params=params)
+
+    def create_price_feed(self):
+        return SimPriceFeed(self)
+
+    async def close(self):
+        if self._trigger_task:
+            self._trigger_task.cancel()
@@ -0,0 +1,138 @@
+# storage.py
+import atexit
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from itertools import groupby
+
+import metrics
+
+# Samo konzola (root logger): bot_logs handler je na "chovusbot.actions", pa greška upisa ne ide nazad u red
+logger = logging.getLogger(__name__)
+
+FLUSH_MAX_RETRIES = 5  # posle ovoliko uzastopnih neuspeha batch se odbacuje (npr. pogrešan SQL), da red ne raste večno
+
+DB_SECONDS = metrics.histogram("chovusbot_db_seconds", "SQLite operation latency in seconds", ("op",))
+DB_BATCHED_ROWS = metrics.counter("chovusbot_db_batched_rows_total", "Rows written through the batch queue")
+DB_FLUSH_ERRORS = metrics.counter("chovusbot_db_flush_errors_total", "Failed batch flushes", ("result",))
+_EXECUTE = DB_SECONDS.labels(op="execute")
+_QUERY = DB_SECONDS.labels(op="query")
+_FLUSH = DB_SECONDS.labels(op="flush")
+
+
+class Storage:
+    """Zajednički pristup SQLite bazi za bota i FastAPI backend.
+
+    Svaka nit dobija jednu dugoživeću konekciju (WAL, synchronous=NORMAL), a redovi koji se često
+    upisuju (logovi, kandidati) idu u red i upisuju se zajedno u jednoj transakciji - kad se skupi
+    `batch_size` redova ili najkasnije posle `flush_interval` sekundi. Upis uvek radi pozadinska nit
+    (enqueue je samo budi), redosled naredbi je redosled enqueue poziva, a batch koji ne uspe vraća se
+    na početak reda.
+    """
+
+    def __init__(self, db_path, batch_size=200, flush_interval=1.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._pending = []  # (sql, parametri) redom kojim su stigli
+        self._failures = 0  # uzastopni neuspeli flush-evi
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="storage-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def execute(self, sql, params=()):
+        conn = self.connection()
+        with _EXECUTE.time(), conn:
+            return conn.execute(sql, params)
+
+    def executemany(self, sql, rows):
+        conn = self.connection()
+        with _EXECUTE.time(), conn:
+            conn.executemany(sql, rows)
+
+    @contextmanager
+    def transaction(self):
+        """Više naredbi u jednoj transakciji na konekciji ove niti (commit na izlazu, rollback na grešku)."""
+        conn = self.connection()
+        with _EXECUTE.time(), conn:
+            yield conn
+
+    def executescript(self, script):
+        conn = self.connection()
+        with conn:
+            conn.executescript(script)
+
+    def query(self, sql, params=()):
+        with _QUERY.time():
+            return self.connection().execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        with _QUERY.time():
+            return self.connection().execute(sql, params).fetchone()
+
+    def enqueue(self, sql, params):
+        with self._lock:
+            self._pending.append((sql, params))
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()  # upis radi flusher nit, ne pozivalac (asyncio petlja)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return 0
+            try:
+                conn = self.connection()
+                with _FLUSH.time(), conn:
+                    # Uzastopne naredbe sa istim SQL-om idu jednim executemany; redosled ostaje isti
+                    for sql, run in groupby(pending, key=lambda item: item[0]):
+                        conn.executemany(sql, [params for _, params in run])
+            except sqlite3.Error:
+                self._failures += 1
+                if self._failures >= FLUSH_MAX_RETRIES:
+                    self._failures = 0
+                    DB_FLUSH_ERRORS.labels(result="dropped").inc()
+                    logger.error(f"Dropping {len(pending)} queued rows after {FLUSH_MAX_RETRIES} failed flushes")
+                else:
+                    DB_FLUSH_ERRORS.labels(result="requeued").inc()
+                    with self._lock:
+                        self._pending[:0] = pending
+                raise
+            self._failures = 0
+            DB_BATCHED_ROWS.inc(len(pending))
+            return len(pending)
+
+    def _flush_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logger.warning(f"Storage flush failed: {e}")
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            logger.error(f"Final storage flush failed, {len(self._pending)} queued rows lost: {e}")
@@ -0,0 +1,94 @@
+# strategy.py
+from dataclasses import dataclass, field
+
+# Parametri strategije - koriste ih i živi bot (ChovusSmartBot_v9) i backtest
+ROUND_LEVELS = [0.01, 0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000]
+VOLUME_SPIKE_THRESHOLD = 1.5
+SCORE_WEIGHTS = {"round": 1.0, "volume": 1.0, "crossover": 1.2, "fib": 0.8}  # crossover smanjen sa 1.5, fib povećan sa 0.5
+CANDIDATE_SCORE_THRESHOLD = 0.4  # Smanjen sa 0.5 na 0.4
+SMMA_LENGTH = 5
+WMA_LENGTH = 144
+FIB_WINDOW = 50
+CANDLE_LIMIT = 150
+TRADE_DURATION_LIMIT = 60 * 10
+STOP_LOSS_PERCENT = 0.01
+TRAILING_TP_STEP = 0.005
+TRAILING_TP_OFFSET = 0.02
+PERFORMANCE_MIN_TRADES = 5  # ispod ovoliko završenih trejdova simbol dobija neutralnu težinu
+PERFORMANCE_WEIGHT_RANGE = (0.5, 1.5)
+
+
+@dataclass
+class StrategyParams:
+    round_levels: list = field(default_factory=lambda: list(ROUND_LEVELS))
+    volume_spike_threshold: float = VOLUME_SPIKE_THRESHOLD
+    score_weights: dict = field(default_factory=lambda: dict(SCORE_WEIGHTS))
+    candidate_threshold: float = CANDIDATE_SCORE_THRESHOLD
+    smma_length: int = SMMA_LENGTH
+    wma_length: int = WMA_LENGTH
+    fib_window: int = FIB_WINDOW
+    candle_limit: int = CANDLE_LIMIT
+    trade_duration: float = TRADE_DURATION_LIMIT
+    stop_loss_percent: float = STOP_LOSS_PERCENT
+    trailing_tp_step: float = TRAILING_TP_STEP
+    trailing_tp_offset: float = TRAILING_TP_OFFSET
+
+
+def allocation_for_score(score, max_symbol_exposure=1.0):
+    if score > 0.9:
+        alloc = 0.5
+    elif score > 0.8:
+        alloc = 0.3
+    elif score > 0.7:
+        alloc = 0.2
+    else:
+        alloc = 0.1
+    return min(alloc, max_symbol_exposure)
+
+
+def performance_weight(trades, wins, min_trades=PERFORMANCE_MIN_TRADES, weight_range=PERFORMANCE_WEIGHT_RANGE):
+    """Množilac alokacije iz istorije simbola: 50% dobitnih = 1.0, linearno do granica opsega."""
+    if trades < min_trades:
+        return 1.0
+    low, high = weight_range
+    return max(low, min(high, 2 * wins / trades))
+
+
+def trailing_callback_rate(trailing_tp_step=TRAILING_TP_STEP):
+    """Korak trailing TP-a kao Binance callbackRate (%, dozvoljeno 0.1-5) za TRAILING_STOP_MARKET."""
+    return min(max(round(trailing_tp_step * 100, 1), 0.1), 5.0)
+
+
+class TradeState:
+    """Pravila izlaza iz long pozicije (trailing TP, SL, vremensko ograničenje)."""
+
+    def __init__(self, entry_price, opened_at, params=None):
+        params = params or StrategyParams()
+        self.entry_price = entry_price
+        self.opened_at = opened_at
+        self.tp = entry_price * (1 + params.trailing_tp_offset)
+        self.sl = entry_price * (1 - params.stop_loss_percent)
+        self.highest_price = entry_price
+        self.deadline = opened_at + params.trade_duration
+        self.trailing_tp_step = params.trailing_tp_step
+
+    @classmethod
+    def restore(cls, entry_price, opened_at, highest_price, tp, sl, deadline, params=None):
+        """Stanje sačuvano u žurnalu pozicija (restart bota)."""
+        state = cls(entry_price, opened_at, params)
+        state.highest_price, state.tp, state.sl, state.deadline = highest_price, tp, sl, deadline
+        return state
+
+    def update(self, price):
+        """Primeni novu cenu; vraća "TP", "SL" ili None."""
+        if price > self.highest_price:
+            self.highest_price = price
+            self.tp = self.highest_price * (1 - self.trailing_tp_step)
+        if price >= self.tp:
+            return "TP"
+        if price <= self.sl:
+            return "SL"
+        return None
+
+    def timeout_outcome(self, price):
+        return "TIMEOUT_PROFIT" if price > self.entry_price else "TIMEOUT_LOSS"
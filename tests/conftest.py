@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Moduli bota su u korenu repoa (bez paketa) - testovi ih uvoze direktno
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
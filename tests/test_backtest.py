@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import Backtest, MarketData, compute_metrics
+from strategy import StrategyParams
+
+START_MS = 1_700_000_000_000
+
+
+def frame(closes, bar_ms):
+    closes = np.asarray(closes, dtype=float)
+    opens = np.concatenate([[closes[0]], closes[:-1]])
+    return pd.DataFrame({"timestamp": START_MS + np.arange(len(closes)) * bar_ms, "open": opens,
+                         "high": np.maximum(opens, closes), "low": np.minimum(opens, closes),
+                         "close": closes, "volume": np.ones(len(closes))})
+
+
+def test_coarse_exit_data_is_rejected():
+    hourly = MarketData({"BTC/USDT": frame([100.0] * 10, 3_600_000)}, "1h")
+    with pytest.raises(ValueError, match="too coarse"):
+        Backtest(hourly)
+    Backtest(hourly, StrategyParams(trade_duration=36_000))  # 10h trejd: 1h sveće su dovoljno fine
+
+
+@pytest.mark.parametrize("closes, outcome", [
+    ([100.0, 99.7, 99.4, 98.9, 98.0], "SL"),
+    ([100.0, 101.0, 102.5, 101.0, 100.0], "TP"),
+])
+def test_minute_exit_data_reaches_tp_and_sl(closes, outcome):
+    hourly = MarketData({"BTC/USDT": frame([100.0] * 10, 3_600_000)}, "1h")
+    minutes = MarketData({"BTC/USDT": frame(closes + [100.0] * 20, 60_000)}, "1m")
+    result, price, exit_ms = Backtest(hourly, exit_data=minutes).simulate_exit("BTC/USDT", 100.0, START_MS)
+    assert result == outcome
+    assert exit_ms < START_MS + 600_000
+
+
+def test_timeout_and_end_of_data():
+    hourly = MarketData({"BTC/USDT": frame([100.0] * 10, 3_600_000)}, "1h")
+    minutes = MarketData({"BTC/USDT": frame([100.0] * 30, 60_000)}, "1m")
+    backtest = Backtest(hourly, exit_data=minutes)
+    assert backtest.simulate_exit("BTC/USDT", 100.0, START_MS)[::2] == ("TIMEOUT_LOSS", START_MS + 600_000)
+    last_ms = START_MS + 29 * 60_000
+    assert backtest.simulate_exit("BTC/USDT", 100.0, last_ms - 120_000) == ("END_OF_DATA", 100.0, last_ms + 60_000)
+
+
+def test_simple_metrics_do_not_compound():
+    trades = pd.DataFrame({"pnl": [100.0, 110.0, -60.5, 200.0], "entry_equity": [1000.0, 1100.0, 1210.0, 1000.0],
+                           "entry_time": [0, 1, 2, 3], "exit_time": [1, 2, 3, 4], "outcome": ["TP", "TP", "SL", "TP"]})
+    curve = pd.Series([1000.0, 1100.0, 1210.0, 1149.5, 1349.5])
+    metrics = compute_metrics(trades, curve, 1000.0)
+    assert metrics["simple_return_pct"] == pytest.approx(10 + 10 - 5 + 20)
+    assert metrics["simple_max_drawdown_pct"] == pytest.approx(5)
+    assert metrics["return_pct"] == pytest.approx(34.95)
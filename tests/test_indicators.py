@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import indicators
+
+
+# Implementacije iz ChovusSmartBot_v9 pre vektorizacije (calc_smma / calc_wma)
+def old_smma(series, length):
+    smma = [series.iloc[0]]
+    for i in range(1, len(series)):
+        smma.append((smma[-1] * (length - 1) + series.iloc[i]) / length)
+    return pd.Series(smma, index=series.index)
+
+
+def old_wma(series, length):
+    weights = range(1, length + 1)
+    return series.rolling(length).apply(
+        lambda prices: sum(weights[i] * prices[i] for i in range(length)) / sum(weights), raw=True)
+
+
+def random_prices(n, seed, scale=100.0):
+    rng = np.random.default_rng(seed)
+    return pd.Series(scale * np.exp(np.cumsum(rng.normal(0, 0.01, n))))
+
+
+@pytest.mark.parametrize("length", [1, 2, 5, 14, 144])
+@pytest.mark.parametrize("n", [1, 2, 150, 1000])
+def test_smma_matches_loop(n, length):
+    series = random_prices(n, seed=n + length)
+    np.testing.assert_allclose(indicators.smma(series.values, length), old_smma(series, length).values, rtol=1e-10)
+
+
+@pytest.mark.parametrize("length", [1, 2, 5, 14, 144])
+@pytest.mark.parametrize("n", [1, 5, 144, 150, 1000])
+def test_wma_matches_rolling_apply(n, length):
+    series = random_prices(n, seed=n * length)
+    np.testing.assert_allclose(indicators.wma(series.values, length), old_wma(series, length).values, rtol=1e-10)
+
+
+def test_wma_long_series_across_blocks():
+    series = random_prices(3 * indicators.WMA_BLOCK + 77, seed=1, scale=30000.0)
+    np.testing.assert_allclose(indicators.wma(series.values, 144), old_wma(series, 144).values, rtol=1e-10)
+
+
+def test_nan_handling_matches_old():
+    series = random_prices(400, seed=2)
+    series.iloc[[0, 57, 58, 300]] = np.nan
+    for length in (5, 144):
+        np.testing.assert_allclose(indicators.wma(series.values, length), old_wma(series, length).values, rtol=1e-10)
+    series = random_prices(400, seed=3)
+    series.iloc[120] = np.nan  # SMMA je rekurzivna: NaN se prenosi na sve posle njega
+    np.testing.assert_allclose(indicators.smma(series.values, 5), old_smma(series, 5).values, rtol=1e-10)
+
+
+def test_empty_input():
+    assert indicators.smma(np.array([]), 5).shape == (0,)
+    assert indicators.wma(np.array([]), 5).shape == (0,)
+
+
+def test_batch_matches_rows():
+    matrix = np.vstack([random_prices(300, seed=s).values for s in range(6)])
+    matrix[2, 40] = np.nan
+    for fn, length in ((indicators.smma, 5), (indicators.wma, 144), (indicators.wma, 3)):
+        batch = fn(matrix, length)
+        for row in range(matrix.shape[0]):
+            np.testing.assert_allclose(batch[row], fn(matrix[row], length), rtol=1e-12)
+    np.testing.assert_allclose(indicators.wma(matrix, 144)[0], old_wma(pd.Series(matrix[0]), 144).values, rtol=1e-10)
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import optimize
+from backtest import MarketData
+
+
+def hourly_data():
+    ts = 1_700_000_000_000 + np.arange(10) * 3_600_000
+    frame = pd.DataFrame({"timestamp": ts, "open": 100.0, "high": 101.0, "low": 99.0, "close": 100.0, "volume": 1.0})
+    return MarketData({"BTC/USDT": frame}, "1h")
+
+
+def test_sweep_refuses_exit_data_coarser_than_shortest_trade():
+    samples = list(optimize.grid_samples({"trade_duration": [600, 36_000]}))
+    with pytest.raises(ValueError, match="too coarse"):
+        optimize.run_sweep(hourly_data(), samples, workers=1)
+
+
+def test_objectives_use_non_compounded_returns():
+    metrics = {"return_pct": 1e20, "max_drawdown_pct": 50.0, "simple_return_pct": 40.0, "simple_max_drawdown_pct": 8.0,
+               "expectancy": 1.0, "profit_factor": 2.0}
+    assert optimize.OBJECTIVES["return"](metrics) == 40.0
+    assert optimize.OBJECTIVES["calmar"](metrics) == 5.0
+    assert optimize.min_trade_duration([{"trade_duration": 1800}, {"trade_duration": 600}]) == 600
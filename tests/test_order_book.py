@@ -0,0 +1,125 @@
+import pytest
+
+from order_book import OrderBook, price_decimals
+
+
+def snapshot(last_update_id, bids=(), asks=()):
+    return {"lastUpdateId": last_update_id, "bids": [list(level) for level in bids],
+            "asks": [list(level) for level in asks]}
+
+
+def diff(first_id, final_id, prev_id=None, bids=(), asks=()):
+    event = {"U": first_id, "u": final_id, "b": [list(level) for level in bids], "a": [list(level) for level in asks]}
+    if prev_id is not None:
+        event["pu"] = prev_id
+    return event
+
+
+def synced_book(decimals=2):
+    book = OrderBook("ETHUSDT", decimals=decimals)
+    assert book.apply_snapshot(snapshot(100, bids=[("99.50", "3"), ("99.40", "1")], asks=[("99.60", "2")])) == "ok"
+    assert book.apply_diff(diff(95, 105, 90, bids=[("99.50", "4")])) == "applied"
+    return book
+
+
+@pytest.mark.parametrize("precision, decimals", [
+    (0.01, 2), (1e-07, 7), (0.0000010, 6), (0.5, 1), (0.0025, 4), (1.0, 0), (10.0, 0), (3, 3), (None, 5)])
+def test_price_decimals(precision, decimals):
+    assert price_decimals(precision) == decimals
+
+
+def test_diffs_before_snapshot_are_buffered_and_bridged():
+    book = OrderBook("ETHUSDT", decimals=2)
+    assert book.apply_diff(diff(90, 95, 85, bids=[("99.00", "9")])) == "buffered"  # u < lastUpdateId: odbačen
+    assert book.apply_diff(diff(96, 102, 95, bids=[("99.50", "5")])) == "buffered"  # premošćuje 100
+    assert book.apply_diff(diff(103, 104, 102, asks=[("99.60", "0")])) == "buffered"
+    assert book.apply_snapshot(snapshot(100, bids=[("99.50", "3")], asks=[("99.60", "2"), ("99.70", "1")])) == "ok"
+    assert book.synced and book.last_update_id == 104
+    assert book.best_bid() == (99.5, 5.0)
+    assert book.best_ask() == (99.7, 1.0)
+    assert book.stats["stale"] == 1 and book.stats["applied"] == 2
+
+
+def test_first_diff_must_bridge_snapshot():
+    book = OrderBook("ETHUSDT", decimals=2)
+    book.apply_snapshot(snapshot(100, bids=[("99.50", "3")], asks=[("99.60", "2")]))
+    assert book.apply_diff(diff(102, 110, 101)) == "gap"  # U > lastUpdateId: propušten update 101
+    assert not book.synced and book.last_update_id is None
+    assert len(book.bids) == 0 and book.stats["gaps"] == 1
+
+
+def test_stale_diffs_are_dropped():
+    book = synced_book()
+    assert book.apply_diff(diff(90, 99, 85, bids=[("1.00", "1")])) == "stale"
+    assert book.apply_diff(diff(100, 105, 95, bids=[("1.00", "1")])) == "stale"  # već primenjen u
+    assert book.best_bid() == (99.5, 4.0) and len(book.bids) == 2
+    assert book.stats["stale"] == 2
+
+
+def test_pu_gap_resets_and_resyncs():
+    book = synced_book()
+    assert book.apply_diff(diff(106, 108, 105, asks=[("99.55", "1")])) == "applied"
+    gap = diff(112, 115, 110, bids=[("99.45", "7")])  # pu != 108
+    assert book.apply_diff(gap) == "gap"
+    assert not book.synced and len(book.bids) == 0 and len(book.asks) == 0
+    assert book.apply_diff(diff(116, 118, 115, bids=[("99.45", "8")])) == "buffered"
+    assert book.apply_snapshot(snapshot(114, bids=[("99.50", "2")], asks=[("99.60", "1")])) == "ok"
+    assert book.synced and book.last_update_id == 118
+    assert book.top(2)["bids"] == [(99.5, 2.0), (99.45, 8.0)]
+
+
+def test_spot_sequence_without_pu():
+    book = OrderBook("ETHUSDT", decimals=2)
+    book.apply_snapshot(snapshot(100, bids=[("99.50", "3")], asks=[("99.60", "2")]))
+    assert book.apply_diff(diff(99, 101)) == "applied"
+    assert book.apply_diff(diff(102, 103)) == "applied"
+    assert book.apply_diff(diff(105, 106)) == "gap"
+
+
+def test_snapshot_older_than_buffer_reports_gap():
+    book = OrderBook("ETHUSDT", decimals=2)
+    book.apply_diff(diff(120, 125, 119))
+    assert book.apply_snapshot(snapshot(100, bids=[("99.50", "3")])) == "gap"
+    assert not book.synced
+
+
+def test_levels_and_wall_digits():
+    book = OrderBook("ETHUSDT", decimals=2, wall_threshold=10)
+    book.apply_snapshot(snapshot(1, bids=[("99.51", "11"), ("99.41", "1")], asks=[("99.69", "20")]))
+    assert book.last_digit("bid") == 1 and book.last_digit("ask") == 9
+    assert book.has_wall("bid", 1) and book.has_wall("ask", 9)
+    book.apply_diff(diff(1, 2, 0, bids=[("99.51", "0")], asks=[("99.69", "5")]))
+    assert not book.has_wall("bid", 1) and not book.has_wall("ask", 9)
+    assert book.best_bid() == (99.41, 1.0)
+
+
+def test_low_priced_levels_do_not_collide():
+    book = OrderBook("1000PEPEUSDT", decimals=price_decimals(1e-07))
+    book.apply_snapshot(snapshot(1, bids=[("0.0001234", "50"), ("0.0001231", "40")], asks=[("0.0001236", "10")]))
+    assert book.top()["bids"] == [(0.0001234, 50.0), (0.0001231, 40.0)]
+    assert book.last_digit("bid") == 4
+    assert book.apply_diff(diff(1, 2, 0, bids=[("0.0001231", "0")])) == "applied"
+    assert book.top()["bids"] == [(0.0001234, 50.0)]
+
+
+def test_price_finer_than_decimals_invalidates_book():
+    book = OrderBook("1000PEPEUSDT", decimals=5)
+    assert book.apply_snapshot(snapshot(1, bids=[("0.0001234", "50"), ("0.0001231", "40")])) == "invalid"
+    assert book.error and not book.synced and len(book.bids) == 0
+    assert book.apply_diff(diff(1, 2, 0, bids=[("0.0001231", "0")])) == "invalid"
+
+    book = OrderBook("ETHUSDT", decimals=2)
+    book.apply_snapshot(snapshot(1, bids=[("99.50", "3")], asks=[("99.60", "2")]))
+    assert book.apply_diff(diff(1, 2, 0, bids=[("99.40", "1"), ("99.455", "1")])) == "invalid"
+    assert len(book.bids) == 0 and not book.synced
+
+
+def test_wall_notional_is_per_price():
+    btc = OrderBook("BTCUSDT", decimals=1, wall_notional=50000)
+    btc.apply_snapshot(snapshot(1, bids=[("60000.1", "1")], asks=[("60000.9", "0.5")]))
+    assert btc.has_wall("bid", 1) and not btc.has_wall("ask", 9)  # 60k USDT vs 30k USDT
+    pepe = OrderBook("1000PEPEUSDT", decimals=7, wall_notional=50000)
+    pepe.apply_snapshot(snapshot(1, bids=[("0.0001231", "10")], asks=[("0.0001239", "500000000")]))
+    assert not pepe.has_wall("bid", 1) and pepe.has_wall("ask", 9)
+    pepe.apply_diff(diff(1, 2, 0, asks=[("0.0001239", "100000000")]))
+    assert not pepe.has_wall("ask", 9)
@@ -0,0 +1,44 @@
+import asyncio
+import json
+
+from orderbook_service import ReplayOrderBookService, futures_price_precision
+
+MARKETS = {
+    "BTC/USDT": {"id": "BTCUSDT", "spot": True, "precision": {"price": 0.01}},
+    "BTC/USDT:USDT": {"id": "BTCUSDT", "swap": True, "contract": True, "precision": {"price": 0.1}},
+    "1000PEPE/USDT:USDT": {"id": "1000PEPEUSDT", "swap": True, "contract": True, "precision": {"price": 1e-07}},
+}
+
+
+def test_futures_price_precision_uses_contract_market():
+    assert futures_price_precision(MARKETS, "BTC/USDT") == 0.1
+    assert futures_price_precision(MARKETS, "1000PEPE/USDT:USDT") == 1e-07
+    assert futures_price_precision(MARKETS, "ETH/USDT") is None
+
+
+def test_replay_builds_books_with_symbol_precision(tmp_path):
+    path = tmp_path / "depth.jsonl"
+    entries = [
+        {"snapshot": "1000PEPEUSDT", "data": {"lastUpdateId": 10, "bids": [["0.0001234", "50"], ["0.0001231", "40"]],
+                                               "asks": [["0.0001236", "10"]]}},
+        {"stream": "1000pepeusdt@depth@100ms",
+         "data": {"e": "depthUpdate", "s": "1000PEPEUSDT", "U": 9, "u": 11, "pu": 8, "b": [["0.0001231", "0"]], "a": []}},
+    ]
+    path.write_text("".join(json.dumps(entry) + "\n" for entry in entries))
+
+    async def run():
+        service = ReplayOrderBookService(str(path), speed=0, wall_notional=1,
+                                         price_precision=lambda symbol: futures_price_precision(MARKETS, symbol))
+        await service.subscribe("ETH/USDT")  # nepoznata preciznost: ne prati se
+        await service.subscribe("1000PEPE/USDT")
+        await asyncio.wait_for(service.finished.wait(), 5)
+        stats = service.book_stats()["1000PEPE/USDT"]
+        signal = service.snapshot()[0]
+        symbols = service.symbols
+        await service.close()
+        return symbols, stats, signal
+
+    symbols, stats, signal = asyncio.run(run())
+    assert symbols == ["1000PEPE/USDT"]
+    assert stats["decimals"] == 7 and stats["synced"] and stats["bids"] == 1
+    assert signal["bid"] == 0.0001234 and signal["bid_digit"] == 4
@@ -0,0 +1,52 @@
+import sqlite3
+import time
+
+import pytest
+
+from retention import Retention
+from storage import Storage
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Storage(str(tmp_path / "test.db"), flush_interval=3600)
+    db.executescript('''
+        CREATE TABLE candidates (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, symbol TEXT, price REAL,
+                                 score REAL, crossover INTEGER, fib_zone INTEGER);
+        CREATE TABLE bot_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT, message TEXT);
+        CREATE TABLE score_log (timestamp TEXT, score INTEGER);
+    ''')
+    yield db
+    db.close()
+
+
+def run_loop(retention, passes=2):
+    calls = []
+    run_once, enable = retention.run_once, retention.enable_incremental_vacuum
+    retention.run_once = lambda: calls.append("prune") or run_once()
+    retention.enable_incremental_vacuum = lambda: calls.append("vacuum") or enable()
+    retention.start()
+    deadline = time.monotonic() + 5
+    while calls.count("prune") < passes and time.monotonic() < deadline:
+        time.sleep(0.01)
+    retention.stop()
+    retention._thread.join(5)
+    return calls
+
+
+def test_auto_vacuum_conversion_is_opt_in(db):
+    retention = Retention(db, interval=0.01)
+    retention.init_schema()
+    assert "vacuum" not in run_loop(retention)
+    assert sqlite3.connect(db.db_path).execute("PRAGMA auto_vacuum").fetchone()[0] != 2
+
+
+def test_conversion_runs_once_after_first_prune(db):
+    db.executemany("INSERT INTO bot_logs (timestamp, message) VALUES (?, ?)", [("2000-01-01 00:00:00", "x" * 200)] * 500)
+    retention = Retention(db, interval=0.01, enable_incremental_vacuum=True)
+    retention.init_schema()
+    calls = run_loop(retention, passes=3)
+    assert calls[:2] == ["prune", "vacuum"] and calls.count("vacuum") == 1
+    # auto_vacuum se kešira po konekciji; nova konekcija vidi zaglavlje posle VACUUM-a
+    assert sqlite3.connect(db.db_path).execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    assert db.query_one("SELECT COUNT(*) FROM bot_logs")[0] == 0
@@ -0,0 +1,71 @@
+import sqlite3
+import time
+
+import pytest
+
+import storage
+from storage import Storage
+
+
+@pytest.fixture
+def db(tmp_path):
+    # Pozadinska nit se ne budi tokom testa (batch_size i interval su veliki), flush zove test
+    db = Storage(str(tmp_path / "test.db"), batch_size=10_000, flush_interval=3600)
+    db.execute("CREATE TABLE items (name TEXT, value INTEGER)")
+    yield db
+    db.close()
+
+
+def test_flush_keeps_statement_order_across_groups(db):
+    db.enqueue("INSERT INTO items (name, value) VALUES (?, ?)", ("a", 1))
+    db.enqueue("INSERT INTO items (name, value) VALUES (?, ?)", ("b", 1))
+    db.enqueue("UPDATE items SET value = ? WHERE name = ?", (2, "a"))
+    db.enqueue("INSERT INTO items (name, value) VALUES (?, ?)", ("c", 1))
+    db.enqueue("UPDATE items SET value = value * 10", ())
+    db.enqueue("DELETE FROM items WHERE name = ?", ("b",))
+    db.enqueue("INSERT INTO items (name, value) VALUES (?, ?)", ("b", 5))
+    assert db.flush() == 7
+    assert db.query("SELECT name, value FROM items ORDER BY rowid") == [("a", 20), ("c", 10), ("b", 5)]
+    assert db.flush() == 0
+
+
+def test_failed_flush_requeues_batch_in_front(db):
+    db.enqueue("INSERT INTO later (name) VALUES (?)", ("x",))
+    db.enqueue("INSERT INTO items (name, value) VALUES (?, ?)", ("a", 1))
+    with pytest.raises(sqlite3.OperationalError):
+        db.flush()
+    assert db.query("SELECT COUNT(*) FROM items") == [(0,)]  # ceo batch je u jednoj transakciji
+    db.enqueue("INSERT INTO items (name, value) VALUES (?, ?)", ("b", 2))
+    db.execute("CREATE TABLE later (name TEXT)")
+    assert db.flush() == 3
+    assert db.query("SELECT name FROM later") == [("x",)]
+    assert db.query("SELECT name FROM items ORDER BY rowid") == [("a",), ("b",)]
+
+
+def test_batch_dropped_after_max_retries(db, caplog):
+    db.enqueue("INSERT INTO missing (name) VALUES (?)", ("x",))
+    db.enqueue("INSERT INTO items (name, value) VALUES (?, ?)", ("a", 1))
+    for _ in range(storage.FLUSH_MAX_RETRIES - 1):
+        with pytest.raises(sqlite3.OperationalError):
+            db.flush()
+        assert len(db._pending) == 2
+    with pytest.raises(sqlite3.OperationalError):
+        db.flush()
+    assert db._pending == []
+    assert "Dropping 2 queued rows" in caplog.text
+    db.enqueue("INSERT INTO items (name, value) VALUES (?, ?)", ("b", 1))
+    assert db.flush() == 1  # brojač neuspeha je resetovan, novi redovi se upisuju
+    assert db.query("SELECT name FROM items") == [("b",)]
+
+
+def test_enqueue_wakes_flusher_when_batch_is_full(tmp_path):
+    db = Storage(str(tmp_path / "test.db"), batch_size=3, flush_interval=3600)
+    db.execute("CREATE TABLE items (name TEXT, value INTEGER)")
+    for i in range(3):
+        db.enqueue("INSERT INTO items (name, value) VALUES (?, ?)", (str(i), i))
+    for _ in range(200):
+        if db.query("SELECT COUNT(*) FROM items") == [(3,)]:
+            break
+        time.sleep(0.01)
+    assert db.query("SELECT COUNT(*) FROM items") == [(3,)]
+    db.close()